@@ -11,20 +11,14 @@ from __future__ import annotations
 from typing import List, Dict, Any, Tuple
 import json
 import re
-import os
-
-from openai import OpenAI
 
 import kg_api  # 复用你现有的图谱查询接口
+from llm_client import get_client
 
 
 # ========= 基础配置 =========
 
-# 使用阿里云百炼兼容 OpenAI 接口
-client = OpenAI(
-    api_key=os.getenv("DASHSCOPE_API_KEY"),  # 请在环境变量中配置
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-)
+# 使用阿里云百炼兼容 OpenAI 接口；客户端（连接池、超时、API Key）由 llm_client 统一配置
 
 AGENT_MODEL = "qwen3-max"   # Agent 模型（负责 ReAct：Thought + Action）
 ANSWER_MODEL = "qwen3-8b"   # 回答模型（负责最终回答，支持 enable_thinking）
@@ -361,7 +355,7 @@ def generate_final_answer(question: str, history: List[Dict[str, Any]]) -> str:
     这里用非流式返回一个完整字符串，如果要流式可以在 FastAPI 那边改成逐块写出。
     """
     messages = build_answer_messages_from_history(question, history)
-    completion = client.chat.completions.create(
+    completion = get_client().chat.completions.create(
         model=ANSWER_MODEL,
         messages=messages,
         extra_body={"enable_thinking": True},
@@ -385,7 +379,7 @@ def run_react_agent(question: str, max_steps: int = MAX_STEPS) -> Dict[str, Any]
         messages = build_react_messages(question, history)
 
         # 2）调用 Agent 模型（qwen3-max）
-        resp = client.chat.completions.create(
+        resp = get_client().chat.completions.create(
             model=AGENT_MODEL,
             messages=messages,
             temperature=0.2,
@@ -1,17 +1,22 @@
 # api_server_stream.py
 # -*- coding: utf-8 -*-
 
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
 
+import asyncio
 import json
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from prompts import PLAN_SYSTEM_PROMPT, PLAN_FEWSHOT, ANSWER_SYSTEM_PROMPT
-from llm_client import client, PLAN_MODEL, ANSWER_MODEL
-from movie_qa import execute_plan  
+from llm_client import get_async_client, PLAN_MODEL, ANSWER_MODEL
+from movie_qa import execute_plan, execution_succeeded, local_plan, PLAN_CACHE
+from plan_stream import PlanStreamParser, matches_plan
+import kg_api
 
 
 app = FastAPI(
@@ -30,6 +35,23 @@ app.add_middleware(
 )
 
 
+# 图查询（execute_plan）和本地规划都是同步的 CPU 密集代码，放进一个有界线程池执行：
+# 并发请求再多，同时在跑图查询的线程也不超过 KG_EXECUTOR_WORKERS 个，其余排队
+GRAPH_EXECUTOR_WORKERS = int(os.getenv("KG_EXECUTOR_WORKERS", "4"))
+_GRAPH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=GRAPH_EXECUTOR_WORKERS,
+    thread_name_prefix="kg-query",
+)
+
+# 推测执行（见 _stream_plan）单独用一个更小的线程池：推测的结果可能被丢弃，
+# 不能让它占满 _GRAPH_EXECUTOR、挤掉真正要用的图查询
+SPECULATIVE_EXECUTOR_WORKERS = int(os.getenv("KG_SPECULATIVE_WORKERS", "2"))
+_SPECULATIVE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=SPECULATIVE_EXECUTOR_WORKERS,
+    thread_name_prefix="kg-speculative",
+)
+
+
 class QuestionRequest(BaseModel):
     question: str
 
@@ -66,27 +88,92 @@ def build_answer_messages(question: str, exec_result: Dict[str, Any]):
     ]
 
 
+def _submit(func, *args, executor: ThreadPoolExecutor = _GRAPH_EXECUTOR) -> "asyncio.Future":
+    """把同步的 CPU 密集函数（计划缓存 / 本地规则 / 图查询）提交到有界线程池，返回可 await 的 Future。"""
+    return asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def _consume_result(future: "asyncio.Future") -> None:
+    """推测执行 Future 的 done 回调：取走异常，被丢弃的推测失败时不会打出 "exception was never retrieved"。"""
+    if not future.cancelled():
+        future.exception()
+
+
+def _speculate(plan: Dict) -> "asyncio.Future":
+    """在推测执行线程池里执行计划。"""
+    future = _submit(execute_plan, plan, executor=_SPECULATIVE_EXECUTOR)
+    future.add_done_callback(_consume_result)
+    return future
+
+
+def _discard(speculation: Optional[Tuple[Dict, "asyncio.Future"]]) -> None:
+    """丢弃一次推测执行：还没开始跑的直接取消，已经在跑的让它跑完，结果（包括异常）由 _consume_result 取走。"""
+    if speculation is not None:
+        speculation[1].cancel()
+
+
+async def _run_in_executor(func, *args):
+    """在有界线程池里运行同步函数并等待结果，不阻塞事件循环。"""
+    return await _submit(func, *args)
+
+
+async def _stream_plan(question: str) -> Tuple[Dict[str, Any], Optional[Tuple[Dict, "asyncio.Future"]]]:
+    """
+    流式生成查询计划，边生成边推测执行（见 plan_stream.py）。
+
+    返回 (最终计划, 最后一次推测执行)，后者是 (推测计划, Future) 或 None。
+    task 和必填参数一完整就推测执行一次；只有它们的值后来又变了才丢弃旧的、重新提交。
+    出错（包括最终输出不是合法 JSON）时丢弃推测执行再抛出异常。
+    """
+    parser = PlanStreamParser()
+    speculation = None
+    try:
+        stream = await get_async_client().chat.completions.create(
+            model=PLAN_MODEL,
+            messages=build_plan_messages(question),
+            temperature=0.0,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                if parser.feed(chunk.choices[0].delta.content or ""):
+                    _discard(speculation)
+                    speculation = (parser.speculative, _speculate(parser.speculative))
+        finally:
+            await stream.close()
+        return json.loads(parser.text), speculation
+    except BaseException:
+        _discard(speculation)
+        raise
+
+
+def _ndjson(obj: Dict[str, Any]) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+
 @app.post("/api/qa_stream")
-def qa_stream(req: QuestionRequest):
+async def qa_stream(req: QuestionRequest):
     """
     流式接口：
     - 先返回一条 type = "meta" 的 JSON 行，包含 plan 和 graph_result
     - 再流式返回 qwen3-8b 的 reasoning_content 和 content
     - 每一行都是一个 JSON 对象，末尾有 '\n'
+
+    整个流程跑在事件循环上：大模型调用用共享的 AsyncOpenAI 客户端，图查询放进有界线程池，
+    等待模型输出时不占用任何线程。查询计划是流式生成的，task 和必填参数一出来就开始推测执行图查询。
     """
 
     question = req.question.strip()
 
-    def event_generator():
-        # ========== Step 1：生成查询计划（非流式） ==========
+    async def event_generator():
+        # ========== Step 1：生成查询计划（先查计划缓存和本地规则，再流式调用模型） ==========
+        plan, plan_source, speculation = None, None, None
         try:
-            plan_resp = client.chat.completions.create(
-                model=PLAN_MODEL,
-                messages=build_plan_messages(question),
-                temperature=0.0,
-            )
-            plan_raw = plan_resp.choices[0].message.content
-            plan = json.loads(plan_raw)
+            plan, plan_source = await _run_in_executor(local_plan, question)
+            if plan is None:
+                plan, speculation = await _stream_plan(question)
         except Exception as e:
             # plan 错了也尽量给前端返回错误信息
             err_msg = f"解析查询计划失败: {e}"
@@ -100,16 +187,20 @@ def qa_stream(req: QuestionRequest):
                 "plan": fallback,
                 "graph_result": None,
             }
-            yield json.dumps(meta, ensure_ascii=False) + "\n"
+            yield _ndjson(meta)
             # 直接结束
-            yield json.dumps({"type": "done"}) + "\n"
+            yield _ndjson({"type": "done"})
             return
 
-        # ========== Step 2：在本地图谱上执行计划 ==========
+        # ========== Step 2：在本地图谱上执行计划（线程池） ==========
         try:
-            graph_result = execute_plan(plan)
+            if speculation is not None and matches_plan(speculation[0], plan):
+                # 推测执行用的计划和最终计划一致：直接用它的结果（多半已经算完了）
+                graph_result = await speculation[1]
+            else:
+                _discard(speculation)
+                graph_result = await _run_in_executor(execute_plan, plan)
         except Exception as e:
-            graph_result = None
             plan_error = f"执行图查询失败: {e}"
 
             meta = {
@@ -118,60 +209,61 @@ def qa_stream(req: QuestionRequest):
                 "plan": plan,
                 "graph_result": None,
             }
-            yield json.dumps(meta, ensure_ascii=False) + "\n"
-            yield json.dumps({"type": "done"}) + "\n"
+            yield _ndjson(meta)
+            yield _ndjson({"type": "done"})
             return
 
+        # 模型新生成的计划执行成功后才写入缓存（可能要写磁盘，也放进线程池）
+        if plan_source is None and execution_succeeded(graph_result):
+            await _run_in_executor(PLAN_CACHE.put, question, plan)
+
         # 把 Plan 和 Graph Result 发给前端
         meta = {
             "type": "meta",
             "plan": plan,
             "graph_result": graph_result,
         }
-        yield json.dumps(meta, ensure_ascii=False) + "\n"
+        yield _ndjson(meta)
 
         # ========== Step 3：qwen3-8b 深度思考 + 流式输出 ==========
         messages = build_answer_messages(question, graph_result)
 
+        completion = None
         try:
-            completion = client.chat.completions.create(
+            completion = await get_async_client().chat.completions.create(
                 model=ANSWER_MODEL,
                 messages=messages,
                 extra_body={"enable_thinking": True},
                 stream=True,
             )
 
-            for chunk in completion:
+            async for chunk in completion:
                 delta = chunk.choices[0].delta
 
                 # 思考过程
                 reasoning = getattr(delta, "reasoning_content", None)
                 if reasoning:
-                    pkt = {
-                        "type": "reasoning",
-                        "text": reasoning,
-                    }
-                    yield json.dumps(pkt, ensure_ascii=False) + "\n"
+                    yield _ndjson({"type": "reasoning", "text": reasoning})
 
                 # 最终回答内容
                 content = getattr(delta, "content", None)
                 if content:
-                    pkt = {
-                        "type": "answer",
-                        "text": content,
-                    }
-                    yield json.dumps(pkt, ensure_ascii=False) + "\n"
+                    yield _ndjson({"type": "answer", "text": content})
 
             # 结束标记
-            yield json.dumps({"type": "done"}, ensure_ascii=False) + "\n"
+            yield _ndjson({"type": "done"})
 
         except Exception as e:
             err_pkt = {
                 "type": "error",
                 "message": f"回答阶段出错: {e}",
             }
-            yield json.dumps(err_pkt, ensure_ascii=False) + "\n"
-            yield json.dumps({"type": "done"}, ensure_ascii=False) + "\n"
+            yield _ndjson(err_pkt)
+            yield _ndjson({"type": "done"})
+        finally:
+            # 前端断开时生成器被取消，及时关掉上游的流，连接还给连接池
+            if completion is not None:
+                await completion.close()
 
     return StreamingResponse(
         event_generator(),
@@ -179,6 +271,37 @@ def qa_stream(req: QuestionRequest):
     )
 
 
+@app.post("/api/admin/reload_graph")
+def reload_graph(force: bool = False):
+    """
+    重新加载知识图谱（每晚重建 KG 之后调用，无需重启 worker）。
+
+    - 默认只在图文件发生变化时才重新加载
+    - force=true 时无条件重新加载
+    正在处理的请求会继续使用旧版本的图，新请求使用新版本。
+    注意：多 worker 部署时，每个 worker 进程需要各自触发一次。
+    """
+    if force:
+        kg_api.reload_graph()
+        reloaded = True
+    else:
+        reloaded = kg_api.reload_if_changed()
+    return {"reloaded": reloaded, "graph_version": kg_api.get_graph_version()}
+
+
+@app.get("/api/admin/plan_cache")
+def plan_cache_info():
+    """查询计划缓存的命中统计。"""
+    return PLAN_CACHE.info()
+
+
+@app.delete("/api/admin/plan_cache")
+def clear_plan_cache():
+    """清空查询计划缓存（改了提示词但没重启时用）。"""
+    PLAN_CACHE.clear()
+    return PLAN_CACHE.info()
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
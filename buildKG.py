@@ -8,13 +8,38 @@ Title, Year, IMDb Rating, MetaScore, Duration (minutes),
 Certificates, Genre, Director, Star Cast
 """
 
-import re
+import argparse
+import functools
+import hashlib
+import json
 import math
+import os
+import pickle
+import re
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import networkx as nx
 
+from kg_csr import write_csr_store
+from kg_profile import BuildProfiler, profile_stage
+from kg_resolve import new_resolve_stats, person_merge_map, title_merge_map
+from kg_shards import shard_entities, shard_of, shards_path_for, write_shards
+from kg_snapshot import (
+    fingerprint_matches,
+    graphml_fingerprint,
+    load_snapshot,
+    remove_graph_delta,
+    write_graph_delta,
+    write_snapshot,
+)
+from kg_tables import write_tables
+
 
 CSV_FILES = [
     "data/IMDb_Dataset.csv",
@@ -34,48 +59,173 @@ COMMON_COLS = [
     "Duration (minutes)",
 ]
 
+NUMERIC_COLS = ["IMDb Rating", "MetaScore", "Duration (minutes)"]
+STRING_COLS = ["Title", "Certificates", "Genre", "Director", "Star Cast"]
+
+
+# 常见的姓氏前缀：切分后落单的前缀要和后面一段接回去（"Ian Mc" + "Kellen"）
+CAST_PREFIXES = {"Mc", "Mac", "De", "Di", "Le", "La", "Van", "Von", "O'"}
+
+# 名字后缀：后面紧跟大写字母时也是切分点（"Jr.Catherine"）
+CAST_SUFFIXES = ("Jr.", "Sr.")
+
+
+def _normalize_cast(raw) -> str:
+    if pd.isna(raw):
+        return ""
+    return re.sub(r"\s+", " ", str(raw).strip())
+
+
+def _is_boundary(s: str, k: int) -> bool:
+    """s[k] 是否是黏连人名的切分点：小写→大写（"CruiseHayley"，含带重音的字母），或名字后缀之后紧跟大写。"""
+    return s[k].isupper() and (s[k - 1].islower() or s.endswith(CAST_SUFFIXES, 0, k))
+
+
+def _next_boundary(s: str, start: int) -> int:
+    """s[start:] 里第一个切分点（见 _is_boundary），没有则返回 len(s)。"""
+    for k in range(max(start, 1), len(s)):
+        if _is_boundary(s, k):
+            return k
+    return len(s)
+
+
+def _heuristic_piece_end(s: str, i: int) -> int:
+    """从 s[i] 开始按启发式规则切出下一个人名，返回它的结束位置。"""
+    end = _next_boundary(s, i + 1)
+    piece = s[i:end].split()
+    if end < len(s) and piece and piece[-1] in CAST_PREFIXES:
+        # 把前缀碎片和下一段接回去；切分点本来就没有空格，直接取原文
+        end = _next_boundary(s, end + 1)
+    return end
+
+
+class StarCastSegmenter:
+    """
+    Star Cast 切分器：把黏在一起的人名串拆成一个个人名。
+
+    - 已知人名放在一棵字符 trie 里，从左到右一次扫描：
+      当前位置能匹配到已知人名就取最长的那个，否则退回启发式规则切出一段（见 split_star_cast）
+    - 匹配只能在可信的位置结束：串尾；或者匹配到的是完整的多词人名、且结束处是启发式规则
+      也认可的切分点（_is_boundary）；否则要求剩下的部分能完整切成已知人名。
+      这样短的已知人名（"Jo"）不会把一个大写开头的词（"JoBeth"）从中间切开
+    - 结果按原始字符串缓存，同一个 Star Cast 在多个文件里重复出现只切一次
+
+    已知人名一般用 from_names 从数据里收集：Director 列的全部人名，
+    以及启发式切分后只有一个名字的 Star Cast（整串就是一个人，视为已确认的完整人名）。
+    这样 "DiCaprio"、"JoBeth" 这类名字内部的大小写边界不会被误切。
+    """
+
+    _END = None
+
+    def __init__(self, known_names=()):
+        self._trie = {}
+        self._cache = {}
+        for name in known_names:
+            self.add_name(name)
+
+    @classmethod
+    def known_names(cls, directors, casts) -> set:
+        """from_names 收集的已知人名；数据分块读入时可以逐块收集再取并集。"""
+        heuristic = cls()
+        known = {_normalize_cast(d) for d in directors}
+        for raw in casts:
+            names = heuristic.split(raw)
+            if len(names) == 1:
+                known.add(names[0])
+        known.discard("")
+        return known
+
+    @classmethod
+    def from_names(cls, directors, casts) -> "StarCastSegmenter":
+        return cls(sorted(cls.known_names(directors, casts)))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "StarCastSegmenter":
+        return cls.from_names(
+            df["Director"].dropna().unique(), df["Star Cast"].dropna().unique()
+        )
+
+    def add_name(self, name):
+        name = _normalize_cast(name)
+        if not name:
+            return
+        node = self._trie
+        for ch in name:
+            node = node.setdefault(ch, {})
+        node[self._END] = True
+        self._cache.clear()
+
+    def _known_ends(self, s: str, i: int) -> list:
+        """s[i:] 开头所有已知人名的结束位置（从长到短），只取后面紧跟大写字母或串尾的。"""
+        node, ends = self._trie, []
+        for j in range(i, len(s)):
+            node = node.get(s[j])
+            if node is None:
+                break
+            if self._END in node and (j + 1 == len(s) or s[j + 1].isupper()):
+                ends.append(j + 1)
+        return ends[::-1]
+
+    def _covered(self, s: str, i: int, memo: dict) -> bool:
+        """s[i:] 能否完整切成一串已知人名。"""
+        if i >= len(s):
+            return True
+        if i not in memo:
+            memo[i] = any(self._covered(s, end, memo) for end in self._known_ends(s, i))
+        return memo[i]
+
+    def _match(self, s: str, i: int, memo: dict) -> int:
+        """s[i:] 开头最长的、结束位置可信的已知人名的结束位置；没有则返回 -1。"""
+        for end in self._known_ends(s, i):
+            if end == len(s):
+                return end
+            if " " in s[i:end].strip() and _is_boundary(s, end):
+                return end
+            if self._covered(s, end, memo):
+                return end
+        return -1
+
+    def _segment(self, raw) -> list:
+        s = _normalize_cast(raw)
+        names, i, memo = [], 0, {}
+        while i < len(s):
+            if s[i] == " ":
+                i += 1
+                continue
+            end = self._match(s, i, memo)
+            if end < 0:
+                end = _heuristic_piece_end(s, i)
+            name = s[i:end].strip()
+            if name:
+                names.append(name)
+            i = end
+        return names
+
+    def split(self, raw) -> list:
+        if pd.isna(raw):
+            return []
+        names = self._cache.get(raw)
+        if names is None:
+            names = self._cache[raw] = self._segment(raw)
+        return list(names)
+
 
 def split_star_cast(raw):
     """
     把 Star Cast 这一列拆成一个个独立人名。
     数据里的人名是黏在一起的，比如：
       "Tom CruiseHayley AtwellVing Rhames"
-    用一个简单的规则按小写→大写的边界拆开，
-    再对 Mac/Mc/Di/Le 等前缀做一点合并修复。
+    用一个简单的规则按小写→大写的边界（以及 Jr. / Sr. 之后的大写）拆开，
+    再对 Mac/Mc/Di/Le 等前缀做一点合并修复（"Ian McKellen"）。
 
     注意：这是启发式方法，不是完美的姓名分词。
+    构图时用的是 StarCastSegmenter：先查已知人名，查不到才用这里的规则。
+    这里共用一个没有已知人名的切分器，它的结果缓存在多次调用之间复用。
     """
-    if pd.isna(raw):
-        return []
-
-    s = str(raw).strip()
-    if not s:
-        return []
-
-    # 规范空格
-    s = re.sub(r"\s+", " ", s)
-
-    # 在小写→大写的边界拆分（没有空格）
-    parts = re.split(r"(?<=[a-z])(?=[A-Z])", s)
-    parts = [p.strip() for p in parts if p.strip()]
-    if len(parts) <= 1:
-        return parts
-
-    prefixes = {"Mc", "Mac", "De", "Di", "Le", "La", "Van", "Von", "O'"}
-    merged = []
-    i = 0
-    while i < len(parts):
-        part = parts[i].strip()
-        if i + 1 < len(parts):
-            last_token = part.split()[-1]
-            if last_token in prefixes:
-                # 把前缀碎片和下一段合并在一起
-                part = (part + " " + parts[i + 1].lstrip()).strip()
-                i += 1
-        merged.append(part)
-        i += 1
+    return _HEURISTIC_SEGMENTER.split(raw)
 
-    return merged
+
+_HEURISTIC_SEGMENTER = StarCastSegmenter()
 
 
 def most_common_nonempty(series: pd.Series):
@@ -88,7 +238,378 @@ def most_common_nonempty(series: pd.Series):
     return s.mode().iloc[0]
 
 
-def build_graph(df: pd.DataFrame) -> nx.MultiDiGraph:
+def _clean_movie_attrs(attrs):
+    """去掉 None / NaN 属性，避免 GraphML 类型混乱。"""
+    clean_attrs = {}
+    for k, v in attrs.items():
+        if v is None:
+            continue
+        if isinstance(v, float) and math.isnan(v):
+            continue
+        clean_attrs[k] = v
+    return clean_attrs
+
+
+def _movie_attrs(title, year, imdb_rating, metascore, duration, certificate, genre):
+    """Movie 节点的属性（已去掉缺失值）。"""
+    return _clean_movie_attrs({
+        "type": "movie",
+        "title": title,
+        "year": int(year) if not pd.isna(year) else None,
+        "imdb_rating": float(imdb_rating) if not pd.isna(imdb_rating) else None,
+        "metascore": float(metascore) if not pd.isna(metascore) else None,
+        "duration_minutes": float(duration) if not pd.isna(duration) else None,
+        "certificate": certificate,
+        "genre_primary": genre,
+    })
+
+
+def _has_float_years(years: pd.Series) -> bool:
+    """清洗后的 Year 列是不是 float：有缺失或非整数年份（包括 "1987.0" 这种写法）时就是。"""
+    return years.dtype.kind == "f"
+
+
+def _movie_year(year, float_years: bool):
+    """
+    movie id 里的年份写法。
+
+    整表模式按 (Title, Year) 分组，Year 的类型就是合并后整列的类型：
+    任何一个文件的 Year 有缺失或非整数年份时整列是 float，id 写成 "Title (1987.0)"，
+    否则写成 "Title (1987)"。流式 / 增量 / 分片模式按块读入，分组用的年份只当数值，
+    拼 id 时用全部数据上的 float_years 换成同样的写法。
+    """
+    return float(year) if float_years else int(year)
+
+
+def _add_movie(
+    G,
+    title,
+    year,
+    imdb_rating,
+    metascore,
+    duration,
+    certificate,
+    genre,
+    directors,
+    casts,
+    genres,
+    certificates,
+    split_cast=split_star_cast,
+):
+    """
+    往图里加一部电影节点及其出入边（流式构图 build_graph_from_aggregator 用）。
+    节点 / 边的添加顺序与向量化的 build_graph 完全一致。
+
+    directors / casts / genres / certificates 是按首次出现顺序去重后的原始值。
+    """
+    movie_id = f"movie::{title} ({year})"
+    G.add_node(
+        movie_id,
+        **_movie_attrs(title, year, imdb_rating, metascore, duration, certificate, genre),
+    )
+
+    def add_named_node(kind, name):
+        node_id = f"{kind}::{name}"
+        if not G.has_node(node_id):
+            G.add_node(node_id, type=kind, name=name)
+        return node_id
+
+    # 导演关系
+    for d in directors:
+        d = str(d).strip()
+        if not d:
+            continue
+        director_id = add_named_node("person", d)
+        G.add_edge(director_id, movie_id, relation="DIRECTED")
+
+    # 演员关系（Star Cast）
+    for raw_cast in casts:
+        for name in split_cast(raw_cast):
+            actor_id = add_named_node("person", name)
+            G.add_edge(actor_id, movie_id, relation="ACTED_IN")
+
+    # 类型关系（只用公共字段 Genre）
+    for gname in genres:
+        gname = str(gname).strip()
+        if not gname:
+            continue
+        genre_id = add_named_node("genre", gname)
+        G.add_edge(movie_id, genre_id, relation="HAS_GENRE")
+
+    # 分级关系
+    for cname in certificates:
+        cname = str(cname).strip()
+        if not cname:
+            continue
+        cert_id = add_named_node("certificate", cname)
+        G.add_edge(movie_id, cert_id, relation="HAS_CERTIFICATE")
+
+    return movie_id
+
+
+def _group_means(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    每组非空值的均值：按行的顺序逐个累加，再除以非空个数。
+
+    np.bincount 的 weights 就是按数组顺序逐个加到各组上的（从 0.0 开始），
+    流式构图的 _RunningMean 用同样的顺序累加，两种模式的均值逐位相同。
+    逐组调用 Series.mean() 用的是 numpy 的 pairwise 求和（装了 bottleneck 时又是另一种顺序），
+    组内有 8 行以上时结果可能差在最后一位，所以不去复现它。
+    没有非空值的组返回 NaN。
+    """
+    valid = ~np.isnan(values)
+    sums = np.bincount(codes[valid], weights=values[valid], minlength=n_groups)
+    counts = np.bincount(codes[valid], minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _group_modes(codes: np.ndarray, series: pd.Series, n_groups: int) -> np.ndarray:
+    """每组的 most_common_nonempty：出现最多的非空值，并列取字典序最小，没有则 None。"""
+    valid = series.notna().to_numpy()
+    frame = pd.DataFrame({
+        "g": codes[valid],
+        "v": series[valid].astype(str).str.strip().to_numpy(),
+    })
+    frame = frame[frame["v"] != ""]
+    counts = frame.groupby(["g", "v"], sort=False).size().rename("n").reset_index()
+    best = counts.sort_values(
+        ["g", "n", "v"], ascending=[True, False, True], kind="stable"
+    ).drop_duplicates("g")
+    out = np.full(n_groups, None, dtype=object)
+    out[best["g"].to_numpy()] = best["v"].to_numpy()
+    return out
+
+
+def _first_seen(codes: np.ndarray, series: pd.Series) -> pd.DataFrame:
+    """每组去重后的值（按首次出现顺序），即逐组的 group[col].dropna().unique()。"""
+    frame = pd.DataFrame({"g": codes, "v": series.to_numpy()})
+    return frame.dropna(subset=["v"]).drop_duplicates(ignore_index=True)
+
+
+def _entity_edges(frame: pd.DataFrame, kind: str, relation: str) -> pd.DataFrame:
+    """(组, 名字) 表 -> 边事件表：去掉首尾空白，跳过空名字。"""
+    names = frame["v"].astype(str).str.strip()
+    frame = frame.assign(name=names)[names != ""]
+    return pd.DataFrame({
+        "g": frame["g"].to_numpy(),
+        "node": (f"{kind}::" + frame["name"]).to_numpy(dtype=object),
+        "kind": kind,
+        "name": frame["name"].to_numpy(dtype=object),
+        "relation": relation,
+    })
+
+
+def _partition_tables(df: pd.DataFrame, segmenter: StarCastSegmenter = None):
+    """
+    按 (Title, Year) 聚合一张（部分）表，得到建图所需的两张中间表：
+      - movies：每组一行，列 Title / Year / node / attrs，按 (Title, Year) 排序，
+        行号就是组号 g
+      - edges：列 g / node / kind / name / relation，按 g 稳定排序，
+        组内依次是 导演 → 演员 → 类型 → 分级，各自按首次出现顺序
+    同一组的所有行必须都在 df 里（并行构图时按 (Title, Year) 哈希分区保证这一点）。
+
+    segmenter 默认用 df 自身的人名构造；df 只是全量数据的一部分时，
+    调用方应传入用全量数据构造的 segmenter，保证切分结果和整表构图一致。
+    """
+    if segmenter is None:
+        with profile_stage("cast_segmenter"):
+            segmenter = StarCastSegmenter.from_frame(df)
+    with profile_stage("groupby"):
+        grouped = df.groupby(["Title", "Year"], sort=True)
+        keys = list(grouped.size().index)
+        n_groups = len(keys)
+
+        # 组号按 (Title, Year) 排序；Title / Year 缺失的行和 groupby 一样丢弃：
+        # ngroup() 给这些行 NaN（整列随之变成 float），统一换成 -1 再转回整数
+        codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        order = np.flatnonzero(codes >= 0)
+        order = order[np.argsort(codes[order], kind="stable")]
+        rows = df.iloc[order]
+        codes = codes[order]
+
+    # ---- 电影节点属性：数值列取均值，Certificates / Genre 取众数 ----
+    with profile_stage("movie_aggregates"):
+        means = [
+            _group_means(codes, rows[col].to_numpy(dtype=float), n_groups)
+            for col in NUMERIC_COLS
+        ]
+        certificates = _group_modes(codes, rows["Certificates"], n_groups)
+        genres = _group_modes(codes, rows["Genre"], n_groups)
+
+        movies = pd.DataFrame({
+            "Title": [title for title, _ in keys],
+            "Year": [year for _, year in keys],
+            "node": [f"movie::{title} ({year})" for title, year in keys],
+            "attrs": [
+                _movie_attrs(
+                    title, year, means[0][i], means[1][i], means[2][i], certificates[i], genres[i]
+                )
+                for i, (title, year) in enumerate(keys)
+            ],
+        })
+
+    # ---- 边：每列按组去重后展开成 (组, 实体) 表 ----
+    with profile_stage("edge_extraction"):
+        casts = _first_seen(codes, rows["Star Cast"])
+        split = {raw: segmenter.split(raw) for raw in casts["v"].unique()}
+        casts = casts.assign(v=casts["v"].map(split)).explode("v").dropna(subset=["v"])
+
+        edges = pd.concat(
+            [
+                _entity_edges(_first_seen(codes, rows["Director"]), "person", "DIRECTED"),
+                _entity_edges(casts, "person", "ACTED_IN"),
+                _entity_edges(_first_seen(codes, rows["Genre"]), "genre", "HAS_GENRE"),
+                _entity_edges(_first_seen(codes, rows["Certificates"]), "certificate", "HAS_CERTIFICATE"),
+            ],
+            ignore_index=True,
+        )
+        # 稳定排序只按组号：组内保持 导演 → 演员 → 类型 → 分级 和各自的首次出现顺序
+        edges = edges.iloc[np.argsort(edges["g"].to_numpy(), kind="stable")]
+    return movies, edges.reset_index(drop=True)
+
+
+def _merge_partition_tables(parts):
+    """
+    合并各分区的 (movies, edges)：电影按 (Title, Year) 重新全局排序，
+    边的组号换成全局组号。每组只属于一个分区，组内顺序原样保留。
+    """
+    offsets = np.cumsum([0] + [len(movies) for movies, _ in parts])
+    movies = pd.concat([m for m, _ in parts], ignore_index=True)
+    order = movies.sort_values(["Title", "Year"], kind="stable").index.to_numpy()
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    edges = pd.concat(
+        [e.assign(g=rank[e["g"].to_numpy() + offset]) for (_, e), offset in zip(parts, offsets)],
+        ignore_index=True,
+    )
+    edges = edges.iloc[np.argsort(edges["g"].to_numpy(), kind="stable")]
+    return movies.iloc[order].reset_index(drop=True), edges.reset_index(drop=True)
+
+
+def _assemble_graph(movies: pd.DataFrame, edges: pd.DataFrame) -> nx.MultiDiGraph:
+    """用 _partition_tables 的两张表批量建图。"""
+    with profile_stage("node_creation"):
+        movie_ids = movies["node"].to_numpy(dtype=object)
+        movie_attrs = {}
+        for node, attrs in zip(movie_ids, movies["attrs"]):
+            # 两组拼出同一个 movie id 时与 G.add_node 一样合并属性
+            movie_attrs.setdefault(node, {}).update(attrs)
+
+        # ---- 节点顺序：按 (电影, 它的各条边) 的事件流，取每个节点第一次出现的位置 ----
+        events = pd.concat(
+            [
+                pd.DataFrame({"g": np.arange(len(movies)), "node": movie_ids, "kind": "movie", "name": None}),
+                edges[["g", "node", "kind", "name"]],
+            ],
+            ignore_index=True,
+        )
+        events = events.iloc[np.argsort(events["g"].to_numpy(), kind="stable")]
+        nodes = events.drop_duplicates("node")
+
+        G = nx.MultiDiGraph()
+        G.add_nodes_from(
+            (node, movie_attrs[node] if kind == "movie" else {"type": kind, "name": name})
+            for node, kind, name in zip(nodes["node"], nodes["kind"], nodes["name"])
+        )
+
+    with profile_stage("edge_creation"):
+        movie_of_edge = movie_ids[edges["g"].to_numpy()]
+        G.add_edges_from(
+            (entity, movie, {"relation": relation})
+            if relation in ("DIRECTED", "ACTED_IN")
+            else (movie, entity, {"relation": relation})
+            for entity, movie, relation in zip(edges["node"], movie_of_edge, edges["relation"])
+        )
+    return G
+
+
+def _report_resolve_stats(kind: str, stats: dict) -> None:
+    """报告实体消解里拆完仍然过大、没有比较的模糊块（见 kg_resolve.resolve）。"""
+    if stats["skipped_blocks"]:
+        print(
+            f"{kind}消解：{stats['skipped_blocks']} 个模糊块拆分后仍超过上限，"
+            f"跳过 {stats['skipped_pairs']} 对候选"
+        )
+
+
+def resolve_movie_titles(df: pd.DataFrame):
+    """
+    电影名消解（见 kg_resolve.title_merge_map）：同一年份内只是拼写 / 标点 / 变音符号不同的标题
+    改写成出现最多的那种写法。在聚合之前做，合并后的电影按正常规则求均值和众数。
+
+    返回 (改写后的 df, 被合并的 (Title, Year) 个数)。
+    """
+    with profile_stage("resolve_titles"):
+        counts = df.groupby(["Title", "Year"], sort=False).size()
+        stats = new_resolve_stats()
+        merge = title_merge_map(counts.items(), stats=stats)
+        _report_resolve_stats("电影名", stats)
+        if not merge:
+            return df, 0
+        affected = df["Title"].isin({title for title, _ in merge})
+        titles = df["Title"].to_numpy(dtype=object).copy()
+        years = df["Year"].to_numpy(dtype=object)
+        for i in np.flatnonzero(affected.to_numpy()):
+            titles[i] = merge.get((titles[i], years[i]), titles[i])
+        return df.assign(Title=titles), len(merge)
+
+
+def resolve_person_edges(edges: pd.DataFrame):
+    """
+    人名消解（见 kg_resolve.person_merge_map）：在建图之前把边表里的人名变体改写成规范写法，
+    规范写法取参与边数最多的那个；模糊匹配要求两个写法至少共同参与一部电影。
+    改写后同一部电影里重复的 (人, 关系) 只保留第一条。
+
+    返回 (改写后的边表, 被合并的人名个数)。
+    """
+    with profile_stage("resolve_persons"):
+        persons = edges["kind"].to_numpy() == "person"
+        person_rows = edges.loc[persons, ["name", "g"]]
+        counts = person_rows["name"].value_counts(sort=False)
+        contexts = person_rows.groupby("name", sort=False)["g"].agg(set).to_dict()
+        stats = new_resolve_stats()
+        merge = person_merge_map(counts.items(), contexts, stats=stats)
+        _report_resolve_stats("人名", stats)
+        if not merge:
+            return edges, 0
+        names = edges["name"].to_numpy(dtype=object).copy()
+        nodes = edges["node"].to_numpy(dtype=object).copy()
+        groups = edges["g"].to_numpy()
+        relations = edges["relation"].to_numpy(dtype=object)
+        is_rewritten = persons & edges["name"].isin(merge.keys()).to_numpy()
+        rewritten = np.flatnonzero(is_rewritten)
+        for i in rewritten:
+            names[i] = merge[names[i]]
+            nodes[i] = "person::" + names[i]
+
+        # 原始数据里本来就有的重复边保持不动，只去掉改写后才出现的重复
+        seen = {
+            (groups[i], nodes[i], relations[i])
+            for i in np.flatnonzero(persons & ~is_rewritten)
+        }
+        keep = np.ones(len(edges), dtype=bool)
+        for i in rewritten:
+            key = (groups[i], nodes[i], relations[i])
+            if key in seen:
+                keep[i] = False
+            seen.add(key)
+        edges = edges.assign(name=names, node=nodes)
+        return edges[keep].reset_index(drop=True), len(merge)
+
+
+def build_tables(df: pd.DataFrame, resolve_entities: bool = False):
+    """build_graph 的前半部分：聚合出 (movies, edges) 两张表（见 _partition_tables），不建图。"""
+    if resolve_entities:
+        df, _ = resolve_movie_titles(df)
+    movies, edges = _partition_tables(df)
+    if resolve_entities:
+        edges, _ = resolve_person_edges(edges)
+    return movies, edges
+
+
+def build_graph(df: pd.DataFrame, resolve_entities: bool = False) -> nx.MultiDiGraph:
     """
     根据整理好的 DataFrame 构建 MultiDiGraph。
     节点类型：
@@ -101,137 +622,897 @@ def build_graph(df: pd.DataFrame) -> nx.MultiDiGraph:
       - ACTED_IN
       - HAS_GENRE
       - HAS_CERTIFICATE
+
+    按 Title + Year 聚合，把多文件中的同一电影合并成一个 Movie 节点。
+    聚合和拆边都是整列操作，最后用 add_nodes_from / add_edges_from 批量建图；
+    节点和边的插入顺序与逐组构图完全一致，导出的 GraphML 逐字节相同：
+    每组依次是 电影节点 → 导演 → 演员 → 类型 → 分级，组内按首次出现顺序。
+
+    resolve_entities=True 时先做实体消解：聚合前合并电影名变体，建图前合并人名变体。
     """
-    G = nx.MultiDiGraph()
+    return _assemble_graph(*build_tables(df, resolve_entities))
 
-    def add_movie_node(title, year, row_group):
-        movie_id = f"movie::{title} ({year})"
 
-        # 数值属性用均值聚合
-        imdb_rating = row_group["IMDb Rating"].mean()
-        metascore = row_group["MetaScore"].mean()
-        duration = row_group["Duration (minutes)"].mean()
+def _require_file(f) -> Path:
+    path = Path(f)
+    if not path.exists():
+        raise FileNotFoundError(f"找不到文件：{path.resolve()}")
+    return path
 
-        certificate = most_common_nonempty(row_group["Certificates"])
-        genre = most_common_nonempty(row_group["Genre"])
 
-        attrs = {
-            "type": "movie",
-            "title": title,
-            "year": int(year) if not pd.isna(year) else None,
-            "imdb_rating": float(imdb_rating) if not pd.isna(imdb_rating) else None,
-            "metascore": float(metascore) if not pd.isna(metascore) else None,
-            "duration_minutes": float(duration) if not pd.isna(duration) else None,
-            "certificate": certificate,
-            "genre_primary": genre,
-        }
+def _check_columns(path: Path, columns):
+    missing = set(COMMON_COLS) - set(columns)
+    if missing:
+        raise ValueError(f"{path} 缺少这些公共列：{missing}")
 
-        # 去掉 None / NaN 属性，避免 GraphML 类型混乱
-        clean_attrs = {}
-        for k, v in attrs.items():
-            if v is None:
-                continue
-            if isinstance(v, float) and math.isnan(v):
-                continue
-            clean_attrs[k] = v
-
-        G.add_node(movie_id, **clean_attrs)
-        return movie_id
-
-    def add_person_node(name):
-        person_id = f"person::{name}"
-        if not G.has_node(person_id):
-            G.add_node(person_id, type="person", name=name)
-        return person_id
-
-    def add_genre_node(name):
-        genre_id = f"genre::{name}"
-        if not G.has_node(genre_id):
-            G.add_node(genre_id, type="genre", name=name)
-        return genre_id
-
-    def add_certificate_node(name):
-        cert_id = f"certificate::{name}"
-        if not G.has_node(cert_id):
-            G.add_node(cert_id, type="certificate", name=name)
-        return cert_id
-
-    # 按 Title + Year 聚合，把多文件中的同一电影合并成一个 Movie 节点
-    for (title, year), group in df.groupby(["Title", "Year"]):
-        movie_id = add_movie_node(title, year, group)
-
-        # 导演关系
-        for d in group["Director"].dropna().unique():
-            d = str(d).strip()
-            if not d:
-                continue
-            director_id = add_person_node(d)
-            G.add_edge(director_id, movie_id, relation="DIRECTED")
-
-        # 演员关系（Star Cast）
-        for raw_cast in group["Star Cast"].dropna().unique():
-            for name in split_star_cast(raw_cast):
-                actor_id = add_person_node(name)
-                G.add_edge(actor_id, movie_id, relation="ACTED_IN")
-
-        # 类型关系（只用公共字段 Genre）
-        for gname in group["Genre"].dropna().unique():
-            gname = str(gname).strip()
-            if not gname:
-                continue
-            genre_id = add_genre_node(gname)
-            G.add_edge(movie_id, genre_id, relation="HAS_GENRE")
 
-        # 分级关系
-        for cname in group["Certificates"].dropna().unique():
-            cname = str(cname).strip()
-            if not cname:
-                continue
-            cert_id = add_certificate_node(cname)
-            G.add_edge(movie_id, cert_id, relation="HAS_CERTIFICATE")
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    数值列和 Year 转成数值（无法解析的置为 NaN），字符串列去掉首尾空白。
 
-    return G
+    Year 全是整数时是 int 列，有缺失或非整数年份时整列是 float（见 _movie_year）。
+    """
+    with profile_stage("numeric_coercion"):
+        for col in NUMERIC_COLS + ["Year"]:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    with profile_stage("string_cleaning"):
+        for col in STRING_COLS:
+            df[col] = df[col].astype(str).str.strip()
+    return df
+
+
+def read_csv_file(f) -> pd.DataFrame:
+    """读取单个 CSV，只保留共同字段并清洗。"""
+    path = _require_file(f)
+    with profile_stage("csv_read"):
+        df = pd.read_csv(path)
+        _check_columns(path, df.columns)
+        df = df[COMMON_COLS].copy()
+    return clean_frame(df)
 
 
 def load_and_merge_csv(csv_files):
     """读取多个 CSV，只保留共同字段，然后合并。"""
-    dfs = []
+    return pd.concat([read_csv_file(f) for f in csv_files], ignore_index=True)
+
+
+# ---------------------------------------------------------------------------
+# 并行构图：按文件并行读取，按 (Title, Year) 哈希分区并行聚合，最后合并
+# ---------------------------------------------------------------------------
+
+def partition_frame(df: pd.DataFrame, n_parts: int):
+    """按 (Title, Year) 哈希把行分到 n_parts 个分区，同一部电影的行一定在同一分区。"""
+    hashes = pd.util.hash_pandas_object(df[["Title", "Year"]], index=False).to_numpy()
+    part_of_row = hashes % np.uint64(n_parts)
+    return [df[part_of_row == p] for p in range(n_parts)]
+
+
+def build_graph_parallel(
+    csv_files, workers: int, resolve_entities: bool = False
+) -> nx.MultiDiGraph:
+    """多进程版本的 build_graph(load_and_merge_csv(csv_files))，产出完全相同的图（见 build_tables_parallel）。"""
+    return _assemble_graph(*build_tables_parallel(csv_files, workers, resolve_entities))
+
+
+def build_tables_parallel(csv_files, workers: int, resolve_entities: bool = False):
+    """
+    多进程版本的 build_tables(load_and_merge_csv(csv_files))，产出完全相同的两张表：
+    1) 每个 CSV 在一个子进程里读取、清洗
+    2) 合并后按 (Title, Year) 哈希分成 workers 个分区，各子进程独立聚合出
+       电影属性和边表（均值 / 众数都在组内算，与单进程语义一致）
+       Star Cast 切分器用全量数据构造后分发给各子进程
+    3) 主进程合并各分区的表：电影全局排序（建图由调用方用 _assemble_graph 完成）
+    resolve_entities=True 时电影名消解在分区之前做，人名消解在合并之后做（都需要全局视角）。
+    """
+    # 子进程里的细分阶段不在主进程的 profile 里，这里只按并行步骤整体计时
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        with profile_stage("parallel_csv_read"):
+            df = pd.concat(pool.map(read_csv_file, csv_files), ignore_index=True)
+        if resolve_entities:
+            df, _ = resolve_movie_titles(df)
+        with profile_stage("partition"):
+            segmenter = StarCastSegmenter.from_frame(df)
+            parts = [p for p in partition_frame(df, workers) if len(p)]
+            del df
+        with profile_stage("parallel_aggregate"):
+            tables = list(pool.map(_partition_tables, parts, repeat(segmenter, len(parts))))
+    with profile_stage("merge_partitions"):
+        movies, edges = _merge_partition_tables(tables)
+    if resolve_entities:
+        edges, _ = resolve_person_edges(edges)
+    return movies, edges
+
+
+# ---------------------------------------------------------------------------
+# 流式读取：按块读 CSV，边读边按 (Title, Year) 聚合
+# ---------------------------------------------------------------------------
+
+DEFAULT_CHUNKSIZE = 200_000
+
+# 流式读取时所有公共列一律按字符串读入，清洗时再转数值；
+# 否则 pandas 会逐块推断 dtype，同一列在不同块里可能得到不同类型
+STREAM_DTYPES = {col: str for col in COMMON_COLS}
+
+# 需要保留"去重后的原始值 + 出现次数"的列（用于建边和求众数）
+VALUE_COLS = ["Director", "Star Cast", "Genre", "Certificates"]
+
+
+def _is_missing(v) -> bool:
+    return v is None or (isinstance(v, float) and math.isnan(v))
+
+
+class _RunningMean:
+    """
+    数值列的累计和 / 非空个数，内存是常数。
+
+    按行的顺序逐个累加（从 0.0 开始），和整表模式的 _group_means 顺序相同，
+    所以流式求出的均值与默认模式逐位相同。缺失值不参与累加、不计入个数。
+    """
+
+    __slots__ = ("total", "count")
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, v):
+        if not _is_missing(v):
+            self.total += v
+            self.count += 1
+
+    def mean(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+
+class MovieAggregate:
+    """
+    单部电影（Title + Year）在流式读取过程中的累计状态。
+
+    - 数值列只保留累加状态（见 _RunningMean），最后求均值
+    - VALUE_COLS 每列保留 {值: 出现次数}，dict 的顺序就是值首次出现的顺序
+    """
+
+    __slots__ = ("numbers", "values")
+
+    def __init__(self):
+        self.numbers = tuple(_RunningMean() for _ in NUMERIC_COLS)
+        self.values = tuple({} for _ in VALUE_COLS)
+
+    def add(self, numbers, values):
+        for acc, v in zip(self.numbers, numbers):
+            acc.add(v)
+        for seen, v in zip(self.values, values):
+            if not _is_missing(v):
+                seen[v] = seen.get(v, 0) + 1
+
+    def mean(self, col: str):
+        return self.numbers[NUMERIC_COLS.index(col)].mean()
+
+    def unique(self, col: str):
+        return list(self.values[VALUE_COLS.index(col)])
+
+    def most_common(self, col: str):
+        """与 most_common_nonempty 一致：出现最多的非空值，并列时取字典序最小的。"""
+        counts = {}
+        for v, n in self.values[VALUE_COLS.index(col)].items():
+            v = str(v).strip()
+            if v:
+                counts[v] = counts.get(v, 0) + n
+        if not counts:
+            return None
+        return min(counts, key=lambda v: (-counts[v], v))
+
+
+class StreamingAggregator:
+    """
+    按 (Title, Year) 聚合的流式累加器，内存只随不同电影的数量增长。
+
+    aggregate 是每部电影的累计状态类（默认 MovieAggregate；增量构建按文件聚合时用 MovieSegment）。
+    float_years：读过的块里是否有 float 的 Year 列（见 _movie_year）。
+    """
+
+    def __init__(self, aggregate=None):
+        self.movies = {}
+        self.rows = 0
+        self.float_years = False
+        self._aggregate = aggregate or MovieAggregate
+
+    def update(self, chunk: pd.DataFrame):
+        """吃进一个已清洗的块（见 clean_chunk）。"""
+        self.rows += len(chunk)
+        self.float_years = self.float_years or _has_float_years(chunk["Year"])
+        columns = [chunk[c].tolist() for c in ["Title", "Year"] + NUMERIC_COLS + VALUE_COLS]
+        n_num = len(NUMERIC_COLS)
+        movies = self.movies
+        for title, year, *rest in zip(*columns):
+            # 和 groupby 一样，Title / Year 缺失的行不参与聚合；
+            # 年份 1987 和 1987.0 是同一个 dict key，不同块里的 int / float 年份会聚到一起
+            if _is_missing(title) or _is_missing(year):
+                continue
+            key = (title, year)
+            agg = movies.get(key)
+            if agg is None:
+                agg = movies[key] = self._aggregate()
+            agg.add(rest[:n_num], rest[n_num:])
+
+    def __len__(self):
+        return len(self.movies)
+
+
+def clean_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """流式读取的单块清洗：和整表模式相同的规则（见 clean_frame）。"""
+    return clean_frame(chunk)
+
+
+def iter_csv_chunks(csv_files, chunksize: int = DEFAULT_CHUNKSIZE):
+    """逐个文件、逐块读取公共列（其他列不会被解析），产出清洗后的块。"""
     for f in csv_files:
-        path = Path(f)
-        if not path.exists():
-            raise FileNotFoundError(f"找不到文件：{path.resolve()}")
-        df = pd.read_csv(path)
-        missing = set(COMMON_COLS) - set(df.columns)
-        if missing:
-            raise ValueError(f"{path} 缺少这些公共列：{missing}")
-        dfs.append(df[COMMON_COLS].copy())
+        path = _require_file(f)
+        _check_columns(path, pd.read_csv(path, nrows=0).columns)
+        reader = pd.read_csv(
+            path,
+            usecols=COMMON_COLS,
+            dtype=STREAM_DTYPES,
+            chunksize=chunksize,
+        )
+        while True:
+            # 只给读取本身计时，不把调用方处理这一块的时间算进来
+            with profile_stage("csv_read"):
+                chunk = next(reader, None)
+            if chunk is None:
+                break
+            yield clean_chunk(chunk[COMMON_COLS])
 
-    df = pd.concat(dfs, ignore_index=True)
 
-    # 数值列类型转换
-    numeric_cols = ["IMDb Rating", "MetaScore", "Duration (minutes)"]
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
+def load_and_aggregate_csv_streaming(
+    csv_files, chunksize: int = DEFAULT_CHUNKSIZE
+) -> StreamingAggregator:
+    """流式版本的 load_and_merge_csv：不拼接整表，直接得到按电影聚合的结果。"""
+    agg = StreamingAggregator()
+    for chunk in iter_csv_chunks(csv_files, chunksize):
+        with profile_stage("stream_aggregate"):
+            agg.update(chunk)
+    return agg
 
-    # 字符串列清洗
-    for col in ["Title", "Certificates", "Genre", "Director", "Star Cast"]:
-        df[col] = df[col].astype(str).str.strip()
 
-    return df
+def build_graph_from_aggregator(
+    agg: StreamingAggregator, segmenter: StarCastSegmenter = None, float_years: bool = None
+) -> nx.MultiDiGraph:
+    """
+    用流式聚合结果构图，产出与 build_graph(load_and_merge_csv(...)) 相同的图。
+
+    segmenter 默认用 agg 自身的人名构造，float_years 默认取 agg.float_years；
+    agg 只是全量数据的一部分（一个分片）时，调用方应传入在全量数据上得到的这两项。
+    """
+    if float_years is None:
+        float_years = agg.float_years
+    if segmenter is None:
+        with profile_stage("cast_segmenter"):
+            segmenter = StarCastSegmenter.from_names(
+                {d for m in agg.movies.values() for d in m.unique("Director")},
+                {c for m in agg.movies.values() for c in m.unique("Star Cast")},
+            )
+    with profile_stage("graph_build"):
+        G = nx.MultiDiGraph()
+        # groupby 默认按 (Title, Year) 排序，这里保持同样的电影顺序
+        for key in sorted(agg.movies):
+            _add_movie_aggregate(G, key, agg.movies[key], segmenter.split, float_years)
+    return G
+
+
+def _add_movie_aggregate(G, key, m: MovieAggregate, split_cast, float_years: bool):
+    """用一部电影的 MovieAggregate 往图里加节点和边（见 _add_movie）。"""
+    title, year = key
+    return _add_movie(
+        G,
+        title,
+        _movie_year(year, float_years),
+        imdb_rating=m.mean("IMDb Rating"),
+        metascore=m.mean("MetaScore"),
+        duration=m.mean("Duration (minutes)"),
+        certificate=m.most_common("Certificates"),
+        genre=m.most_common("Genre"),
+        directors=m.unique("Director"),
+        casts=m.unique("Star Cast"),
+        genres=m.unique("Genre"),
+        certificates=m.unique("Certificates"),
+        split_cast=split_cast,
+    )
+
+
+# ---------------------------------------------------------------------------
+# 增量构图：只重新聚合新增 / 变化行涉及到的电影，在上一次的图上打补丁
+# ---------------------------------------------------------------------------
+
+STATE_VERSION = 5
+STATE_SUFFIX = ".state"
+
+# MovieSegment / MovieAggregate 的 values 里 Director / Star Cast 两列的位置（Star Cast 切分器要用全部人名）
+DIRECTOR_COL = VALUE_COLS.index("Director")
+CAST_COL = VALUE_COLS.index("Star Cast")
+
+
+def state_dir_for(graphml_path: str) -> str:
+    """imdb_kg.graphml -> imdb_kg.state/（同目录）。"""
+    root, _ = os.path.splitext(str(graphml_path))
+    return root + STATE_SUFFIX
+
+
+class MovieSegment(MovieAggregate):
+    """
+    一部电影在某一个 CSV 文件里的聚合，增量构建按文件保存它（见 build_graph_incremental）。
+
+    和 MovieAggregate 一样：数值列只保留 (和, 非空个数)，VALUE_COLS 每列保留 {值: 出现次数}，
+    内存不随行数增长。合并几个文件时按文件顺序把各自的和相加（见 _combine_segments），
+    同一部电影在靠后的文件里有多行时，加法的分组和全量构建逐行累加不同，均值可能差在最后一位。
+
+    freeze() 之后只含 tuple，可以直接比较和 pickle。
+    """
+
+    __slots__ = ()
+
+    def freeze(self):
+        return (
+            tuple((acc.total, acc.count) for acc in self.numbers),
+            tuple(tuple(seen.items()) for seen in self.values),
+        )
+
+
+def aggregate_file_segments(path, chunksize: int = DEFAULT_CHUNKSIZE):
+    """流式读一个 CSV，返回 ({(Title, Year): 冻结的 MovieSegment}, 这个文件的 Year 列是否为 float)。"""
+    agg = StreamingAggregator(aggregate=MovieSegment)
+    for chunk in iter_csv_chunks([path], chunksize):
+        with profile_stage("stream_aggregate"):
+            agg.update(chunk)
+    return {key: segment.freeze() for key, segment in agg.movies.items()}, agg.float_years
+
+
+def _combine_segments(segments) -> MovieAggregate:
+    """按文件顺序把一部电影的各个（冻结的）MovieSegment 合成 MovieAggregate：和 / 个数相加，值计数合并。"""
+    agg = MovieAggregate()
+    for numbers, values in segments:
+        for acc, (total, count) in zip(agg.numbers, numbers):
+            acc.total += total
+            acc.count += count
+        for seen, items in zip(agg.values, values):
+            for v, n in items:
+                seen[v] = seen.get(v, 0) + n
+    return agg
+
+
+def _count_values(counts: dict, segments: dict, col: int, sign: int):
+    """把一个文件里各电影第 col 列出现过的值计入（sign=1）/ 移出（sign=-1）counts：值 -> 含有它的电影段数。"""
+    for _, values in segments.values():
+        for v, _ in values[col]:
+            n = counts.get(v, 0) + sign
+            if n:
+                counts[v] = n
+            else:
+                del counts[v]
+
+
+def _segments_path(state_dir: str, csv_key: str) -> str:
+    name = hashlib.sha1(csv_key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(state_dir, f"movies-{name}.pkl")
 
 
-def main():
-    df = load_and_merge_csv(CSV_FILES)
-    print(f"合并后总行数: {len(df)}（包含重复电影记录）")
+def _load_pickle(path: str):
+    with open(path, "rb") as f:
+        return pickle.load(f)
 
-    G = build_graph(df)
+
+def _load_state(state_dir: str):
+    """读取上一次构图的状态；不存在或格式不符时返回 None（退化为全量构建）。"""
+    path = os.path.join(state_dir, "state.pkl")
+    if not os.path.exists(path):
+        return None
+    try:
+        state = _load_pickle(path)
+    except Exception:
+        return None
+    if state.get("version") != STATE_VERSION or state.get("columns") != COMMON_COLS:
+        return None
+    return state
+
+
+def _dump_atomic(obj, path: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(obj, f, protocol=5)
+    os.replace(tmp_path, path)
+
+
+def _movie_node_id(key, float_years: bool) -> str:
+    title, year = key
+    return f"movie::{title} ({_movie_year(year, float_years)})"
+
+
+def _pred_order(agg: MovieAggregate, split_cast) -> list:
+    """一部电影在全量构建里入边的添加顺序（_add_movie：先导演，再按 Star Cast 切出的演员）。"""
+    order = [f"person::{str(d).strip()}" for d in agg.values[DIRECTOR_COL] if str(d).strip()]
+    order.extend(f"person::{name}" for raw in agg.values[CAST_COL] for name in split_cast(raw))
+    return list(dict.fromkeys(order))
+
+
+def patch_graph(
+    G: nx.MultiDiGraph, movie_keys, movies: dict, touched, split_cast, aggregate_of, float_years: bool
+) -> nx.MultiDiGraph:
+    """
+    用上一次的图 G 和受影响电影的新聚合拼出新图（G 本身不修改），
+    节点顺序、每个节点的出边顺序和多重边的 key 都与全量构建相同。
+
+    movie_keys：排好序的全部电影 key（Title, Year）
+    movies：{key: MovieAggregate}，受影响且仍然存在的电影
+    touched：受影响的电影 key（包括已经消失的）
+    aggregate_of：key -> MovieAggregate，用来恢复未受影响电影的入边顺序
+    float_years：movie id 里的年份写法（见 _movie_year），必须和上一次的图相同
+
+    按电影顺序逐部加入新图，和全量构建一样每部电影后面紧跟它第一次引入的实体、再加它的边：
+    - 受影响的电影用 _add_movie 重新加入，已经消失的直接跳过（只连着它们的实体也就不会出现）
+    - 其余电影从 G 复制节点属性和边（连同 key 和属性）。从 GraphML / 快照读回的图里，
+      电影入边按源节点在文件里的先后排列，不一定是导演 / 演员的添加顺序；
+      这个顺序决定电影引入实体的先后。实体都没受影响时，它们在 G 里就是由这部电影引入的，
+      按 G 的节点顺序排即可；否则按 _pred_order 恢复全量构建的顺序
+    """
+    entities = set()
+    for key in touched:
+        node = _movie_node_id(key, float_years)
+        if node in G:
+            entities.update(G.predecessors(node))
+            entities.update(G.successors(node))
+    rank = {node: i for i, node in enumerate(G)}
+
+    H = nx.MultiDiGraph()
+    for key in movie_keys:
+        if key in movies:
+            node = _add_movie_aggregate(H, key, movies[key], split_cast, float_years)
+            entities.update(H.predecessors(node))
+            entities.update(H.successors(node))
+            continue
+        node = _movie_node_id(key, float_years)
+        preds = list(G.predecessors(node))
+        succs = list(G.successors(node))
+        if entities.isdisjoint(preds) and entities.isdisjoint(succs):
+            preds.sort(key=rank.__getitem__)
+        else:
+            preds = _pred_order(aggregate_of(key), split_cast)
+        H.add_node(node, **G.nodes[node])
+        H.add_nodes_from((n, G.nodes[n]) for n in preds + succs if n not in H)
+        H.add_edges_from((u, node, k, d) for u in preds for k, d in G.pred[node][u].items())
+        H.add_edges_from((node, v, k, d) for v in succs for k, d in G.succ[node][v].items())
+    return H
+
+
+def build_graph_incremental(
+    csv_files, state_dir: str, graphml_path: str, chunksize: int = DEFAULT_CHUNKSIZE
+):
+    """
+    增量版本的 build_graph(load_and_merge_csv(csv_files))，产出结构相同的图：
+    节点 / 边及其顺序完全相同，均值由各文件的 (和, 个数) 合并而来，可能差在最后一位（见 MovieSegment）。
+
+    state_dir 里保存上一次构建的：
+      - 每个 CSV 的大小 / mtime，以及它的每部电影聚合（movies-*.pkl，见 MovieSegment）
+      - 每个 CSV 的 Year 列是否为 float（决定 movie id 的年份写法，见 _movie_year）
+      - 全部 Director / Star Cast 值的计数（Star Cast 切分器的已知人名由它们决定）
+      - 每个 Star Cast 原始串的切分结果
+      - 用这份状态写出的 GraphML 的指纹（图本身就是上次写出的快照）
+
+    本次构建时：
+      1) 大小和 mtime 都没变的 CSV 不再解析，直接用保存的电影聚合
+      2) 变化的 CSV 重新聚合，和它上次的电影聚合逐部比较，不同（或新出现 / 消失）的电影记为"受影响"
+      3) 已知人名变了时，重新切分全部 Star Cast，切分结果变了的电影同样受影响
+      4) 只把受影响电影在各文件里的聚合合并成 MovieAggregate，读入上次的快照，
+         用 patch_graph 换掉这些电影的节点和边，拼出新图
+    没有可用的状态 / 快照（或者 CSV 的先后顺序变了、全部电影 id 的年份写法变了）时，
+    用全部电影聚合从头建图。
+
+    返回 (G, 受影响电影数, 电影总数, 待保存的状态)。
+    图写出之后再用 save_incremental_state 保存状态，这样状态总是对应磁盘上的图。
+    """
+    with profile_stage("state_load"):
+        state = _load_state(state_dir) or {}
+    old_files = state.get("files", {})
+    old_year_types = state.get("float_years", {})
+
+    files, segments, changed, year_types = {}, {}, {}, {}
+    rebuild = not state
+    for f in csv_files:
+        path = _require_file(f)
+        key = str(path.resolve())
+        st = os.stat(path)
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        files[key] = entry
+        seg_path = _segments_path(state_dir, key)
+        if key in old_files and not os.path.exists(seg_path):
+            rebuild = True
+        if old_files.get(key) == entry and not rebuild:
+            with profile_stage("state_load"):
+                segments[key] = _load_pickle(seg_path)
+            year_types[key] = old_year_types[key]
+            continue
+        with profile_stage("state_load"):
+            changed[key] = _load_pickle(seg_path) if key in old_files and not rebuild else {}
+        segments[key], year_types[key] = aggregate_file_segments(path, chunksize)
+    for key in old_files:
+        if key not in files:
+            seg_path = _segments_path(state_dir, key)
+            if os.path.exists(seg_path):
+                changed[key] = _load_pickle(seg_path)
+            else:
+                rebuild = True
+    # 同一部电影的行按文件顺序累加，文件的先后变了就只能全部重算
+    if [k for k in files if k in old_files] != [k for k in old_files if k in files]:
+        rebuild = True
+    # 某个文件的 Year 列变成 / 不再是 float 时，全部电影的 id 都要换写法
+    float_years = any(year_types.values())
+    if float_years != any(old_year_types.values()):
+        rebuild = True
+
+    with profile_stage("digest"):
+        movie_keys = sorted(set().union(*(s.keys() for s in segments.values())))
+        if rebuild:
+            touched = set(movie_keys)
+            directors, casts = {}, {}
+            for segs in segments.values():
+                _count_values(directors, segs, DIRECTOR_COL, 1)
+                _count_values(casts, segs, CAST_COL, 1)
+        else:
+            touched = set()
+            directors, casts = dict(state["directors"]), dict(state["casts"])
+            for key, old in changed.items():
+                new = segments.get(key, {})
+                touched.update(k for k in old.keys() | new.keys() if old.get(k) != new.get(k))
+                for counts, col in ((directors, DIRECTOR_COL), (casts, CAST_COL)):
+                    _count_values(counts, old, col, -1)
+                    _count_values(counts, new, col, 1)
+
+    # 已知人名变了，未改动电影的 Star Cast 也可能切得不一样：这些电影同样要重算
+    with profile_stage("cast_segmenter"):
+        cast_splits = state.get("cast_splits", {}) if not rebuild else {}
+        if rebuild or directors.keys() != state["directors"].keys() or casts.keys() != state["casts"].keys():
+            segmenter = StarCastSegmenter.from_names(directors, casts)
+            new_splits = {raw: segmenter.split(raw) for raw in casts}
+            moved = {raw for raw, names in new_splits.items() if cast_splits.get(raw, names) != names}
+            if moved:
+                for segs in segments.values():
+                    touched.update(
+                        k for k, (_, values) in segs.items()
+                        if any(raw in moved for raw, _ in values[CAST_COL])
+                    )
+            cast_splits = new_splits
+
+    with profile_stage("merge_partitions"):
+        movies = {}
+        for k in touched:
+            parts = [segs[k] for segs in segments.values() if k in segs]
+            if parts:
+                movies[k] = _combine_segments(parts)
+
+    G = None
+    if not rebuild and fingerprint_matches(state.get("graph"), graphml_path):
+        with profile_stage("state_load"):
+            G = load_snapshot(graphml_path)
+    # 在上一版图上打补丁时记下改了哪些电影，kg_api 热加载时据此只更新这些电影的索引
+    delta = None
+    if G is not None:
+        delta = {
+            "base": state["graph"],
+            "movies": [_movie_node_id(key, float_years) for key in sorted(touched)],
+        }
+    with profile_stage("graph_build"):
+        if G is None:
+            if not rebuild:
+                # 上次的图不在了（或被别的构建覆盖了）：用全部电影聚合重建
+                touched = set(movie_keys)
+                movies = {
+                    k: _combine_segments([segs[k] for segs in segments.values() if k in segs])
+                    for k in movie_keys
+                }
+            G = nx.MultiDiGraph()
+            for key in movie_keys:
+                _add_movie_aggregate(G, key, movies[key], cast_splits.__getitem__, float_years)
+        elif touched:
+            G = patch_graph(
+                G, movie_keys, movies, touched, cast_splits.__getitem__,
+                lambda k: _combine_segments([segs[k] for segs in segments.values() if k in segs]),
+                float_years,
+            )
+
+    pending = {
+        "files": files,
+        "float_years": year_types,
+        "segments": {key: segments[key] for key in changed if key in segments},
+        "removed": [key for key in changed if key not in segments],
+        "directors": directors,
+        "casts": casts,
+        "cast_splits": cast_splits,
+        "delta": delta,
+    }
+    return G, len(touched), len(movie_keys), pending
+
+
+def save_incremental_state(state_dir: str, pending: dict, graphml_path: str):
+    """图（GraphML + 快照）写出之后保存 build_graph_incremental 的状态和这次的变更记录。"""
+    with profile_stage("state_write"):
+        if pending["delta"] is not None:
+            write_graph_delta(graphml_path, **pending["delta"])
+        else:
+            remove_graph_delta(graphml_path)
+        os.makedirs(state_dir, exist_ok=True)
+        for key, segs in pending["segments"].items():
+            _dump_atomic(segs, _segments_path(state_dir, key))
+        for key in pending["removed"]:
+            seg_path = _segments_path(state_dir, key)
+            if os.path.exists(seg_path):
+                os.remove(seg_path)
+        _dump_atomic(
+            {
+                "version": STATE_VERSION,
+                "columns": COMMON_COLS,
+                "files": pending["files"],
+                "float_years": pending["float_years"],
+                "directors": pending["directors"],
+                "casts": pending["casts"],
+                "cast_splits": pending["cast_splits"],
+                "graph": graphml_fingerprint(graphml_path),
+            },
+            os.path.join(state_dir, "state.pkl"),
+        )
+
+
+# ---------------------------------------------------------------------------
+# 分片输出：按电影标题哈希把行拆成 N 份，逐个分片只用自己那份行建图（格式见 kg_shards.py）
+# ---------------------------------------------------------------------------
+
+def _part_path(parts_dir: str, shard: int) -> str:
+    return os.path.join(parts_dir, f"part_{shard:03d}.pkl")
+
+
+def partition_csv_by_shard(
+    csv_files, num_shards: int, parts_dir: str, chunksize: int = DEFAULT_CHUNKSIZE
+):
+    """
+    流式读取 CSV，把清洗后的行按 shard_of(Title) 落盘到 parts_dir/part_NNN.pkl
+    （每个文件是按读入顺序 pickle 的一串 DataFrame 块），内存里同一时刻只有一块。
+
+    Star Cast 切分器的已知人名和 movie id 的年份写法（见 _movie_year）都依赖全量数据，
+    这里逐块收集，返回 (切分器, float_years)，各分片都用这两项，结果与整图构建一致。
+    """
+    known = set()
+    float_years = False
+    files = [open(_part_path(parts_dir, s), "wb") for s in range(num_shards)]
+    try:
+        for chunk in iter_csv_chunks(csv_files, chunksize):
+            float_years = float_years or _has_float_years(chunk["Year"])
+            with profile_stage("cast_segmenter"):
+                known |= StarCastSegmenter.known_names(
+                    chunk["Director"].dropna().unique(), chunk["Star Cast"].dropna().unique()
+                )
+            with profile_stage("shard_partition"):
+                shards = np.array([shard_of(t, num_shards) for t in chunk["Title"]], dtype=np.int64)
+                for s, piece in chunk.groupby(shards, sort=False):
+                    pickle.dump(piece, files[s], protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for f in files:
+            f.close()
+    with profile_stage("cast_segmenter"):
+        return StarCastSegmenter(sorted(known)), float_years
+
+
+def aggregate_shard_part(parts_dir: str, shard: int) -> StreamingAggregator:
+    """按 (Title, Year) 聚合一个分片落盘的行（与 --stream 相同的聚合）。"""
+    agg = StreamingAggregator()
+    with open(_part_path(parts_dir, shard), "rb") as f:
+        while True:
+            try:
+                piece = pickle.load(f)
+            except EOFError:
+                break
+            with profile_stage("stream_aggregate"):
+                agg.update(piece)
+    return agg
+
+
+def write_shard(
+    parts_dir: str, segmenter: StarCastSegmenter, float_years: bool, args, shard: int, graphml_path: str
+) -> dict:
+    """
+    建好一个分片的图并写出（kg_shards.write_shards 的 write_shard），
+    返回它的电影数 / 节点数 / 边数和实体名（用来写实体字典）。
+    """
+    agg = aggregate_shard_part(parts_dir, shard)
+    G = build_graph_from_aggregator(agg, segmenter, float_years)
+    write_outputs(G, Path(graphml_path), args, quiet=True)
+    return {
+        "movies": len(agg),
+        "nodes": G.number_of_nodes(),
+        "edges": G.number_of_edges(),
+        "entities": shard_entities(G),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="从 IMDb CSV 构建电影知识图谱")
+    parser.add_argument(
+        "--csr",
+        action="store_true",
+        help="额外导出 mmap 用的 CSR 存储目录 imdb_kg.csr/（供 KG_GRAPH_BACKEND=csr 使用）",
+    )
+    parser.add_argument(
+        "--parquet",
+        action="store_true",
+        help="额外导出 Parquet 节点表 / 边表目录 imdb_kg.tables/（需要 pyarrow，供分析任务和 KG_GRAPH_BACKEND=parquet 使用）",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="流式读取 CSV：按块读入公共列并边读边聚合，内存只随电影数量增长",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=DEFAULT_CHUNKSIZE,
+        help=f"--stream / --incremental / --shards 模式下每块的行数（默认 {DEFAULT_CHUNKSIZE}）",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="并行构图的进程数（默认 1，即单进程）；不能和 --stream 同时使用",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="增量构建：只重新聚合新增 / 变化行涉及的电影，状态保存在 imdb_kg.state/",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=None,
+        metavar="N",
+        help="分片输出：按电影标题哈希写成 N 个分片到 imdb_kg.shards/（供 KG_SHARDED=1 使用），不写单个 GraphML；可配合 --workers 并行构建各分片",
+    )
+    parser.add_argument(
+        "--resolve-entities",
+        action="store_true",
+        help="实体消解：合并人名 / 电影名的拼写、空格、变音符号变体（见 kg_resolve.py）",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="build_profile.json",
+        default=None,
+        metavar="REPORT",
+        help="记录各阶段的墙钟时间 / CPU 时间 / 内存峰值，写成 JSON 报告（默认 build_profile.json）",
+    )
+    parser.add_argument(
+        "--profile-cprofile",
+        action="store_true",
+        help="配合 --profile：额外把最慢阶段的 cProfile 统计 dump 成 .prof 文件",
+    )
+    args = parser.parse_args(argv)
+    if args.profile_cprofile and not args.profile:
+        parser.error("--profile-cprofile 需要和 --profile 一起使用")
+    if args.workers < 1:
+        parser.error("--workers 必须 >= 1")
+    if args.stream and args.workers > 1:
+        parser.error("--stream 和 --workers 不能同时使用")
+    if args.incremental and (args.stream or args.workers > 1):
+        parser.error("--incremental 不能和 --stream / --workers 同时使用")
+    if args.resolve_entities and (args.stream or args.incremental):
+        parser.error("--resolve-entities 需要全量数据，不能和 --stream / --incremental 同时使用")
+    if args.shards is not None and args.shards < 1:
+        parser.error("--shards 必须 >= 1")
+    if args.shards and (args.stream or args.incremental or args.resolve_entities):
+        parser.error("--shards 不能和 --stream / --incremental / --resolve-entities 同时使用")
+    return args
+
+
+def write_outputs(G: nx.MultiDiGraph, out_path: Path, args, quiet: bool = False):
+    """写出 GraphML、二进制快照，以及命令行要求的 CSR / Parquet 派生文件。"""
+    with profile_stage("graphml_write"):
+        nx.write_graphml(G, out_path)
+    if not quiet:
+        print(f"GraphML 已保存到: {out_path.resolve()}")
+
+    # 额外写一份二进制快照，kg_api 加载时优先使用，省去 XML 解析
+    with profile_stage("snapshot_write"):
+        snapshot_path = write_snapshot(G, str(out_path))
+    if not quiet:
+        print(f"二进制快照已保存到: {Path(snapshot_path).resolve()}")
+
+    if args.csr:
+        with profile_stage("csr_write"):
+            csr_path = write_csr_store(G, str(out_path))
+        if not quiet:
+            print(f"CSR 存储已保存到: {Path(csr_path).resolve()}")
+
+    if args.parquet:
+        with profile_stage("parquet_write"):
+            tables_path = write_tables(G, str(out_path))
+        if not quiet:
+            print(f"Parquet 节点表 / 边表已保存到: {Path(tables_path).resolve()}")
+
+
+def run_sharded(args, out_path: Path) -> dict:
+    """
+    --shards N：先把 CSV 的行按分片落盘，再逐个分片只读自己那份行聚合、建图、写出，
+    最后写 meta.json。同一时刻只有一个分片（--workers W 时最多 W 个）的数据和图在内存里。
+    """
+    out_dir = shards_path_for(str(out_path))
+    with tempfile.TemporaryDirectory(prefix="shard-parts-", dir=out_path.resolve().parent) as parts_dir:
+        segmenter, float_years = partition_csv_by_shard(CSV_FILES, args.shards, parts_dir, args.chunksize)
+        build = functools.partial(write_shard, parts_dir, segmenter, float_years, args)
+        if args.workers > 1:
+            # 子进程里的细分阶段不在主进程的 profile 里，这里只按并行步骤整体计时
+            with ProcessPoolExecutor(max_workers=min(args.workers, args.shards)) as pool:
+                with profile_stage("parallel_shard_build"):
+                    shards_dir = write_shards(args.shards, out_dir, build, pool.map)
+        else:
+            shards_dir = write_shards(args.shards, out_dir, build)
+    with open(os.path.join(shards_dir, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    print(f"图中电影数: {meta['num_movies']}")
+    print(f"图中边数:   {meta['num_edges']}")
+    print(f"{meta['num_shards']} 个分片已保存到: {Path(shards_dir).resolve()}")
+    return {"movies": meta["num_movies"], "edges": meta["num_edges"], "shards": meta["num_shards"]}
+
+
+def run(args) -> dict:
+    """按命令行参数构图并写出各种产物，返回用于报告的统计数字。"""
+    out_path = Path("imdb_kg.graphml")
+    if args.shards:
+        return run_sharded(args, out_path)
+
+    stats = {}
+    if args.incremental:
+        state_dir = state_dir_for(str(out_path))
+        G, touched, total, pending = build_graph_incremental(
+            CSV_FILES, state_dir, str(out_path), args.chunksize,
+        )
+        print(f"增量构建：{total} 部电影中 {touched} 部需要重新聚合")
+        stats.update(movies=total, touched_movies=touched)
+    elif args.stream:
+        agg = load_and_aggregate_csv_streaming(CSV_FILES, args.chunksize)
+        print(f"读取总行数: {agg.rows}，不同电影数: {len(agg)}")
+        stats.update(rows=agg.rows, movies=len(agg))
+        G = build_graph_from_aggregator(agg)
+    elif args.workers > 1:
+        G = build_graph_parallel(CSV_FILES, args.workers, args.resolve_entities)
+    else:
+        df = load_and_merge_csv(CSV_FILES)
+        print(f"合并后总行数: {len(df)}（包含重复电影记录）")
+        stats.update(rows=len(df))
+        G = build_graph(df, args.resolve_entities)
 
     print(f"图中节点数: {G.number_of_nodes()}")
     print(f"图中边数:   {G.number_of_edges()}")
+    stats.update(nodes=G.number_of_nodes(), edges=G.number_of_edges())
 
-    out_path = Path("imdb_kg.graphml")
-    nx.write_graphml(G, out_path)
-    print(f"GraphML 已保存到: {out_path.resolve()}")
+    write_outputs(G, out_path, args)
+    if args.incremental:
+        save_incremental_state(state_dir, pending, str(out_path))
+    return stats
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.profile:
+        run(args)
+        return
+
+    with BuildProfiler(cprofile=args.profile_cprofile) as prof:
+        stats = run(args)
+    report = prof.write_report(
+        args.profile,
+        argv=sys.argv[1:] if argv is None else list(argv),
+        counts=stats,
+    )
+    print(f"性能报告已保存到: {Path(args.profile).resolve()}（最慢阶段：{report['slowest_stage']}）")
+    if "cprofile" in report:
+        print(f"最慢阶段的 cProfile 统计: {Path(report['cprofile']).resolve()}")
 
 
 if __name__ == "__main__":
@@ -4,7 +4,14 @@
 KG API for the movie knowledge graph.
 
 说明：
-- 读取 imdb_kg.graphml（由你之前的 buildKG.py 生成）
+- 读取 imdb_kg.graphml（由你之前的 buildKG.py 生成）；
+  如果同目录下有与之匹配的二进制快照 imdb_kg.snapshot.pkl，则优先读快照
+- 设置环境变量 KG_GRAPH_BACKEND=csr 时，改用 mmap 的 CSR 存储 imdb_kg.csr/，
+  多个 worker 进程共享同一份图数据（见 kg_csr.py）
+- 设置 KG_GRAPH_BACKEND=parquet 时，从 Parquet 节点表 / 边表 imdb_kg.tables/ 构图（见 kg_tables.py）
+- 设置 KG_SHARDED=1 时读取 buildKG.py --shards N 写出的分片 imdb_kg.shards/（见 kg_shards.py）：
+  每个分片由一个子进程加载成 KGState，查询按标题哈希 / 实体字典只分发到相关分片，
+  再把结果合并成与整图相同的结果
 - 提供一系列面向“电影问答”的查询函数，供上层（例如大模型）调用
 - 所有函数都只做“结构化查询”，不做自然语言处理
 
@@ -13,45 +20,650 @@ KG API for the movie knowledge graph.
 - 如遇同名多部电影，将在内部自动选一个“代表电影”：
     - 优先 IMDb Rating 高的
     - 如果评分一样或缺失，再优先年份新的
+
+加载与热更新：
+- import 时不读图；第一次调用任何查询函数（或 get_graph()）时才加载
+- 图和它的全部索引打包成一个只读的 KGState，每个查询开始时取一次当前 KGState，
+  整个查询都在这一个版本上完成
+- reload_graph() 在旁边构建好新的 KGState 后再原子替换，
+  正在执行的查询继续用旧版本，之后的查询自动用新版本
 """
 
+import contextvars
+import functools
+import inspect
+import logging
+import multiprocessing
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Set, Tuple
 
 import networkx as nx
+import numpy as np
+
+from kg_csr import CSRGraph, CSRQueryIndex, csr_path_for, load_csr_store
+from kg_index import (
+    CoActorIndex,
+    build_keyword_index,
+    build_movie_columns,
+    build_movie_table,
+    build_neighbor_matrix,
+    build_title_index,
+    title_ngrams,
+)
+from kg_shards import load_shard_manifest, shard_of, shards_in, shards_path_for
+from kg_snapshot import load_graph_delta, load_snapshot, snapshot_path_for
+from kg_tables import load_tables, tables_path_for
 
 # ----------------------------------------------------------------------
 # 1. 加载图谱
 # ----------------------------------------------------------------------
 
+logger = logging.getLogger(__name__)
+
 GRAPH_PATH = os.path.join(os.path.dirname(__file__), "imdb_kg.graphml")
 
-if not os.path.exists(GRAPH_PATH):
-    raise FileNotFoundError(f"找不到图文件：{GRAPH_PATH}")
+# 图的存储后端：
+# - "networkx"（默认）：每个进程各自持有一份 MultiDiGraph
+# - "csr"：mmap 打开 buildKG.py --csr 生成的 imdb_kg.csr/，多个 worker 共享物理内存
+# - "parquet"：从 buildKG.py --parquet 生成的 imdb_kg.tables/ 构图（需要 pyarrow）
+GRAPH_BACKEND = os.getenv("KG_GRAPH_BACKEND", "networkx")
+
+# 是否读取分片图谱（imdb_kg.shards/）；分片模式下每个分片仍按 GRAPH_BACKEND 加载
+GRAPH_SHARDED = os.getenv("KG_SHARDED", "0") == "1"
+
+
+def _load_graph(graphml_path: str):
+    """
+    加载图谱：
+    - KG_GRAPH_BACKEND=csr 时优先打开 CSR 存储（见 kg_csr.py）
+    - KG_GRAPH_BACKEND=parquet 时优先从节点表 / 边表构图（见 kg_tables.py）；
+      没有安装 pyarrow 时记一条 warning 日志，按下面的顺序回退
+    - 否则优先读 buildKG.py 生成的二进制快照（见 kg_snapshot.py）
+    - 都不存在或与 GraphML 不一致时回退到解析 GraphML
+    """
+    snapshot_path = snapshot_path_for(graphml_path)
+    csr_path = csr_path_for(graphml_path)
+    tables_path = tables_path_for(graphml_path)
+    if not any(
+        os.path.exists(p) for p in (graphml_path, snapshot_path, csr_path, tables_path)
+    ):
+        raise FileNotFoundError(f"找不到图文件：{graphml_path}")
+
+    if GRAPH_BACKEND == "csr":
+        graph = load_csr_store(graphml_path, csr_path)
+        if graph is not None:
+            return graph
+    elif GRAPH_BACKEND == "parquet":
+        try:
+            graph = load_tables(graphml_path, tables_path)
+        except ImportError as e:
+            logger.warning("KG_GRAPH_BACKEND=parquet 不可用，回退到快照 / GraphML：%s", e)
+            graph = None
+        if graph is not None:
+            return graph
+
+    graph = load_snapshot(graphml_path, snapshot_path)
+    if graph is None:
+        graph = nx.read_graphml(graphml_path)
+    return graph
+
+
+def _source_signature(graphml_path: str):
+    """图文件（GraphML / 快照 / CSR 存储 / Parquet 表 / 分片）的 (size, mtime_ns)，用来判断文件是否被重建过。"""
+    sig = []
+    paths = (
+        graphml_path,
+        snapshot_path_for(graphml_path),
+        os.path.join(csr_path_for(graphml_path), "meta.json"),
+        os.path.join(tables_path_for(graphml_path), "meta.json"),
+        os.path.join(shards_path_for(graphml_path), "meta.json"),
+    )
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+class KGState:
+    """
+    某一个版本的图谱及其全部索引。
+
+    构建完成后只读，多个线程可以同时使用；
+    热更新时整体替换成新的 KGState，而不是原地修改。
+
+    graph 可以是 networkx 的 MultiDiGraph，也可以是 kg_csr.CSRGraph，
+    下面只用到两者共有的那部分接口。
+    """
+
+    # 分片模式下 _current_state() 返回 ShardedKGState，查询函数据此选择实现
+    sharded = False
+
+    def __init__(
+        self, graph, version: int, source: str, source_signature=None, co_actors=None
+    ):
+        """co_actors：已经对应 graph 的合作演员索引（增量热加载时由旧版本更新得到），默认从图构建。"""
+        self.graph = graph
+        self.version = version
+        self.source = source
+        # 加载前记录的文件签名，reload_if_changed() 用它判断文件是否被重建
+        self.source_signature = source_signature
+
+        if isinstance(graph, CSRGraph):
+            # CSR 后端：索引在写 CSR 存储时已经算好，和邻接数组一样 mmap 打开（见 kg_csr.py）
+            self._attach_indexes(CSRQueryIndex(graph))
+            return
+
+        # 节点 id -> 它在 G.nodes 中的位置（相似度矩阵的列号）
+        self.node_pos = {n: i for i, n in enumerate(graph.nodes())}
+        # 标题索引：title -> [movie 节点 id]，以及每个 title 的代表电影
+        self.title_index, self.representative_movie = build_title_index(graph)
+        # 电影序号
+        self.movie_ids, self.movie_index = build_movie_table(graph)
+        # 关键字搜索的 trigram 倒排索引
+        (
+            self.keyword_titles,
+            self.keyword_titles_lower,
+            self.keyword_postings,
+        ) = build_keyword_index(graph, self.movie_ids)
+        # 列式属性存储
+        self.movie_columns = build_movie_columns(graph, self.movie_ids)
+        # 相似电影用的稀疏关联矩阵
+        (
+            self.sim_movie_indptr,
+            self.sim_movie_entities,
+            self.sim_entity_indptr,
+            self.sim_entity_movies,
+        ) = build_neighbor_matrix(graph, self.movie_ids, self.node_pos)
+        # 物化的合作演员邻接表
+        self.co_actors = (
+                co_actors if co_actors is not None else CoActorIndex.from_graph(graph, self.movie_ids)
+            )
+
+    def _attach_indexes(self, index: CSRQueryIndex) -> None:
+        self.node_pos = index.node_pos
+        self.title_index = index.title_index
+        self.representative_movie = index.representative_movie
+        self.movie_ids = index.movie_ids
+        self.movie_index = index.movie_index
+        self.keyword_titles = index.keyword_titles
+        self.keyword_titles_lower = index.keyword_titles_lower
+        self.keyword_postings = index.keyword_postings
+        self.movie_columns = index.movie_columns
+        self.sim_movie_indptr = index.sim_movie_indptr
+        self.sim_movie_entities = index.sim_movie_entities
+        self.sim_entity_indptr = index.sim_entity_indptr
+        self.sim_entity_movies = index.sim_entity_movies
+        self.co_actors = index.co_actors
+
+    # ---------------- 基础查找 ----------------
+
+    def find_movie_nodes_by_title(self, title: str) -> List[str]:
+        return list(self.title_index.get(title, ()))
+
+    def find_movie_node(self, title: str) -> Optional[str]:
+        return self.representative_movie.get(title)
+
+    def find_person_node(self, name: str) -> Optional[str]:
+        node_id = f"person::{name}"
+        if node_id in self.graph:
+            return node_id
+        return None
+
+    # ---------------- 列式存储上的小工具 ----------------
+
+    def movie_record(self, idx: int) -> Dict:
+        """按电影序号从列式存储里取出一条 {title, year, imdb_rating, metascore}。"""
+        cols = self.movie_columns
+        return {
+            "title": cols["title"][idx],
+            "year": _optional(cols["year"][idx], int),
+            "imdb_rating": _optional(cols["imdb_rating"][idx]),
+            "metascore": _optional(cols["metascore"][idx]),
+        }
+
+    def sort_movie_rows(self, rows: np.ndarray, column: str, descending: bool) -> np.ndarray:
+        """
+        按某一列对电影序号数组做稳定排序。
+
+        与 list.sort(key=lambda x: (x is None, x), reverse=descending) 的结果一致：
+        - 升序：有值的在前（相同值保持原顺序），缺失值排在最后
+        - 降序：缺失值排在最前，有值的按降序（相同值保持原顺序）
+        """
+        values = self.movie_columns[column][rows]
+        missing = np.isnan(values)
+        present = rows[~missing]
+        present_values = values[~missing]
+        order = np.argsort(-present_values if descending else present_values, kind="stable")
+        present = present[order]
+        if descending:
+            return np.concatenate([rows[missing], present])
+        return np.concatenate([present, rows[missing]])
+
+    def related_movie_rows(self, node_id: str, relation: str, incoming: bool) -> np.ndarray:
+        """
+        取出与某个节点通过 relation 相连的电影序号（保持边的遍历顺序）。
+
+        incoming=False 时看 node_id 的出边（人物 -> 电影），
+        incoming=True 时看入边（电影 -> 类型 / 分级）。
+        """
+        G = self.graph
+        movie_index = self.movie_index
+        if incoming:
+            edges = G.in_edges(node_id, data=True)
+            rows = [
+                movie_index[u] for u, _, edge in edges
+                if edge.get("relation") == relation and u in movie_index
+            ]
+        else:
+            edges = G.out_edges(node_id, data=True)
+            rows = [
+                movie_index[v] for _, v, edge in edges
+                if edge.get("relation") == relation and v in movie_index
+            ]
+        return np.asarray(rows, dtype=np.int64)
+
+
+class ShardedKGState:
+    """
+    分片图谱的某一个版本（见 kg_shards.py）：每个分片由一个单独的子进程加载并执行查询，
+    本进程只保存 meta.json、实体字典 entities.json 和各分片子进程的句柄，不持有任何分片的图或索引。
+
+    - 按标题查询：同名电影都在 shard_of(title, N) 这一个分片里，只问这个分片
+    - 按实体查询：从实体字典查出含有这个实体的分片，只并行问这些分片，
+      再把它们的结果合并（见下面第 7 节）
+
+    子进程用 spawn 启动（服务进程里已经有线程，fork 不安全）。热更新时新版本另起一组子进程，
+    旧版本的 ShardedKGState 不再被任何查询引用、被回收后，它的子进程在做完手头的查询后退出。
+    """
+
+    sharded = True
+
+    def __init__(self, shards_dir: str, version: int, source: str, source_signature=None):
+        self.version = version
+        self.source = source
+        self.source_signature = source_signature
+
+        manifest = load_shard_manifest(shards_dir)
+        self.meta = manifest["meta"]
+        self.num_shards = self.meta["num_shards"]
+        # {关系: {实体名: 分片位图}}（见 kg_shards.py）
+        self.entities: Dict[str, Dict[str, int]] = manifest["entities"]
+        context = multiprocessing.get_context("spawn")
+        self.workers: List[ProcessPoolExecutor] = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_init_shard_worker,
+                initargs=(path, version),
+            )
+            for path in manifest["paths"]
+        ]
+        try:
+            # 等全部分片加载完：任何一个分片加载失败都在这里抛出，reload_graph() 保留旧版本
+            self.gather(_shard_movie_count)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """停掉各分片子进程（已提交的查询会先做完）。"""
+        for worker in self.workers:
+            worker.shutdown(wait=False)
+
+    # ---------------- 分发 ----------------
+
+    def call(self, shard: int, func, *args):
+        """在第 shard 个分片的子进程里执行 func(该分片的 KGState, *args) 并返回结果。"""
+        return self.workers[shard].submit(_on_shard, func, *args).result()
+
+    def gather(self, func, *args, shards: Optional[List[int]] = None) -> List:
+        """
+        在 shards 这些分片（默认全部）上并行执行 func(KGState, *args)，
+        按分片号返回结果列表。
+        """
+        if shards is None:
+            shards = range(self.num_shards)
+        futures = [self.workers[s].submit(_on_shard, func, *args) for s in shards]
+        return [f.result() for f in futures]
+
+    def home(self, title: str) -> int:
+        """title 所在的分片号（同名电影都在这一个分片里）。"""
+        return shard_of(title, self.num_shards)
+
+    def shards_with(self, relation: str, name: str) -> List[int]:
+        """含有实体 name 的 relation 边的分片号（查实体字典，不问分片）。"""
+        return shards_in(self.entities[relation].get(name, 0))
+
+    def shards_with_nodes(self, node_ids: List[str]) -> List[int]:
+        """含有这些实体节点中任意一个的分片号。"""
+        mask = 0
+        for node_id in node_ids:
+            kind, _, name = node_id.partition("::")
+            relations = _NODE_RELATIONS.get(kind, ())
+            for relation in relations:
+                mask |= self.entities[relation].get(name, 0)
+        return shards_in(mask)
+
+    # ---------------- 基础查找（与 KGState 同名同义） ----------------
+
+    def find_movie_nodes_by_title(self, title: str) -> List[str]:
+        return self.call(self.home(title), _shard_movie_nodes, title)
+
+    def find_movie_node(self, title: str) -> Optional[str]:
+        return self.call(self.home(title), _shard_movie_node, title)
+
+    def find_person_node(self, name: str) -> Optional[str]:
+        # 人物节点至少连着一条 DIRECTED / ACTED_IN 边，实体字典里有名字就有这个节点
+        if name in self.entities["DIRECTED"] or name in self.entities["ACTED_IN"]:
+            return f"person::{name}"
+        return None
+
+
+# 实体节点的类型 -> 实体字典里记录它的关系
+_NODE_RELATIONS = {
+    "person": ("DIRECTED", "ACTED_IN"),
+    "genre": ("HAS_GENRE",),
+    "certificate": ("HAS_CERTIFICATE",),
+}
+
+
+# 分片子进程里加载的那一个分片（只在 ShardedKGState 启动的子进程里有值）
+_SHARD_STATE: Optional[KGState] = None
+
 
-G = nx.read_graphml(GRAPH_PATH)
+def _init_shard_worker(path: str, version: int) -> None:
+    """分片子进程的初始化：只加载自己负责的那一个分片（按 GRAPH_BACKEND）。"""
+    global _SHARD_STATE
+    _SHARD_STATE = KGState(_load_graph(path), version=version, source=path)
+
+
+def _on_shard(func, *args):
+    """在分片子进程里执行 func(本分片的 KGState, *args)。"""
+    return func(_SHARD_STATE, *args)
+
+
+def _shard_movie_count(st: KGState) -> int:
+    return len(st.movie_ids)
+
+
+def _shard_movie_nodes(st: KGState, title: str) -> List[str]:
+    return st.find_movie_nodes_by_title(title)
+
+
+def _shard_movie_node(st: KGState, title: str) -> Optional[str]:
+    return st.find_movie_node(title)
+
+
+def _new_state(path: str, version: int, previous=None):
+    """
+    按 GRAPH_SHARDED 加载整图或分片图谱，返回 KGState / ShardedKGState。
+
+    previous 是当前版本的状态。新图是 buildKG.py --incremental 在 previous 那一版图上
+    打补丁得到的（见 kg_snapshot 的变更记录）时，合作演员索引只按变了的电影更新。
+    """
+    signature = _source_signature(path)
+    if GRAPH_SHARDED:
+        return ShardedKGState(
+            shards_path_for(path), version=version, source=path, source_signature=signature,
+        )
+    graph = _load_graph(path)
+    return KGState(
+        graph, version=version, source=path, source_signature=signature,
+        co_actors=_patched_co_actors(previous, path, signature, graph),
+    )
+
+
+def _patched_co_actors(previous, path: str, signature, graph) -> Optional[CoActorIndex]:
+    """能从 previous 的索引增量更新时返回新图的合作演员索引，否则返回 None。"""
+    # CSR 后端的索引本来就是 mmap 现成的，不需要更新
+    if previous is None or previous.sharded or previous.source != path:
+        return None
+    if isinstance(graph, CSRGraph) or isinstance(previous.graph, CSRGraph):
+        return None
+    delta = load_graph_delta(path)
+    if delta is None or previous.source_signature is None:
+        return None
+    if delta["graph"] != signature[0] or delta["base"] != previous.source_signature[0]:
+        return None
+    return previous.co_actors.patched(previous.graph, graph, delta["movies"])
+
+
+_STATE: Optional[KGState] = None
+_STATE_LOCK = threading.Lock()
+# 串行化 reload，避免两个 reload 交错分配版本号
+_RELOAD_LOCK = threading.Lock()
+# 带缓存的查询在计算期间把状态固定在这里（见 _cached），
+# 它内部再调用 _current_state() 时拿到的是同一个版本
+_PINNED_STATE: contextvars.ContextVar = contextvars.ContextVar("kg_pinned_state", default=None)
+
+
+def _current_state() -> KGState:
+    """
+    取当前版本的 KGState；第一次调用时才真正加载图谱。
+
+    查询函数应当在开头调用一次，然后整个查询都用这一个对象，
+    这样即使中途发生 reload_graph()，也不会混用新旧两个版本。
+    """
+    global _STATE
+    pinned = _PINNED_STATE.get()
+    if pinned is not None:
+        return pinned
+    state = _STATE
+    if state is None:
+        with _STATE_LOCK:
+            if _STATE is None:
+                _STATE = _new_state(GRAPH_PATH, version=1)
+            state = _STATE
+    return state
+
+
+def reload_graph(graph_path: Optional[str] = None) -> int:
+    """
+    重新加载图谱（例如每晚重建 KG 之后），返回新的版本号。
+
+    新的图和索引先在旁边完整构建好，再在锁内一次性替换；
+    构建失败时抛出异常，当前版本保持不变。
+    """
+    global _STATE
+    path = graph_path or GRAPH_PATH
+    with _RELOAD_LOCK:
+        with _STATE_LOCK:
+            previous = _STATE
+        version = previous.version + 1 if previous is not None else 1
+        new_state = _new_state(path, version, previous)
+        with _STATE_LOCK:
+            _STATE = new_state
+    return version
+
+
+def reload_if_changed() -> bool:
+    """
+    如果图文件在加载之后被重建过（大小或 mtime 变化），就执行一次 reload_graph()。
+
+    返回是否发生了重新加载。尚未加载过图时什么也不做。
+    """
+    state = _STATE
+    if state is None:
+        return False
+    if _source_signature(state.source) == state.source_signature:
+        return False
+    reload_graph(state.source)
+    return True
 
 
 def get_graph() -> nx.Graph:
-    """如果在别处需要直接访问图对象，可以用这个函数获取。"""
-    return G
+    """如果在别处需要直接访问图对象，可以用这个函数获取（分片模式下没有整图）。"""
+    st = _current_state()
+    if st.sharded:
+        raise RuntimeError("分片模式（KG_SHARDED=1）下没有完整的图对象，请使用查询函数")
+    return st.graph
+
+
+def get_graph_version() -> int:
+    """当前加载的图谱版本号（每次 reload_graph 加 1）。"""
+    return _current_state().version
 
 
 # ----------------------------------------------------------------------
 # 2. 通用工具函数
 # ----------------------------------------------------------------------
 
+def _optional(value: float, cast=float):
+    """列式数组里的 NaN 还原成 None，其余转成 Python 数值。"""
+    return None if np.isnan(value) else cast(value)
+
+
+# ---------------- 查询结果缓存 ----------------
+#
+# 热门问题（"Christopher Nolan 的电影"、"Inception"）会用同样的参数反复调用同一个查询函数。
+# 这里给公开的查询函数加一层有界的 LRU（可选 TTL）结果缓存：
+# - key = (函数名, 图版本号, 补全默认值后的参数)，reload_graph() 之后旧条目自然失效
+# - 计算期间把取 key 时的 KGState 固定住，中途 reload 也不会把新版本的结果存进旧版本的 key
+# - 存入和取出时都复制一份，调用方修改返回值不会污染缓存
+# - cache_info() 返回命中 / 未命中 / 淘汰次数
+
+# 缓存条目上限（0 表示关闭缓存）和过期时间（秒，0 表示不过期）
+RESULT_CACHE_SIZE = int(os.getenv("KG_CACHE_SIZE", "4096"))
+RESULT_CACHE_TTL = float(os.getenv("KG_CACHE_TTL", "0"))
+
+
+def _freeze(value):
+    """把参数转成可哈希的形式（list / tuple -> tuple，dict -> 排序后的 tuple）。"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+def _clone(value):
+    """复制查询结果（只包含 dict / list / 标量），比 deepcopy 快。"""
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+
+class _ResultCache:
+    """线程安全的 LRU + TTL 缓存。"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """命中返回 (True, value)，否则返回 (False, None)。"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+_RESULT_CACHE = _ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+
+def _cached(func):
+    """给公开查询函数加上结果缓存（见上面的说明）。"""
+    sig = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _RESULT_CACHE.maxsize <= 0:
+            return func(*args, **kwargs)
+        try:
+            bound = sig.bind(*args, **kwargs)
+        except TypeError:
+            # 参数不合法，交给原函数去报错
+            return func(*args, **kwargs)
+        bound.apply_defaults()
+        # 只取一次状态：key 里的版本号和计算用的图必须是同一个版本
+        st = _current_state()
+        key = (func.__name__, st.version, _freeze(tuple(bound.arguments.items())))
+        try:
+            hit, value = _RESULT_CACHE.get(key)
+        except TypeError:
+            # 参数里有不可哈希的对象，不走缓存
+            return func(*args, **kwargs)
+        if hit:
+            return _clone(value)
+
+        token = _PINNED_STATE.set(st)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            _PINNED_STATE.reset(token)
+        _RESULT_CACHE.put(key, _clone(result))
+        return result
+
+    return wrapper
+
+
+def cache_info() -> Dict:
+    """查询结果缓存的统计：hits / misses / evictions / expirations / size。"""
+    return _RESULT_CACHE.info()
+
+
+def cache_clear() -> None:
+    """清空查询结果缓存（统计计数保留）。"""
+    _RESULT_CACHE.clear()
+
+
 def find_movie_nodes_by_title(title: str) -> List[str]:
     """
     根据片名找到所有同名电影的节点 ID 列表。
 
     返回的每个元素都是节点 id，例如 "movie::Inception (2010)"。
     """
-    ids: List[str] = []
-    for n, data in G.nodes(data=True):
-        if data.get("type") == "movie" and data.get("title") == title:
-            ids.append(n)
-    return ids
+    return _current_state().find_movie_nodes_by_title(title)
 
 
 def find_movie_node(title: str) -> Optional[str]:
@@ -62,36 +674,10 @@ def find_movie_node(title: str) -> Optional[str]:
     1) IMDb Rating 高的优先（缺失视为很低）
     2) 如评分相同或缺失，则年份更晚的优先（缺失视为很早）
 
+    代表电影在图加载时已经预先选好（见 kg_index.build_title_index）。
     找不到则返回 None。
     """
-    candidates = []
-    for n, data in G.nodes(data=True):
-        if data.get("type") != "movie":
-            continue
-        if data.get("title") != title:
-            continue
-        candidates.append((n, data))
-
-    if not candidates:
-        return None
-
-    def _score(item):
-        _, d = item
-        rating = d.get("imdb_rating")
-        year = d.get("year")
-        try:
-            rating_val = float(rating) if rating is not None else float("-inf")
-        except (TypeError, ValueError):
-            rating_val = float("-inf")
-        try:
-            year_val = int(year) if year is not None else float("-inf")
-        except (TypeError, ValueError):
-            year_val = float("-inf")
-        # 返回一个元组，先比评分，再比年份
-        return (rating_val, year_val)
-
-    best_node, _ = max(candidates, key=_score)
-    return best_node
+    return _current_state().find_movie_node(title)
 
 
 def find_person_node(name: str) -> Optional[str]:
@@ -100,12 +686,61 @@ def find_person_node(name: str) -> Optional[str]:
 
     人物节点的 id 规则是 "person::<Name>"。
     """
-    node_id = f"person::{name}"
-    if node_id in G:
-        return node_id
-    return None
+    return _current_state().find_person_node(name)
+
 
+def get_entity_names() -> Dict:
+    """
+    图中全部实体的名字，供上层做实体识别（例如 rule_planner.py 的本地规划器）。
 
+    返回：
+    {
+        "version": 图版本号,
+        "titles": [片名, ...],
+        "directors": [导过至少一部电影的人名, ...],
+        "actors": [演过至少一部电影的人名, ...],
+        "genres": [类型名, ...],
+    }
+    各列表已排序；结果较大，不进结果缓存，调用方应按 version 自行缓存。
+    """
+    st = _current_state()
+    if st.sharded:
+        # 人物 / 类型直接取实体字典，只有片名要问各分片
+        names = {
+            "titles": {t for part in st.gather(_shard_titles) for t in part},
+            "directors": st.entities["DIRECTED"].keys(),
+            "actors": st.entities["ACTED_IN"].keys(),
+            "genres": st.entities["HAS_GENRE"].keys(),
+        }
+    else:
+        names = _entity_name_sets(st)
+    out = {key: sorted(values) for key, values in names.items()}
+    out["version"] = st.version
+    return out
+
+
+def _shard_titles(st: KGState) -> List[str]:
+    return [t for t in st.title_index if t]
+
+
+def _entity_name_sets(st: KGState) -> Dict[str, Set[str]]:
+    names = {"titles": set(), "directors": set(), "actors": set(), "genres": set()}
+    names["titles"].update(t for t in st.title_index if t)
+    G = st.graph
+    for n, data in G.nodes(data=True):
+        kind = data.get("type")
+        if kind == "genre" and data.get("name"):
+            names["genres"].add(data["name"])
+        elif kind == "person" and data.get("name"):
+            relations = {edge.get("relation") for _, _, edge in G.out_edges(n, data=True)}
+            if "DIRECTED" in relations:
+                names["directors"].add(data["name"])
+            if "ACTED_IN" in relations:
+                names["actors"].add(data["name"])
+    return names
+
+
+@_cached
 def search_movies_by_keyword(
     keyword: str,
     case_sensitive: bool = False,
@@ -114,37 +749,96 @@ def search_movies_by_keyword(
     """
     按关键字在电影标题中模糊搜索。
 
+    先用 trigram 倒排表求交集得到候选电影，再逐个做子串校验；
+    关键字不足 3 个字符时没有 trigram 可用，退化为扫描预先缓存的标题。
+
     返回：列表，每个元素是 {title, year, imdb_rating}。
     """
-    results: List[Dict] = []
+    st = _current_state()
+    if st.sharded:
+        return _sharded_search_movies_by_keyword(st, keyword, case_sensitive, limit)
+    return _search_movies_by_keyword(st, keyword, case_sensitive, limit)
+
+
+def _search_movies_by_keyword(
+    st: KGState,
+    keyword: str,
+    case_sensitive: bool,
+    limit: Optional[int],
+) -> List[Dict]:
+    return [
+        _keyword_record(st, idx)
+        for idx in _keyword_rows(st, keyword, case_sensitive, limit)
+    ]
+
+
+def _keyword_record(st: KGState, idx: int) -> Dict:
+    data = st.graph.nodes[st.movie_ids[idx]]
+    return {
+        "title": data.get("title", ""),
+        "year": data.get("year"),
+        "imdb_rating": data.get("imdb_rating"),
+    }
+
+
+_NO_POSTINGS = frozenset()
+
+
+def _keyword_rows(
+    st: KGState,
+    keyword: str,
+    case_sensitive: bool,
+    limit: Optional[int],
+) -> List[int]:
+    """标题包含 keyword 的电影序号（按电影序号升序，最多 limit 个）。"""
+    rows: List[int] = []
     if not keyword:
-        return results
+        return rows
+
+    grams = title_ngrams(keyword.casefold())
+    if grams:
+        # 从最短的倒排表开始求交集，集合 & 运算只遍历较小的一方
+        # （CSR 后端的倒排表是升序的电影序号数组，用 np.intersect1d）
+        lists = sorted(
+            (st.keyword_postings.get(gram, _NO_POSTINGS) for gram in grams),
+            key=len,
+        )
+        candidates = lists[0]
+        for other in lists[1:]:
+            if not len(candidates):
+                break
+            if isinstance(candidates, np.ndarray):
+                candidates = np.intersect1d(candidates, other, assume_unique=True)
+            else:
+                candidates = candidates & other
+        # 按电影编号排序，保持与 G.nodes 一致的结果顺序
+        if isinstance(candidates, np.ndarray):
+            candidate_ids = candidates.tolist()
+        else:
+            candidate_ids = sorted(candidates)
+    else:
+        candidate_ids = range(len(st.movie_ids))
 
-    for n, data in G.nodes(data=True):
-        if data.get("type") != "movie":
+    if case_sensitive:
+        needle, haystack = keyword, st.keyword_titles
+    else:
+        needle, haystack = keyword.lower(), st.keyword_titles_lower
+
+    for idx in candidate_ids:
+        if needle not in haystack[idx]:
             continue
-        title = data.get("title", "")
-        if not case_sensitive:
-            if keyword.lower() not in str(title).lower():
-                continue
-        else:
-            if keyword not in str(title):
-                continue
-        results.append({
-            "title": title,
-            "year": data.get("year"),
-            "imdb_rating": data.get("imdb_rating"),
-        })
-        if limit is not None and len(results) >= limit:
+        rows.append(idx)
+        if limit is not None and len(rows) >= limit:
             break
 
-    return results
+    return rows
 
 
 # ----------------------------------------------------------------------
 # 3. 电影相关查询
 # ----------------------------------------------------------------------
 
+@_cached
 def get_movie_basic_info(title: str) -> Optional[Dict]:
     """
     返回一部电影的基本信息和关联实体（按 title 自动选一部“代表电影”）。
@@ -163,10 +857,18 @@ def get_movie_basic_info(title: str) -> Optional[Dict]:
         "node_id": str
     }
     """
-    movie_id = find_movie_node(title)
+    st = _current_state()
+    if st.sharded:
+        return _sharded_movie_basic_info(st, title)
+    return _get_movie_basic_info(st, title)
+
+
+def _get_movie_basic_info(st: KGState, title: str) -> Optional[Dict]:
+    movie_id = st.find_movie_node(title)
     if movie_id is None:
         return None
 
+    G = st.graph
     data = G.nodes[movie_id]
     res: Dict = {
         "title": data.get("title"),
@@ -206,6 +908,7 @@ def get_movie_basic_info(title: str) -> Optional[Dict]:
     return res
 
 
+@_cached
 def get_similar_movies_by_neighbors(
     title: str,
     top_k: int = 10,
@@ -219,7 +922,10 @@ def get_similar_movies_by_neighbors(
     思路：
     - 从目标电影节点出发，找到所有邻居（导演 / 演员 / 类型 / 分级）
     - 再从这些邻居出发，回到其它电影节点
-    - 按共享邻居数量打分，取前 top_k 个
+    - 按共享邻居数量打分，取前 top_k 个（同分按图中顺序）
+
+    实现上使用图加载时预先构建的稀疏关联矩阵（见 kg_index.build_neighbor_matrix），
+    不再每次把整张图复制成无向图。
 
     返回：
     {
@@ -230,10 +936,18 @@ def get_similar_movies_by_neighbors(
         ]
     }
     """
-    movie_id = find_movie_node(title)
+    st = _current_state()
+    if st.sharded:
+        return _sharded_similar_movies_by_neighbors(st, title, top_k)
+    return _get_similar_movies_by_neighbors(st, title, top_k)
+
+
+def _get_similar_movies_by_neighbors(st: KGState, title: str, top_k: Optional[int]) -> Dict:
+    movie_id = st.find_movie_node(title)
     if movie_id is None:
         return {"movie": None, "similar_movies": []}
 
+    G = st.graph
     data = G.nodes[movie_id]
     base_info = {
         "title": data.get("title"),
@@ -242,29 +956,39 @@ def get_similar_movies_by_neighbors(
         "node_id": movie_id,
     }
 
-    # 为了方便，把有向图当无向图看
-    UG = G.to_undirected()
-    neighbors = list(UG.neighbors(movie_id))
-
-    scores: Dict[str, int] = {}
-    for n in neighbors:
-        # 从邻居回到其它电影
-        for m in UG.neighbors(n):
-            if m == movie_id:
-                continue
-            if G.nodes[m].get("type") != "movie":
-                continue
-            scores[m] = scores.get(m, 0) + 1
+    # 稀疏向量乘法：score = A · (A^T · e_movie)
+    # 目标电影的每个邻居实体，把“与它相连的所有电影”各记 1 分
+    row = st.movie_index[movie_id]
+    entities = st.sim_movie_entities[st.sim_movie_indptr[row]:st.sim_movie_indptr[row + 1]]
+    if len(entities):
+        hits = np.concatenate([
+            st.sim_entity_movies[st.sim_entity_indptr[e]:st.sim_entity_indptr[e + 1]]
+            for e in entities
+        ])
+    else:
+        hits = np.empty(0, dtype=np.int64)
+    scores = np.bincount(hits, minlength=len(st.movie_ids))
+    scores[row] = 0
+
+    candidates = np.flatnonzero(scores)
+    if top_k is not None and 0 < top_k < len(candidates):
+        # 用部分选择找到第 top_k 名的分数，只保留不低于它的候选再排序
+        cand_scores = scores[candidates]
+        kth = -np.partition(-cand_scores, top_k - 1)[top_k - 1]
+        candidates = candidates[cand_scores >= kth]
+    # 分数降序，同分按电影序号升序，保证结果稳定
+    ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+    if top_k is not None:
+        ranked = ranked[:top_k]
 
-    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
     similar_movies = []
-    for mid, score in ranked[:top_k]:
-        md = G.nodes[mid]
+    for idx in ranked:
+        md = G.nodes[st.movie_ids[idx]]
         similar_movies.append({
             "title": md.get("title"),
             "year": md.get("year"),
             "imdb_rating": md.get("imdb_rating"),
-            "score": score,
+            "score": int(scores[idx]),
         })
 
     return {"movie": base_info, "similar_movies": similar_movies}
@@ -274,6 +998,69 @@ def get_similar_movies_by_neighbors(
 # 4. 人物相关查询（导演 / 演员）
 # ----------------------------------------------------------------------
 
+# get_movies_by_director / get_movies_by_actor 支持的排序列
+SORTABLE_COLUMNS = {"year", "imdb_rating", "metascore"}
+
+
+def _movies_by_person(
+    st: KGState,
+    name: str,
+    relation: str,
+    year_min: Optional[int],
+    year_max: Optional[int],
+    sort_by: str,
+    descending: bool,
+    limit: Optional[int],
+    expansions: Optional[Dict] = None,
+) -> List[Dict]:
+    """
+    get_movies_by_director / get_movies_by_actor 的公共实现。
+
+    expansions 是批量查询时共享的邻居展开缓存：(node_id, relation) -> 电影序号数组，
+    同一批里重复出现的人物只展开一次。
+    """
+    rows = _person_movie_rows(
+        st, name, relation, year_min, year_max, sort_by, descending, expansions,
+    )
+    if limit is not None:
+        rows = rows[:limit]
+
+    return [st.movie_record(i) for i in rows]
+
+
+def _person_movie_rows(
+    st: KGState,
+    name: str,
+    relation: str,
+    year_min: Optional[int],
+    year_max: Optional[int],
+    sort_by: str,
+    descending: bool,
+    expansions: Optional[Dict] = None,
+) -> np.ndarray:
+    """某人通过 relation 相连的电影序号，已做年份过滤和排序（不截断）。"""
+    node_id = st.find_person_node(name)
+    if not node_id:
+        return np.empty(0, dtype=np.int64)
+
+    rows = _expand_person(st, node_id, relation, expansions)
+
+    # 年份过滤：缺失年份（NaN）与任何比较都为 False，会被自然过滤掉
+    years = st.movie_columns["year"][rows]
+    mask = np.ones(len(rows), dtype=bool)
+    if year_min is not None:
+        mask &= years >= year_min
+    if year_max is not None:
+        mask &= years <= year_max
+    rows = rows[mask]
+
+    # 排序
+    if sort_by in SORTABLE_COLUMNS:
+        rows = st.sort_movie_rows(rows, sort_by, descending)
+    return rows
+
+
+@_cached
 def get_movies_by_director(
     name: str,
     year_min: Optional[int] = None,
@@ -293,50 +1080,18 @@ def get_movies_by_director(
         "metascore": float | None
     }
     """
-    node_id = find_person_node(name)
-    if not node_id:
-        return []
-
-    results: List[Dict] = []
-
-    for u, v, edge in G.out_edges(node_id, data=True):
-        if edge.get("relation") != "DIRECTED":
-            continue
-        mdata = G.nodes[v]
-        if mdata.get("type") != "movie":
-            continue
-
-        y = mdata.get("year")
-        try:
-            y_int = int(y) if y is not None else None
-        except (TypeError, ValueError):
-            y_int = None
-
-        if year_min is not None and (y_int is None or y_int < year_min):
-            continue
-        if year_max is not None and (y_int is None or y_int > year_max):
-            continue
-
-        results.append({
-            "title": mdata.get("title"),
-            "year": y_int,
-            "imdb_rating": mdata.get("imdb_rating"),
-            "metascore": mdata.get("metascore"),
-        })
-
-    # 排序
-    if sort_by in {"year", "imdb_rating", "metascore"}:
-        results.sort(
-            key=lambda x: (x.get(sort_by) is None, x.get(sort_by)),
-            reverse=descending,
+    st = _current_state()
+    if st.sharded:
+        return _sharded_movies_by_person(
+            st, name, "DIRECTED", year_min, year_max, sort_by, descending, limit,
         )
-
-    if limit is not None:
-        results = results[:limit]
-
-    return results
+    return _movies_by_person(
+        st, name, "DIRECTED",
+        year_min, year_max, sort_by, descending, limit,
+    )
 
 
+@_cached
 def get_movies_by_actor(
     name: str,
     year_min: Optional[int] = None,
@@ -350,52 +1105,22 @@ def get_movies_by_actor(
 
     返回结构与 get_movies_by_director 类似。
     """
-    node_id = find_person_node(name)
-    if not node_id:
-        return []
-
-    results: List[Dict] = []
-
-    for u, v, edge in G.out_edges(node_id, data=True):
-        if edge.get("relation") != "ACTED_IN":
-            continue
-        mdata = G.nodes[v]
-        if mdata.get("type") != "movie":
-            continue
-
-        y = mdata.get("year")
-        try:
-            y_int = int(y) if y is not None else None
-        except (TypeError, ValueError):
-            y_int = None
-
-        if year_min is not None and (y_int is None or y_int < year_min):
-            continue
-        if year_max is not None and (y_int is None or y_int > year_max):
-            continue
-
-        results.append({
-            "title": mdata.get("title"),
-            "year": y_int,
-            "imdb_rating": mdata.get("imdb_rating"),
-            "metascore": mdata.get("metascore"),
-        })
-
-    if sort_by in {"year", "imdb_rating", "metascore"}:
-        results.sort(
-            key=lambda x: (x.get(sort_by) is None, x.get(sort_by)),
-            reverse=descending,
+    st = _current_state()
+    if st.sharded:
+        return _sharded_movies_by_person(
+            st, name, "ACTED_IN", year_min, year_max, sort_by, descending, limit,
         )
-
-    if limit is not None:
-        results = results[:limit]
-
-    return results
+    return _movies_by_person(
+        st, name, "ACTED_IN",
+        year_min, year_max, sort_by, descending, limit,
+    )
 
 
+@_cached
 def get_co_actors(name: str, top_k: Optional[int] = None) -> List[Dict]:
     """
-    计算某个演员的“合作演员”（共同出演过电影的人），按合作次数排序。
+    计算某个演员的“合作演员”（共同出演过电影的人），按合作次数排序
+    （次数相同时按名字排序）。
 
     返回：
     [
@@ -403,48 +1128,26 @@ def get_co_actors(name: str, top_k: Optional[int] = None) -> List[Dict]:
         ...
     ]
     """
-    node_id = find_person_node(name)
-    if not node_id:
-        return []
+    st = _current_state()
+    if st.sharded:
+        return _sharded_co_actors(st, name, top_k)
+    return _get_co_actors(st, name, top_k)
 
-    # 先找出他参演的所有电影
-    movies: List[str] = []
-    for u, v, edge in G.out_edges(node_id, data=True):
-        if edge.get("relation") != "ACTED_IN":
-            continue
-        if G.nodes[v].get("type") == "movie":
-            movies.append(v)
 
-    # 再在这些电影中找其他演员
-    co_counts: Dict[str, int] = {}
-
-    for movie_id in set(movies):
-        for u, v, edge in G.in_edges(movie_id, data=True):
-            if edge.get("relation") != "ACTED_IN":
-                continue
-            if u == node_id:
-                continue
-            pdata = G.nodes[u]
-            if pdata.get("type") != "person":
-                continue
-            pname = pdata.get("name")
-            if not pname:
-                continue
-            co_counts[pname] = co_counts.get(pname, 0) + 1
-
-    co_list = [{"name": k, "count": v} for k, v in co_counts.items()]
-    co_list.sort(key=lambda x: x["count"], reverse=True)
-
-    if top_k is not None:
-        co_list = co_list[:top_k]
+def _get_co_actors(st: KGState, name: str, top_k: Optional[int]) -> List[Dict]:
+    node_id = st.find_person_node(name)
+    if not node_id:
+        return []
 
-    return co_list
+    # 合作次数在图加载时已经按演员排好序（见 kg_index.CoActorIndex），这里只需切片
+    return [{"name": k, "count": v} for k, v in st.co_actors.top(node_id, top_k)]
 
 
 # ----------------------------------------------------------------------
 # 5. 类型 / 分级相关查询
 # ----------------------------------------------------------------------
 
+@_cached
 def get_movies_by_genre(
     genre_name: str,
     rating_min: Optional[float] = None,
@@ -460,46 +1163,47 @@ def get_movies_by_genre(
         ...
     ]
     """
-    genre_id = f"genre::{genre_name}"
-    if genre_id not in G:
-        return []
+    st = _current_state()
+    if st.sharded:
+        return _sharded_movies_by_genre(st, genre_name, rating_min, sort_by_rating, limit)
+    return _get_movies_by_genre(st, genre_name, rating_min, sort_by_rating, limit)
 
-    results: List[Dict] = []
-    for u, v, edge in G.in_edges(genre_id, data=True):
-        if edge.get("relation") != "HAS_GENRE":
-            continue
-        mdata = G.nodes[u]
-        if mdata.get("type") != "movie":
-            continue
 
-        rating = mdata.get("imdb_rating")
-        try:
-            r_float = float(rating) if rating is not None else None
-        except (TypeError, ValueError):
-            r_float = None
+def _get_movies_by_genre(
+    st: KGState,
+    genre_name: str,
+    rating_min: Optional[float],
+    sort_by_rating: bool,
+    limit: Optional[int],
+) -> List[Dict]:
+    rows = _genre_movie_rows(st, genre_name, rating_min, sort_by_rating)
+    if limit is not None:
+        rows = rows[:limit]
 
-        if rating_min is not None and (r_float is None or r_float < rating_min):
-            continue
+    return [st.movie_record(i) for i in rows]
 
-        results.append({
-            "title": mdata.get("title"),
-            "year": mdata.get("year"),
-            "imdb_rating": r_float,
-            "metascore": mdata.get("metascore"),
-        })
 
-    if sort_by_rating:
-        results.sort(
-            key=lambda x: (x["imdb_rating"] is None, x["imdb_rating"]),
-            reverse=True,
-        )
+def _genre_movie_rows(
+    st: KGState,
+    genre_name: str,
+    rating_min: Optional[float],
+    sort_by_rating: bool,
+) -> np.ndarray:
+    genre_id = f"genre::{genre_name}"
+    if genre_id not in st.graph:
+        return np.empty(0, dtype=np.int64)
 
-    if limit is not None:
-        results = results[:limit]
+    rows = st.related_movie_rows(genre_id, "HAS_GENRE", incoming=True)
 
-    return results
+    if rating_min is not None:
+        rows = rows[st.movie_columns["imdb_rating"][rows] >= rating_min]
+
+    if sort_by_rating:
+        rows = st.sort_movie_rows(rows, "imdb_rating", descending=True)
+    return rows
 
 
+@_cached
 def get_movies_by_certificate(
     cert_name: str,
     limit: Optional[int] = None,
@@ -509,45 +1213,41 @@ def get_movies_by_certificate(
 
     返回同样是电影列表。
     """
-    cert_id = f"certificate::{cert_name}"
-    if cert_id not in G:
-        return []
+    st = _current_state()
+    if st.sharded:
+        return _sharded_movies_by_certificate(st, cert_name, limit)
+    return _get_movies_by_certificate(st, cert_name, limit)
 
-    results: List[Dict] = []
-    for u, v, edge in G.in_edges(cert_id, data=True):
-        if edge.get("relation") != "HAS_CERTIFICATE":
-            continue
-        mdata = G.nodes[u]
-        if mdata.get("type") != "movie":
-            continue
 
-        results.append({
-            "title": mdata.get("title"),
-            "year": mdata.get("year"),
-            "imdb_rating": mdata.get("imdb_rating"),
-            "metascore": mdata.get("metascore"),
-        })
+def _get_movies_by_certificate(
+    st: KGState,
+    cert_name: str,
+    limit: Optional[int],
+) -> List[Dict]:
+    rows = _certificate_movie_rows(st, cert_name)
+    if limit is not None:
+        rows = rows[:limit]
 
-    # 简单按年份排序
-    def _year_key(x):
-        y = x.get("year")
-        try:
-            return int(y)
-        except (TypeError, ValueError):
-            return 0
+    return [st.movie_record(i) for i in rows]
 
-    results.sort(key=_year_key)
 
-    if limit is not None:
-        results = results[:limit]
+def _certificate_movie_rows(st: KGState, cert_name: str) -> np.ndarray:
+    cert_id = f"certificate::{cert_name}"
+    if cert_id not in st.graph:
+        return np.empty(0, dtype=np.int64)
+
+    rows = st.related_movie_rows(cert_id, "HAS_CERTIFICATE", incoming=True)
 
-    return results
+    # 简单按年份排序（缺失年份视为 0）
+    years = np.nan_to_num(st.movie_columns["year"][rows], nan=0.0)
+    return rows[np.argsort(years, kind="stable")]
 
 
 # ----------------------------------------------------------------------
 # 6. 复合查询：基于一部电影做拓展
 # ----------------------------------------------------------------------
 
+@_cached
 def get_other_movies_by_director_of_movie(title: str) -> Optional[Dict]:
     """
     给一部电影（按 title 自动选代表电影）→ 找导演 → 列出每个导演的其它作品。
@@ -569,7 +1269,32 @@ def get_other_movies_by_director_of_movie(title: str) -> Optional[Dict]:
 
     找不到这部电影时，返回 None。
     """
-    info = get_movie_basic_info(title)
+    st = _current_state()
+    if st.sharded:
+        return _sharded_other_movies_by_director_of_movie(st, title)
+    return _get_other_movies_by_director_of_movie(st, title)
+
+
+def _get_other_movies_by_director_of_movie(
+    st: KGState,
+    title: str,
+    expansions: Optional[Dict] = None,
+) -> Optional[Dict]:
+    def movies_of(director: str) -> List[Dict]:
+        return _movies_by_person(
+            st, director, "DIRECTED",
+            year_min=None, year_max=None, sort_by="year", descending=False, limit=None,
+            expansions=expansions,
+        )
+
+    return _other_movies_by_director(_get_movie_basic_info(st, title), movies_of)
+
+
+def _other_movies_by_director(info: Optional[Dict], movies_of) -> Optional[Dict]:
+    """
+    get_other_movies_by_director_of_movie 的公共部分：
+    info 是这部电影的基本信息，movies_of(导演名) 返回该导演按年份升序的全部作品。
+    """
     if info is None:
         return None
 
@@ -580,7 +1305,7 @@ def get_other_movies_by_director_of_movie(title: str) -> Optional[Dict]:
     result_by_director: List[Dict] = []
 
     for director in info.get("directors", []):
-        movies = get_movies_by_director(director)
+        movies = movies_of(director)
         others = []
         for m in movies:
             if m.get("title") == this_title and m.get("year") == this_year:
@@ -602,12 +1327,445 @@ def get_other_movies_by_director_of_movie(title: str) -> Optional[Dict]:
 
 
 # ----------------------------------------------------------------------
-# 7. 简单自测
+# 7. 分片模式：分发查询到各分片子进程，合并各分片的结果
+# ----------------------------------------------------------------------
+#
+# 每部电影连同它的全部边只在一个分片里，同名电影都在同一个分片里，所以：
+# - 按标题查电影：只问 title 所在的分片（ShardedKGState.home）
+# - 按实体（人物 / 类型 / 分级）查电影：按实体字典只并行问含有这个实体的分片，
+#   各分片先按同样的规则过滤、排序并截断到 limit，再按 (排序键, 合并键) 归并，结果与整图逐条一致
+# - 合作次数、共享邻居数这类计数：相关分片分别计数后相加
+#
+# 合并键是 (标题, 分片内的电影序号)：整图里电影按 (Title, Year) 排序，
+# 不同分片的电影标题一定不同，同一分片里的电影序号就是整图中的相对顺序。
+# 下面的 _shard_* 函数在分片子进程里执行（见 ShardedKGState.call / gather），
+# 只返回 dict / list / 标量，跨进程传回的数据量与结果本身相当。
+
+def _movie_items(st: KGState, rows: np.ndarray) -> List[Tuple[Tuple[str, int], Dict]]:
+    """分片内的电影序号 -> [(合并键, movie_record)]。"""
+    titles = st.movie_columns["title"]
+    return [((titles[i], int(i)), st.movie_record(i)) for i in rows]
+
+
+def _merge_movie_items(
+    items: List[Tuple[Tuple[str, int], Dict]],
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+) -> List[Tuple[Tuple[str, int], Dict]]:
+    """
+    合并多个分片的 (合并键, 记录)：先恢复整图顺序，再按 sort_by 稳定排序。
+    排序规则与 KGState.sort_movie_rows 一致（升序时缺失值在最后，降序时缺失值在最前）。
+    """
+    items = sorted(items, key=lambda item: item[0])
+    if sort_by is None:
+        return items
+    if descending:
+        return sorted(
+            items,
+            key=lambda item: (item[1][sort_by] is not None, -(item[1][sort_by] or 0)),
+        )
+    return sorted(
+        items,
+        key=lambda item: (item[1][sort_by] is None, item[1][sort_by] or 0),
+    )
+
+
+def _gather_items(
+    sst: ShardedKGState, func, *args, shards: Optional[List[int]] = None
+) -> List[Tuple[Tuple[str, int], Dict]]:
+    """在 shards 这些分片（默认全部）上执行返回 (合并键, 记录) 列表的 func，拼成一个列表。"""
+    return [item for part in sst.gather(func, *args, shards=shards) for item in part]
+
+
+def _shard_keyword_hits(
+    st: KGState, keyword: str, case_sensitive: bool, limit: Optional[int]
+) -> List[Tuple[Tuple[str, int], Dict]]:
+    titles = st.movie_columns["title"]
+    return [
+        ((titles[idx], idx), _keyword_record(st, idx))
+        for idx in _keyword_rows(st, keyword, case_sensitive, limit)
+    ]
+
+
+def _sharded_search_movies_by_keyword(
+    sst: ShardedKGState,
+    keyword: str,
+    case_sensitive: bool,
+    limit: Optional[int],
+) -> List[Dict]:
+    hits = sorted(
+        _gather_items(sst, _shard_keyword_hits, keyword, case_sensitive, limit),
+        key=lambda hit: hit[0],
+    )
+    if limit is not None:
+        hits = hits[:limit]
+    return [record for _, record in hits]
+
+
+def _shard_movie_neighbors(st: KGState, title: str) -> Optional[Tuple[Dict, List[str]]]:
+    """代表电影的基本信息和它的全部邻居实体（相似电影推荐的第一步，在 title 所在的分片里执行）。"""
+    movie_id = st.find_movie_node(title)
+    if movie_id is None:
+        return None
+    data = st.graph.nodes[movie_id]
+    base_info = {
+        "title": data.get("title"),
+        "year": data.get("year"),
+        "imdb_rating": data.get("imdb_rating"),
+        "node_id": movie_id,
+    }
+    entities = list(dict.fromkeys([*st.graph.predecessors(movie_id), *st.graph.successors(movie_id)]))
+    return base_info, entities
+
+
+def _shard_similar_candidates(
+    st: KGState, entities: List[str], movie_id: str, top_k: Optional[int]
+) -> List[Tuple[int, Tuple[str, int], Dict]]:
+    """本分片里与 entities 共享邻居的电影：[(-分数, 合并键, 记录)]，已排序并截断到 top_k。"""
+    cols = [c for c in (st.node_pos.get(e) for e in entities) if c is not None]
+    if not cols:
+        return []
+    hits = np.concatenate([
+        st.sim_entity_movies[st.sim_entity_indptr[c]:st.sim_entity_indptr[c + 1]]
+        for c in cols
+    ])
+    scores = np.bincount(hits, minlength=len(st.movie_ids))
+    row = st.movie_index.get(movie_id)
+    if row is not None:
+        scores[row] = 0
+    rows = np.flatnonzero(scores)
+    # 分数降序，同分按电影序号升序（分片内的序号顺序就是合并键的顺序）
+    rows = rows[np.lexsort((rows, -scores[rows]))]
+    if top_k is not None:
+        rows = rows[:top_k]
+
+    titles = st.movie_columns["title"]
+    candidates = []
+    for i in rows:
+        md = st.graph.nodes[st.movie_ids[i]]
+        candidates.append((
+            -int(scores[i]),
+            (titles[i], int(i)),
+            {
+                "title": md.get("title"),
+                "year": md.get("year"),
+                "imdb_rating": md.get("imdb_rating"),
+                "score": int(scores[i]),
+            },
+        ))
+    return candidates
+
+
+def _sharded_similar_movies_by_neighbors(
+    sst: ShardedKGState, title: str, top_k: Optional[int]
+) -> Dict:
+    found = sst.call(sst.home(title), _shard_movie_neighbors, title)
+    if found is None:
+        return {"movie": None, "similar_movies": []}
+    base_info, entities = found
+
+    # 只问含有这部电影任一邻居实体的分片，其他分片里不会有共享邻居的电影
+    candidates = [
+        c
+        for part in sst.gather(
+            _shard_similar_candidates, entities, base_info["node_id"], top_k,
+            shards=sst.shards_with_nodes(entities),
+        )
+        for c in part
+    ]
+    # 分数降序，同分按整图中的电影顺序，与整图上的结果一致
+    candidates.sort(key=lambda c: (c[0], c[1]))
+    if top_k is not None:
+        candidates = candidates[:top_k]
+    return {"movie": base_info, "similar_movies": [record for _, _, record in candidates]}
+
+
+def _shard_person_items(
+    st: KGState,
+    name: str,
+    relation: str,
+    year_min: Optional[int],
+    year_max: Optional[int],
+    sort_by: str,
+    descending: bool,
+    limit: Optional[int],
+) -> List[Tuple[Tuple[str, int], Dict]]:
+    rows = _person_movie_rows(st, name, relation, year_min, year_max, sort_by, descending)
+    if limit is not None:
+        rows = rows[:limit]
+    return _movie_items(st, rows)
+
+
+def _sharded_movies_by_person(
+    sst: ShardedKGState,
+    name: str,
+    relation: str,
+    year_min: Optional[int],
+    year_max: Optional[int],
+    sort_by: str,
+    descending: bool,
+    limit: Optional[int],
+) -> List[Dict]:
+    items = _gather_items(
+        sst, _shard_person_items, name, relation, year_min, year_max, sort_by, descending, limit,
+        shards=sst.shards_with(relation, name),
+    )
+    column = sort_by if sort_by in SORTABLE_COLUMNS else None
+    items = _merge_movie_items(items, column, descending)
+    if limit is not None:
+        items = items[:limit]
+    return [record for _, record in items]
+
+
+def _shard_co_actor_counts(st: KGState, name: str) -> List[Tuple[str, int]]:
+    node_id = st.find_person_node(name)
+    return st.co_actors.top(node_id) if node_id else []
+
+
+def _sharded_co_actors(sst: ShardedKGState, name: str, top_k: Optional[int]) -> List[Dict]:
+    # 每部电影只在一个分片里，合作次数就是这个人演过电影的各分片之和
+    counts: Dict[str, int] = {}
+    for part in sst.gather(_shard_co_actor_counts, name, shards=sst.shards_with("ACTED_IN", name)):
+        for co_actor, count in part:
+            counts[co_actor] = counts.get(co_actor, 0) + count
+    ranked = sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+    if top_k is not None:
+        ranked = ranked[:top_k]
+    return [{"name": k, "count": v} for k, v in ranked]
+
+
+def _shard_genre_items(
+    st: KGState,
+    genre_name: str,
+    rating_min: Optional[float],
+    sort_by_rating: bool,
+    limit: Optional[int],
+) -> List[Tuple[Tuple[str, int], Dict]]:
+    rows = _genre_movie_rows(st, genre_name, rating_min, sort_by_rating)
+    if limit is not None:
+        rows = rows[:limit]
+    return _movie_items(st, rows)
+
+
+def _sharded_movies_by_genre(
+    sst: ShardedKGState,
+    genre_name: str,
+    rating_min: Optional[float],
+    sort_by_rating: bool,
+    limit: Optional[int],
+) -> List[Dict]:
+    items = _gather_items(
+        sst, _shard_genre_items, genre_name, rating_min, sort_by_rating, limit,
+        shards=sst.shards_with("HAS_GENRE", genre_name),
+    )
+    items = _merge_movie_items(items, "imdb_rating" if sort_by_rating else None, descending=True)
+    if limit is not None:
+        items = items[:limit]
+    return [record for _, record in items]
+
+
+def _shard_certificate_items(
+    st: KGState, cert_name: str, limit: Optional[int]
+) -> List[Tuple[Tuple[str, int], Dict]]:
+    rows = _certificate_movie_rows(st, cert_name)
+    if limit is not None:
+        rows = rows[:limit]
+    return _movie_items(st, rows)
+
+
+def _sharded_movies_by_certificate(
+    sst: ShardedKGState,
+    cert_name: str,
+    limit: Optional[int],
+) -> List[Dict]:
+    items = _gather_items(
+        sst, _shard_certificate_items, cert_name, limit,
+        shards=sst.shards_with("HAS_CERTIFICATE", cert_name),
+    )
+    # 与 _certificate_movie_rows 一致：按年份升序（缺失视为 0），同年按整图顺序
+    items.sort(key=lambda item: (item[1]["year"] or 0, item[0]))
+    if limit is not None:
+        items = items[:limit]
+    return [record for _, record in items]
+
+
+def _sharded_movie_basic_info(sst: ShardedKGState, title: str) -> Optional[Dict]:
+    return sst.call(sst.home(title), _get_movie_basic_info, title)
+
+
+def _sharded_other_movies_by_director_of_movie(sst: ShardedKGState, title: str) -> Optional[Dict]:
+    def movies_of(director: str) -> List[Dict]:
+        return _sharded_movies_by_person(
+            sst, director, "DIRECTED",
+            year_min=None, year_max=None, sort_by="year", descending=False, limit=None,
+        )
+
+    return _other_movies_by_director(_sharded_movie_basic_info(sst, title), movies_of)
+
+
+# ----------------------------------------------------------------------
+# 8. 批量查询
+# ----------------------------------------------------------------------
+#
+# 离线评测 / Agent 经常在循环里逐个调用上面的函数。批量版本：
+# - 整批只取一次 KGState（同一批结果一定来自同一个图版本）
+# - 输入先去重，每个不同的实体只解析、展开一次，人物的邻居展开在整批内共享
+# - 结果按输入顺序返回；输入里重复的项得到各自独立的结果副本
+# - 分片模式下逐个调用对应的分片实现（同样只取一次状态、输入去重）
+
+def _expand_person(
+    st: KGState,
+    node_id: str,
+    relation: str,
+    expansions: Optional[Dict],
+) -> np.ndarray:
+    """人物 -> 电影序号的邻居展开，带可选的批内缓存。"""
+    if expansions is None:
+        return st.related_movie_rows(node_id, relation, incoming=False)
+    key = (node_id, relation)
+    rows = expansions.get(key)
+    if rows is None:
+        rows = st.related_movie_rows(node_id, relation, incoming=False)
+        expansions[key] = rows
+    return rows
+
+
+def _in_input_order(keys: List, results: Dict) -> List:
+    """把按去重后的 key 计算的结果还原成输入顺序，重复出现的 key 返回副本。"""
+    out = []
+    seen = set()
+    for k in keys:
+        if k in seen:
+            out.append(_clone(results[k]))
+        else:
+            seen.add(k)
+            out.append(results[k])
+    return out
+
+
+def get_movie_basic_info_many(titles: List[str]) -> List[Optional[Dict]]:
+    """get_movie_basic_info 的批量版本，返回列表与 titles 一一对应。"""
+    st = _current_state()
+    get = _sharded_movie_basic_info if st.sharded else _get_movie_basic_info
+    results = {t: get(st, t) for t in dict.fromkeys(titles)}
+    return _in_input_order(titles, results)
+
+
+def _movies_by_person_many(
+    names: List[str],
+    relation: str,
+    year_min: Optional[int],
+    year_max: Optional[int],
+    sort_by: str,
+    descending: bool,
+    limit: Optional[int],
+) -> List[List[Dict]]:
+    st = _current_state()
+    if st.sharded:
+        results = {
+            n: _sharded_movies_by_person(
+                st, n, relation, year_min, year_max, sort_by, descending, limit,
+            )
+            for n in dict.fromkeys(names)
+        }
+        return _in_input_order(names, results)
+
+    expansions: Dict = {}
+    results = {
+        n: _movies_by_person(
+            st, n, relation, year_min, year_max, sort_by, descending, limit,
+            expansions=expansions,
+        )
+        for n in dict.fromkeys(names)
+    }
+    return _in_input_order(names, results)
+
+
+def get_movies_by_director_many(
+    names: List[str],
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+    sort_by: str = "year",
+    descending: bool = False,
+    limit: Optional[int] = None,
+) -> List[List[Dict]]:
+    """get_movies_by_director 的批量版本，所有导演共用同一组过滤 / 排序参数。"""
+    return _movies_by_person_many(
+        names, "DIRECTED", year_min, year_max, sort_by, descending, limit,
+    )
+
+
+def get_movies_by_actor_many(
+    names: List[str],
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+    sort_by: str = "year",
+    descending: bool = False,
+    limit: Optional[int] = None,
+) -> List[List[Dict]]:
+    """get_movies_by_actor 的批量版本，所有演员共用同一组过滤 / 排序参数。"""
+    return _movies_by_person_many(
+        names, "ACTED_IN", year_min, year_max, sort_by, descending, limit,
+    )
+
+
+def get_similar_movies_by_neighbors_many(
+    titles: List[str],
+    top_k: int = 10,
+) -> List[Dict]:
+    """get_similar_movies_by_neighbors 的批量版本。"""
+    st = _current_state()
+    similar = _sharded_similar_movies_by_neighbors if st.sharded else _get_similar_movies_by_neighbors
+    results = {t: similar(st, t, top_k) for t in dict.fromkeys(titles)}
+    return _in_input_order(titles, results)
+
+
+def get_co_actors_many(
+    names: List[str],
+    top_k: Optional[int] = None,
+) -> List[List[Dict]]:
+    """get_co_actors 的批量版本。"""
+    st = _current_state()
+    co_actors = _sharded_co_actors if st.sharded else _get_co_actors
+    results = {n: co_actors(st, n, top_k) for n in dict.fromkeys(names)}
+    return _in_input_order(names, results)
+
+
+def get_other_movies_by_director_of_movie_many(titles: List[str]) -> List[Optional[Dict]]:
+    """
+    get_other_movies_by_director_of_movie 的批量版本。
+
+    同一导演的作品列表在整批内只展开一次（例如一批里有多部诺兰的电影）。
+    """
+    st = _current_state()
+    if st.sharded:
+        results = {
+            t: _sharded_other_movies_by_director_of_movie(st, t)
+            for t in dict.fromkeys(titles)
+        }
+        return _in_input_order(titles, results)
+
+    expansions: Dict = {}
+    results = {
+        t: _get_other_movies_by_director_of_movie(st, t, expansions)
+        for t in dict.fromkeys(titles)
+    }
+    return _in_input_order(titles, results)
+
+
+# ----------------------------------------------------------------------
+# 9. 简单自测
 # ----------------------------------------------------------------------
 
 if __name__ == "__main__":
-    print("图节点数:", G.number_of_nodes())
-    print("图边数:", G.number_of_edges())
+    state = _current_state()
+    if state.sharded:
+        print("分片数:", state.meta["num_shards"])
+        print("电影数:", state.meta["num_movies"])
+        print("图边数:", state.meta["num_edges"])
+    else:
+        print("图节点数:", state.graph.number_of_nodes())
+        print("图边数:", state.graph.number_of_edges())
 
     demo = get_movie_basic_info("Inception")
     print("\n[Demo] get_movie_basic_info('Inception'):")
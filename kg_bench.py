@@ -0,0 +1,156 @@
+# kg_bench.py
+# -*- coding: utf-8 -*-
+"""
+buildKG.py 的规模测试：在不同行数的合成数据（见 kg_synth.py）上构图，记录时间、内存和图的大小。
+
+用法：
+    python kg_bench.py                                   # 默认 1 万 / 10 万 / 100 万行
+    python kg_bench.py --scales 10000 10000000 --stream  # 流式构图，测到 1000 万行
+    python kg_bench.py --workers 4 --out bench_results.json
+
+- 每个规模的数据生成到 bench_data/rows_<N>/，参数不变时直接复用
+- 每个规模在一个全新的子进程（spawn）里构图，RSS 峰值互不干扰
+- 子进程里用 BuildProfiler 分阶段计时（不开 tracemalloc，开销太大），结果里带各阶段耗时
+- 默认不写 GraphML（它的耗时只和图的大小有关，另加 --write-graphml 测）
+- networkx 的图每条边要几百字节，百万行级别需要数 GB 内存；
+  子进程被系统杀掉时该规模记为失败，继续测下一个
+- --workers 模式下 RSS 峰值只统计主进程（子进程各自的内存不计入）
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List
+
+import networkx as nx
+
+import buildKG
+from kg_profile import BuildProfiler, profile_stage
+from kg_synth import SynthConfig, write_dataset
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+DEFAULT_DATA_DIR = "bench_data"
+
+
+def prepare_dataset(cfg: SynthConfig, data_dir: str) -> List[str]:
+    """生成（或复用已有的）合成数据，返回 CSV 路径列表。"""
+    out_dir = os.path.join(data_dir, f"rows_{cfg.rows}")
+    meta_path = os.path.join(out_dir, "synth_meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        paths = [os.path.join(out_dir, name) for name in meta["files"]]
+        if meta["config"] == cfg.to_dict() and all(os.path.exists(p) for p in paths):
+            return paths
+    return write_dataset(cfg, out_dir)
+
+
+def _build(csv_files: List[str], mode: str, workers: int, chunksize: int, graphml_path: str):
+    """按 mode 构图，和 buildKG.run 里对应的分支一致。"""
+    if mode == "stream":
+        agg = buildKG.load_and_aggregate_csv_streaming(csv_files, chunksize)
+        G = buildKG.build_graph_from_aggregator(agg)
+    elif mode == "workers":
+        G = buildKG.build_graph_parallel(csv_files, workers)
+    else:
+        G = buildKG.build_graph(buildKG.load_and_merge_csv(csv_files))
+    if graphml_path:
+        with profile_stage("graphml_write"):
+            nx.write_graphml(G, graphml_path)
+    return G
+
+
+def bench_one(csv_files: List[str], mode: str, workers: int, chunksize: int, graphml_path: str) -> Dict:
+    """在当前进程里构图一次，返回时间 / 内存 / 图大小。应在新进程里调用。"""
+    with BuildProfiler(trace_memory=False) as prof:
+        G = _build(csv_files, mode, workers, chunksize, graphml_path)
+    report = prof.report()
+    return {
+        "nodes": G.number_of_nodes(),
+        "edges": G.number_of_edges(),
+        "wall_s": report["total"]["wall_s"],
+        "cpu_s": report["total"]["cpu_s"],
+        "rss_peak_mb": report["total"]["rss_peak_mb"],
+        "slowest_stage": report["slowest_stage"],
+        "stages": {s["name"]: s["wall_s"] for s in report["stages"]},
+    }
+
+
+def run_benchmark(args) -> List[Dict]:
+    mode = "stream" if args.stream else "workers" if args.workers > 1 else "default"
+    spawn = mp.get_context("spawn")
+    results = []
+    for rows in args.scales:
+        cfg = SynthConfig(rows=rows, files=args.files, dup_rate=args.dup_rate, seed=args.seed)
+        t0 = time.perf_counter()
+        csv_files = prepare_dataset(cfg, args.data_dir)
+        gen_s = time.perf_counter() - t0
+        size_mb = sum(os.path.getsize(p) for p in csv_files) / (1024 * 1024)
+
+        graphml_path = None
+        if args.write_graphml:
+            graphml_path = os.path.join(args.data_dir, f"rows_{rows}", "bench.graphml")
+        base = {"rows": rows, "mode": mode, "csv_mb": round(size_mb, 1), "generate_s": round(gen_s, 3)}
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                res = pool.submit(
+                    bench_one, csv_files, mode, args.workers, args.chunksize, graphml_path
+                ).result()
+        except BrokenProcessPool:
+            # 通常是内存不够被系统杀掉；记下来继续测其他规模
+            results.append({**base, "error": "构图子进程异常退出（可能是内存不足）"})
+            print(f"{rows:>10} 行 | {size_mb:>8.1f} MB | 构图子进程异常退出（可能是内存不足）", flush=True)
+            continue
+
+        res = {**base, **res}
+        results.append(res)
+        print(
+            f"{rows:>10} 行 | {res['csv_mb']:>8.1f} MB | 构图 {res['wall_s']:>8.2f} s"
+            f" | RSS 峰值 {res['rss_peak_mb'] or 0:>8.1f} MB"
+            f" | 节点 {res['nodes']:>9} | 边 {res['edges']:>10} | 最慢阶段 {res['slowest_stage']}",
+            flush=True,
+        )
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="buildKG 规模测试（合成数据见 kg_synth.py）")
+    parser.add_argument(
+        "--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+        help="要测的总行数（默认 10000 100000 1000000）",
+    )
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help=f"合成数据目录（默认 {DEFAULT_DATA_DIR}/）")
+    parser.add_argument("--files", type=int, default=3, help="每个规模拆成几个 CSV（默认 3）")
+    parser.add_argument("--dup-rate", type=float, default=0.15, help="跨文件重复记录的比例（默认 0.15）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stream", action="store_true", help="用流式构图（buildKG.py --stream）")
+    parser.add_argument(
+        "--chunksize", type=int, default=buildKG.DEFAULT_CHUNKSIZE,
+        help=f"--stream 模式下每块的行数（默认 {buildKG.DEFAULT_CHUNKSIZE}）",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="并行构图的进程数（buildKG.py --workers）")
+    parser.add_argument("--write-graphml", action="store_true", help="同时计入 GraphML 写出的时间")
+    parser.add_argument("--out", default=None, metavar="JSON", help="把结果另存为 JSON")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers 必须 >= 1")
+    if args.stream and args.workers > 1:
+        parser.error("--stream 和 --workers 不能同时使用")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到: {os.path.abspath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
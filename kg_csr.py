@@ -0,0 +1,733 @@
+# kg_csr.py
+# -*- coding: utf-8 -*-
+"""
+基于 CSR 邻接数组的只读图存储，可以用 mmap 在多个 worker 进程之间共享内存。
+
+为什么需要：
+- 每个 uvicorn / gunicorn worker 都各自持有一份 networkx MultiDiGraph，
+  每个节点 / 每条边都是 Python dict，内存是数据本身的好几倍，并且随 worker 数线性增长
+- 这里把图拆成若干个 .npy 数组放在一个目录里（默认 imdb_kg.csr/），
+  每个 worker 用 np.load(..., mmap_mode="r") 打开，操作系统会让所有进程共享同一份物理页
+
+存储内容（目录内）：
+- meta.json：格式版本、节点数、关系列表、属性列表、对应 GraphML 的指纹
+- node_type.npy：节点类型编码（uint8，对应 meta["node_types"]）
+- node_id.bytes.npy / node_id.offsets.npy：节点 id 字符串表（utf-8 拼接 + 偏移）
+- node_id.sorted.npy：按 utf-8 字节序排好的节点下标，用来二分查找 id -> 下标
+- attr.<name>.npy：数值属性，float64，缺失为 NaN（meta 里记录是否还原成 int）
+- attr.<name>.bytes.npy / .offsets.npy / .present.npy：字符串属性
+- out.<REL>.indptr.npy / out.<REL>.indices.npy：按关系类型拆开的出边 CSR
+- in.<REL>.indptr.npy / in.<REL>.indices.npy：按关系类型拆开的入边 CSR
+- index.*.npy：kg_api 的查询索引（标题 / 电影序号 / trigram 倒排 / 列式属性 / 相似度矩阵 /
+  合作演员，见 kg_index.py），写入时算好，读取时由 CSRQueryIndex 同样 mmap 打开，
+  worker 不再各自在 Python 堆上构建这些 dict / set
+
+CSRGraph 实现了 kg_api 用到的那部分 networkx 接口
+（nodes / in / in_edges / out_edges / predecessors / successors ...），
+所以 kg_api 的查询函数不用改就可以跑在它上面。
+同一关系内边的顺序与原 MultiDiGraph 一致；不同关系之间按关系分组返回。
+"""
+
+import json
+import os
+import shutil
+import sys
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
+
+import networkx as nx
+import numpy as np
+
+from kg_index import (
+    CoActorIndex,
+    build_keyword_index,
+    build_movie_columns,
+    build_movie_table,
+    build_neighbor_matrix,
+    build_title_index,
+)
+from kg_snapshot import fingerprint_matches, graphml_fingerprint
+
+CSR_VERSION = 2
+CSR_SUFFIX = ".csr"
+
+
+def csr_path_for(graphml_path: str) -> str:
+    """imdb_kg.graphml -> imdb_kg.csr/（同目录）。"""
+    root, _ = os.path.splitext(str(graphml_path))
+    return root + CSR_SUFFIX
+
+
+# ----------------------------------------------------------------------
+# 写入
+# ----------------------------------------------------------------------
+
+def _string_table(values: List[Optional[str]]):
+    """把字符串列表编码成 (utf-8 字节数组, 偏移数组, 是否存在)。"""
+    encoded = [v.encode("utf-8") if v is not None else b"" for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    present = np.asarray([v is not None for v in values], dtype=np.bool_)
+    return data, offsets, present
+
+
+def _attr_kind(values) -> str:
+    """判断一列属性的存储方式：int / float / str。"""
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "int"
+    if present and all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) for v in present
+    ):
+        return "float"
+    return "str"
+
+
+def write_csr_store(
+    G: nx.MultiDiGraph,
+    graphml_path: str,
+    out_dir: Optional[str] = None,
+) -> str:
+    """
+    把 MultiDiGraph 写成 CSR 存储目录。应在 GraphML 写完之后调用，
+    meta.json 里会记录 GraphML 的指纹，加载时据此判断是否过期。
+
+    返回目录路径。
+    """
+    out_dir = out_dir or csr_path_for(graphml_path)
+    nodes = list(G.nodes())
+    pos = {n: i for i, n in enumerate(nodes)}
+    n_nodes = len(nodes)
+
+    arrays: Dict[str, np.ndarray] = {}
+
+    # 节点类型
+    node_types: List[str] = []
+    type_code: Dict[str, int] = {}
+    codes = np.zeros(n_nodes, dtype=np.uint8)
+    for i, (_, data) in enumerate(G.nodes(data=True)):
+        t = data.get("type") or ""
+        if t not in type_code:
+            type_code[t] = len(node_types)
+            node_types.append(t)
+        codes[i] = type_code[t]
+    arrays["node_type"] = codes
+
+    # 节点 id 字符串表 + 排序后的下标（用于二分查找）
+    ids = [str(n) for n in nodes]
+    data, offsets, _ = _string_table(ids)
+    arrays["node_id.bytes"] = data
+    arrays["node_id.offsets"] = offsets
+    order = sorted(range(n_nodes), key=lambda i: ids[i].encode("utf-8"))
+    arrays["node_id.sorted"] = np.asarray(order, dtype=np.int64)
+
+    # 节点属性（type 单独存了）
+    attr_names: List[str] = []
+    for _, d in G.nodes(data=True):
+        for k in d:
+            if k != "type" and k not in attr_names:
+                attr_names.append(k)
+    attrs_meta: Dict[str, str] = {}
+    for name in attr_names:
+        values = [d.get(name) for _, d in G.nodes(data=True)]
+        kind = _attr_kind(values)
+        attrs_meta[name] = kind
+        if kind in ("int", "float"):
+            arrays[f"attr.{name}"] = np.asarray(
+                [np.nan if v is None else float(v) for v in values], dtype=np.float64,
+            )
+        else:
+            data, offsets, present = _string_table(
+                [None if v is None else str(v) for v in values]
+            )
+            arrays[f"attr.{name}.bytes"] = data
+            arrays[f"attr.{name}.offsets"] = offsets
+            arrays[f"attr.{name}.present"] = present
+
+    # 按关系类型拆开的出边 / 入边 CSR（保持原图中的边顺序）
+    relations: List[str] = []
+    for _, _, d in G.edges(data=True):
+        rel = d.get("relation") or ""
+        if rel not in relations:
+            relations.append(rel)
+
+    for direction in ("out", "in"):
+        lists = {rel: [[] for _ in range(n_nodes)] for rel in relations}
+        for i, n in enumerate(nodes):
+            if direction == "out":
+                for _, v, d in G.out_edges(n, data=True):
+                    lists[d.get("relation") or ""][i].append(pos[v])
+            else:
+                for u, _, d in G.in_edges(n, data=True):
+                    lists[d.get("relation") or ""][i].append(pos[u])
+        for rel in relations:
+            per_node = lists[rel]
+            indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+            np.cumsum([len(x) for x in per_node], out=indptr[1:])
+            indices = np.fromiter(
+                (j for x in per_node for j in x), dtype=np.int64, count=int(indptr[-1]),
+            )
+            arrays[f"{direction}.{rel}.indptr"] = indptr
+            arrays[f"{direction}.{rel}.indices"] = indices
+
+    arrays.update(_query_index_arrays(G, nodes, pos))
+
+    meta = {
+        "version": CSR_VERSION,
+        "num_nodes": n_nodes,
+        "num_edges": G.number_of_edges(),
+        "node_types": node_types,
+        "node_attrs": attrs_meta,
+        "relations": relations,
+        "graphml": graphml_fingerprint(graphml_path) if os.path.exists(graphml_path) else None,
+    }
+
+    # 先写到临时目录，再整体替换，避免 worker 读到写了一半的文件
+    tmp_dir = out_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp_dir, name + ".npy"), arr)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    old_dir = out_dir + ".old"
+    if os.path.exists(out_dir):
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    if os.path.exists(old_dir):
+        # 已经 mmap 了旧文件的进程不受影响（文件删除后映射仍然有效）
+        shutil.rmtree(old_dir)
+    return out_dir
+
+
+# ----------------------------------------------------------------------
+# 查询索引：kg_api 的 KGState 在 CSR 后端上直接 mmap 这些数组（见 CSRQueryIndex）
+# ----------------------------------------------------------------------
+#
+# 变长的映射都摊平成"排好序的 key 字符串表 + indptr + 值数组"：
+# - key 按 utf-8 字节序排列，读取时二分查找
+# - 第 k 个 key 的值是 values[indptr[k]:indptr[k + 1]]
+
+def _utf8_sorted(keys) -> List[str]:
+    return sorted(keys, key=lambda k: k.encode("utf-8"))
+
+
+def _put_strings(arrays: Dict[str, np.ndarray], prefix: str, values, present: bool = False) -> None:
+    data, offsets, flags = _string_table(list(values))
+    arrays[f"{prefix}.bytes"] = data
+    arrays[f"{prefix}.offsets"] = offsets
+    if present:
+        arrays[f"{prefix}.present"] = flags
+
+
+def _ragged(lists, dtype=np.int64):
+    """[[...], [...], ...] -> (indptr, 拼接后的值数组)。"""
+    indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in lists], out=indptr[1:])
+    values = np.fromiter((v for x in lists for v in x), dtype=dtype, count=int(indptr[-1]))
+    return indptr, values
+
+
+def _query_index_arrays(
+    G: nx.MultiDiGraph, nodes: List[str], pos: Dict[str, int]
+) -> Dict[str, np.ndarray]:
+    """用 kg_index 的函数构建全部查询索引（与 networkx 后端完全相同），再摊平成数组。"""
+    title_index, representative = build_title_index(G)
+    movie_ids, movie_index = build_movie_table(G)
+    _, titles_lower, postings = build_keyword_index(G, movie_ids)
+    columns = build_movie_columns(G, movie_ids)
+    sim = build_neighbor_matrix(G, movie_ids, pos)
+    co_actors = CoActorIndex.from_graph(G, movie_ids)
+
+    arrays: Dict[str, np.ndarray] = {}
+
+    # 电影序号 <-> 节点下标
+    movie_nodes = np.asarray([pos[n] for n in movie_ids], dtype=np.int64)
+    node_movie = np.full(len(nodes), -1, dtype=np.int64)
+    node_movie[movie_nodes] = np.arange(len(movie_ids), dtype=np.int64)
+    arrays["index.movie.node"] = movie_nodes
+    arrays["index.node.movie"] = node_movie
+
+    # 标题 -> 同名电影的序号，以及代表电影的序号
+    titles = _utf8_sorted(t for t in title_index if t is not None)
+    _put_strings(arrays, "index.title", titles)
+    arrays["index.title.indptr"], arrays["index.title.movies"] = _ragged(
+        [[movie_index[n] for n in title_index[t]] for t in titles]
+    )
+    arrays["index.title.rep"] = np.asarray(
+        [movie_index[representative[t]] for t in titles], dtype=np.int64,
+    )
+
+    # 列式属性（含关键字搜索用的 lower() 标题）
+    _put_strings(arrays, "index.movie.title", columns["title"], present=True)
+    _put_strings(arrays, "index.movie.title_lower", titles_lower)
+    for name, values in columns.items():
+        if name != "title":
+            arrays[f"index.movie.{name}"] = values
+
+    # trigram -> 电影序号（升序）
+    grams = _utf8_sorted(postings)
+    _put_strings(arrays, "index.gram", grams)
+    arrays["index.gram.indptr"], arrays["index.gram.movies"] = _ragged(
+        [sorted(postings[g]) for g in grams]
+    )
+
+    # 相似电影用的稀疏关联矩阵（本来就是数组）
+    for name, values in zip(("movie_indptr", "movie_entities", "entity_indptr", "entity_movies"), sim):
+        arrays[f"index.sim.{name}"] = values
+
+    # 合作演员：按节点下标排列，每个演员一段已经排好序的 (名字, 次数)
+    ranked = [co_actors.top(n) for n in nodes]
+    arrays["index.coactor.indptr"], arrays["index.coactor.count"] = _ragged(
+        [[count for _, count in r] for r in ranked]
+    )
+    _put_strings(arrays, "index.coactor.name", (name for r in ranked for name, _ in r))
+    return arrays
+
+
+# ----------------------------------------------------------------------
+# 读取
+# ----------------------------------------------------------------------
+
+class _StringColumn:
+    """mmap 上的字符串表，按下标取出 str。"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, present=None):
+        self._data = data
+        self._offsets = offsets
+        self._present = present
+
+    def raw(self, i: int) -> bytes:
+        return self._data[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+    def get(self, i: int) -> Optional[str]:
+        if self._present is not None and not self._present[i]:
+            return None
+        return self.raw(i).decode("utf-8")
+
+
+class _SortedIds:
+    """按 utf-8 字节序排好的节点 id 序列，配合 bisect 做二分查找。"""
+
+    def __init__(self, ids: _StringColumn, order: np.ndarray):
+        self._ids = ids
+        self._order = order
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, k: int) -> bytes:
+        return self._ids.raw(int(self._order[k]))
+
+
+class _NodeView:
+    """模仿 networkx 的 G.nodes：支持 G.nodes[n]、G.nodes()、G.nodes(data=True)。"""
+
+    def __init__(self, graph: "CSRGraph"):
+        self._graph = graph
+
+    def __call__(self, data: bool = False):
+        g = self._graph
+        if data:
+            return ((g.node_id(i), g.node_attrs(i)) for i in range(g.num_nodes))
+        return (g.node_id(i) for i in range(g.num_nodes))
+
+    def __getitem__(self, n) -> Dict:
+        i = self._graph.index_of(n)
+        if i is None:
+            raise KeyError(n)
+        return self._graph.node_attrs(i)
+
+    def __iter__(self):
+        return self()
+
+    def __len__(self):
+        return self._graph.num_nodes
+
+    def __contains__(self, n) -> bool:
+        return n in self._graph
+
+
+class CSRGraph:
+    """
+    只读、基于 mmap 的图，对外提供 kg_api 需要的 networkx 子集接口。
+
+    节点属性每次访问时从列里现拼一个 dict，所以对返回的 dict 做修改不会影响图本身。
+    """
+
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != CSR_VERSION:
+            raise ValueError(f"不支持的 CSR 存储版本：{self.meta.get('version')}")
+
+        self._mmap_mode = "r" if mmap else None
+        load = self.array
+
+        self.num_nodes = int(self.meta["num_nodes"])
+        self.relations: List[str] = list(self.meta["relations"])
+        self._node_types: List[str] = list(self.meta["node_types"])
+        self._type_codes = load("node_type")
+        self._ids = _StringColumn(load("node_id.bytes"), load("node_id.offsets"))
+        self._sorted_ids = _SortedIds(self._ids, load("node_id.sorted"))
+
+        self._num_attrs: Dict[str, tuple] = {}
+        self._str_attrs: Dict[str, _StringColumn] = {}
+        for name, kind in self.meta["node_attrs"].items():
+            if kind in ("int", "float"):
+                self._num_attrs[name] = (load(f"attr.{name}"), int if kind == "int" else float)
+            else:
+                self._str_attrs[name] = _StringColumn(
+                    load(f"attr.{name}.bytes"),
+                    load(f"attr.{name}.offsets"),
+                    load(f"attr.{name}.present"),
+                )
+
+        self._adj: Dict[tuple, tuple] = {}
+        for direction in ("out", "in"):
+            for rel in self.relations:
+                self._adj[(direction, rel)] = (
+                    load(f"{direction}.{rel}.indptr"),
+                    load(f"{direction}.{rel}.indices"),
+                )
+
+        self.graph: Dict = {}
+        self.nodes = _NodeView(self)
+        # 热点 id 的查找结果缓存在本进程里（容量有限）
+        self.index_of = lru_cache(maxsize=1 << 16)(self._index_of)
+
+    def array(self, name: str) -> np.ndarray:
+        """打开存储目录里的一个数组（默认 mmap）。"""
+        return np.load(os.path.join(self.path, name + ".npy"), mmap_mode=self._mmap_mode)
+
+    # ---------------- 节点 ----------------
+
+    def _index_of(self, n) -> Optional[int]:
+        if not isinstance(n, str):
+            return None
+        key = n.encode("utf-8")
+        k = bisect_left(self._sorted_ids, key)
+        if k < len(self._sorted_ids) and self._sorted_ids[k] == key:
+            return int(self._sorted_ids._order[k])
+        return None
+
+    def node_id(self, i: int) -> str:
+        return self._ids.get(i)
+
+    def node_attrs(self, i: int) -> Dict:
+        attrs: Dict = {}
+        t = self._node_types[self._type_codes[i]]
+        if t:
+            attrs["type"] = t
+        for name, col in self._str_attrs.items():
+            v = col.get(i)
+            if v is not None:
+                attrs[name] = v
+        for name, (arr, cast) in self._num_attrs.items():
+            v = arr[i]
+            if not np.isnan(v):
+                attrs[name] = cast(v)
+        return attrs
+
+    def __contains__(self, n) -> bool:
+        return self.index_of(n) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return self.nodes()
+
+    def __len__(self) -> int:
+        return self.num_nodes
+
+    def number_of_nodes(self) -> int:
+        return self.num_nodes
+
+    def number_of_edges(self) -> int:
+        return int(self.meta["num_edges"])
+
+    # ---------------- 边 ----------------
+
+    def _neighbors(self, direction: str, i: int, rel: str) -> np.ndarray:
+        indptr, indices = self._adj[(direction, rel)]
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def _index_or_raise(self, n) -> int:
+        i = self.index_of(n)
+        if i is None:
+            raise nx.NetworkXError(f"The node {n} is not in the graph.")
+        return i
+
+    def out_edges(self, n, data: bool = False):
+        i = self._index_or_raise(n)
+        for rel in self.relations:
+            for j in self._neighbors("out", i, rel).tolist():
+                v = self.node_id(j)
+                yield (n, v, {"relation": rel}) if data else (n, v)
+
+    def in_edges(self, n, data: bool = False):
+        i = self._index_or_raise(n)
+        for rel in self.relations:
+            for j in self._neighbors("in", i, rel).tolist():
+                u = self.node_id(j)
+                yield (u, n, {"relation": rel}) if data else (u, n)
+
+    def successors(self, n) -> Iterator[str]:
+        i = self._index_or_raise(n)
+        seen = set()
+        for rel in self.relations:
+            for j in self._neighbors("out", i, rel).tolist():
+                if j not in seen:
+                    seen.add(j)
+                    yield self.node_id(j)
+
+    def predecessors(self, n) -> Iterator[str]:
+        i = self._index_or_raise(n)
+        seen = set()
+        for rel in self.relations:
+            for j in self._neighbors("in", i, rel).tolist():
+                if j not in seen:
+                    seen.add(j)
+                    yield self.node_id(j)
+
+
+# ----------------------------------------------------------------------
+# 读取查询索引
+# ----------------------------------------------------------------------
+#
+# 下面几个小类把 index.*.npy 包装成 kg_api 里对应 dict / list 的只读接口，
+# 查一次只解码用到的那几个字符串，不在进程里物化整张表。
+
+class _SortedKeys:
+    """写入时按 utf-8 字节序排好的字符串表，二分查找 key 的位置。"""
+
+    def __init__(self, column: _StringColumn, size: int):
+        self._column = column
+        self._size = size
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, k: int) -> bytes:
+        return self._column.raw(k)
+
+    def find(self, key) -> Optional[int]:
+        if not isinstance(key, str):
+            return None
+        raw = key.encode("utf-8")
+        k = bisect_left(self, raw)
+        if k < self._size and self[k] == raw:
+            return k
+        return None
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._column.get(k) for k in range(self._size))
+
+
+class _StringSequence:
+    """按下标取字符串的只读序列（代替 list[str]）；缺失值返回 default。"""
+
+    def __init__(self, column: _StringColumn, size: int, default=None):
+        self._column = column
+        self._size = size
+        self._default = default
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i: int):
+        value = self._column.get(int(i))
+        return self._default if value is None else value
+
+
+class _MovieIds:
+    """电影序号 -> 节点 id（代替 KGState.movie_ids 列表）。"""
+
+    def __init__(self, graph: "CSRGraph", movie_nodes: np.ndarray):
+        self._graph = graph
+        self._movie_nodes = movie_nodes
+
+    def __len__(self):
+        return len(self._movie_nodes)
+
+    def __getitem__(self, idx: int) -> str:
+        return self._graph.node_id(int(self._movie_nodes[idx]))
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._graph.node_id(int(i)) for i in self._movie_nodes)
+
+
+class _NodeLookup:
+    """节点 id -> 按节点下标存放的一个整数（< 0 表示没有），代替 {node_id: int} 的 dict。"""
+
+    def __init__(self, graph: "CSRGraph", values: Optional[np.ndarray] = None):
+        self._graph = graph
+        self._values = values
+
+    def get(self, n, default=None):
+        i = self._graph.index_of(n)
+        if i is None:
+            return default
+        if self._values is None:
+            return i
+        value = int(self._values[i])
+        return default if value < 0 else value
+
+    def __getitem__(self, n) -> int:
+        value = self.get(n)
+        if value is None:
+            raise KeyError(n)
+        return value
+
+    def __contains__(self, n) -> bool:
+        return self.get(n) is not None
+
+
+class _TitleIndex:
+    """title -> [同名电影的节点 id]（代替 KGState.title_index），可迭代全部标题。"""
+
+    def __init__(self, keys: _SortedKeys, indptr: np.ndarray, movies: np.ndarray, movie_ids: _MovieIds):
+        self._keys = keys
+        self._indptr = indptr
+        self._movies = movies
+        self._movie_ids = movie_ids
+
+    def get(self, title, default=None):
+        k = self._keys.find(title)
+        if k is None:
+            return default
+        rows = self._movies[self._indptr[k]:self._indptr[k + 1]]
+        return [self._movie_ids[i] for i in rows]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+
+class _Representative:
+    """title -> 代表电影的节点 id（代替 KGState.representative_movie）。"""
+
+    def __init__(self, keys: _SortedKeys, rep: np.ndarray, movie_ids: _MovieIds):
+        self._keys = keys
+        self._rep = rep
+        self._movie_ids = movie_ids
+
+    def get(self, title, default=None):
+        k = self._keys.find(title)
+        return default if k is None else self._movie_ids[self._rep[k]]
+
+
+class _Postings:
+    """trigram -> 升序的电影序号数组（代替 KGState.keyword_postings 的 dict-of-sets）。"""
+
+    def __init__(self, keys: _SortedKeys, indptr: np.ndarray, movies: np.ndarray):
+        self._keys = keys
+        self._indptr = indptr
+        self._movies = movies
+
+    def get(self, gram, default=None):
+        k = self._keys.find(gram)
+        return default if k is None else self._movies[self._indptr[k]:self._indptr[k + 1]]
+
+
+class _CoActors:
+    """与 kg_index.CoActorIndex.top 相同的接口，数据按节点下标存在数组里。"""
+
+    def __init__(self, graph: "CSRGraph", indptr: np.ndarray, names: _StringColumn, counts: np.ndarray):
+        self._graph = graph
+        self._indptr = indptr
+        self._names = names
+        self._counts = counts
+
+    def top(self, actor_id: str, top_k: Optional[int] = None):
+        i = self._graph.index_of(actor_id)
+        if i is None:
+            return []
+        entries = range(int(self._indptr[i]), int(self._indptr[i + 1]))
+        if top_k is not None:
+            entries = entries[:top_k]
+        return [(self._names.get(j), int(self._counts[j])) for j in entries]
+
+
+class CSRQueryIndex:
+    """
+    CSR 存储里预先算好的查询索引，属性名和含义与 kg_api.KGState 上的同名索引一致：
+    title_index / representative_movie / movie_ids / movie_index / keyword_titles /
+    keyword_titles_lower / keyword_postings / movie_columns / sim_* / co_actors / node_pos。
+    """
+
+    def __init__(self, graph: "CSRGraph"):
+        load = graph.array
+
+        def strings(prefix: str, present: bool = False) -> _StringColumn:
+            return _StringColumn(
+                load(f"{prefix}.bytes"),
+                load(f"{prefix}.offsets"),
+                load(f"{prefix}.present") if present else None,
+            )
+
+        movie_nodes = load("index.movie.node")
+        num_movies = len(movie_nodes)
+        self.movie_ids = _MovieIds(graph, movie_nodes)
+        self.movie_index = _NodeLookup(graph, load("index.node.movie"))
+        self.node_pos = _NodeLookup(graph)
+
+        titles = strings("index.title")
+        title_keys = _SortedKeys(titles, len(load("index.title.offsets")) - 1)
+        self.title_index = _TitleIndex(
+            title_keys, load("index.title.indptr"), load("index.title.movies"), self.movie_ids,
+        )
+        self.representative_movie = _Representative(title_keys, load("index.title.rep"), self.movie_ids)
+
+        movie_titles = strings("index.movie.title", present=True)
+        self.keyword_titles = _StringSequence(movie_titles, num_movies, default="")
+        self.keyword_titles_lower = _StringSequence(strings("index.movie.title_lower"), num_movies)
+        grams = strings("index.gram")
+        self.keyword_postings = _Postings(
+            _SortedKeys(grams, len(load("index.gram.offsets")) - 1),
+            load("index.gram.indptr"),
+            load("index.gram.movies"),
+        )
+
+        self.movie_columns = {"title": _StringSequence(movie_titles, num_movies)}
+        for name in ("year", "imdb_rating", "metascore", "duration_minutes"):
+            self.movie_columns[name] = load(f"index.movie.{name}")
+
+        self.sim_movie_indptr = load("index.sim.movie_indptr")
+        self.sim_movie_entities = load("index.sim.movie_entities")
+        self.sim_entity_indptr = load("index.sim.entity_indptr")
+        self.sim_entity_movies = load("index.sim.entity_movies")
+
+        self.co_actors = _CoActors(
+            graph,
+            load("index.coactor.indptr"),
+            strings("index.coactor.name"),
+            load("index.coactor.count"),
+        )
+
+
+def load_csr_store(graphml_path: str, store_path: Optional[str] = None) -> Optional[CSRGraph]:
+    """
+    打开与 graphml_path 对应的 CSR 存储。
+
+    目录不存在或与 GraphML 不一致时返回 None，由调用方决定是否回退。
+    """
+    store_path = store_path or csr_path_for(graphml_path)
+    if not os.path.exists(os.path.join(store_path, "meta.json")):
+        return None
+    graph = CSRGraph(store_path)
+    if not fingerprint_matches(graph.meta.get("graphml"), graphml_path):
+        return None
+    return graph
+
+
+if __name__ == "__main__":
+    # 用法：python kg_csr.py [imdb_kg.graphml]
+    # 从已有的 GraphML 生成 CSR 存储目录（不需要重新跑 buildKG.py）
+    src = sys.argv[1] if len(sys.argv) > 1 else "imdb_kg.graphml"
+    out = write_csr_store(nx.read_graphml(src), src)
+    print(f"CSR 存储已保存到: {os.path.abspath(out)}")
@@ -0,0 +1,278 @@
+# kg_index.py
+# -*- coding: utf-8 -*-
+"""
+kg_api 查询用的各类索引（标题 / 电影序号 / trigram 倒排 / 列式属性 / 相似度矩阵 / 合作演员）。
+
+- networkx / Parquet 后端：kg_api 加载图之后在每个进程里用这里的函数构建一次
+- CSR 后端：buildKG.py --csr 写 CSR 存储时用同样的函数构建一次，
+  再摊平成 .npy 数组和邻接数组放在一起（见 kg_csr.py 的"查询索引"），
+  worker 直接 mmap，不再各自构建
+
+所以两种后端上的索引内容完全相同，查询结果也相同。
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+import networkx as nx
+import numpy as np
+
+
+def representative_score(data: Dict):
+    """
+    “代表电影”的打分规则：先比 IMDb Rating，再比年份（缺失视为很低 / 很早）。
+    """
+    rating = data.get("imdb_rating")
+    year = data.get("year")
+    try:
+        rating_val = float(rating) if rating is not None else float("-inf")
+    except (TypeError, ValueError):
+        rating_val = float("-inf")
+    try:
+        year_val = int(year) if year is not None else float("-inf")
+    except (TypeError, ValueError):
+        year_val = float("-inf")
+    # 返回一个元组，先比评分，再比年份
+    return (rating_val, year_val)
+
+
+def build_title_index(graph: nx.Graph):
+    """
+    遍历一次图，建立 title -> [movie 节点 id] 的索引，
+    并按 representative_score 预先选好每个 title 的“代表电影”。
+
+    同名电影的顺序与 G.nodes 的遍历顺序一致；
+    分数相同时保留先出现的节点（与 max() 的行为一致）。
+    """
+    title_index: Dict[str, List[str]] = {}
+    representative: Dict[str, str] = {}
+    best_score: Dict[str, tuple] = {}
+
+    for n, data in graph.nodes(data=True):
+        if data.get("type") != "movie":
+            continue
+        title = data.get("title")
+        title_index.setdefault(title, []).append(n)
+
+        score = representative_score(data)
+        if title not in best_score or score > best_score[title]:
+            best_score[title] = score
+            representative[title] = n
+
+    return title_index, representative
+
+
+# 关键字搜索用的字符 n-gram 长度
+NGRAM_SIZE = 3
+
+
+def title_ngrams(text: str) -> Set[str]:
+    """把（已归一化的）字符串切成字符 n-gram 集合，长度不足时返回空集合。"""
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def build_movie_table(graph: nx.Graph):
+    """
+    按 G.nodes 的遍历顺序给所有电影编号（0, 1, 2, ...）。
+
+    后面的各类索引都用这个编号（下文称“电影序号”）来指代电影。
+    返回 (movie_ids, movie_index)，movie_index 是 node_id -> 电影序号。
+    """
+    movie_ids = [n for n, d in graph.nodes(data=True) if d.get("type") == "movie"]
+    movie_index = {n: i for i, n in enumerate(movie_ids)}
+    return movie_ids, movie_index
+
+
+def build_keyword_index(graph: nx.Graph, movie_ids: List[str]):
+    """
+    为 search_movies_by_keyword 建立字符 trigram 倒排索引（倒排表里存电影序号）。
+
+    - 标题用 casefold() 归一化后切 trigram：
+      无论大小写敏感与否，命中的标题一定包含关键字 casefold 后的全部 trigram，
+      所以倒排表求交集只会多召回、不会漏召回，最后再逐个精确校验
+    - 同时缓存原始标题和 lower() 后的标题，查询时不再逐个转换
+    """
+    titles: List[str] = []
+    titles_lower: List[str] = []
+    postings: Dict[str, Set[int]] = {}
+
+    for idx, n in enumerate(movie_ids):
+        title = str(graph.nodes[n].get("title", ""))
+        titles.append(title)
+        titles_lower.append(title.lower())
+        for gram in title_ngrams(title.casefold()):
+            postings.setdefault(gram, set()).add(idx)
+
+    return titles, titles_lower, postings
+
+
+def _parse_number(value, cast) -> float:
+    """把节点属性转成数值，缺失或无法解析时返回 NaN。"""
+    if value is None:
+        return np.nan
+    try:
+        return float(cast(value))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_movie_columns(graph: nx.Graph, movie_ids: List[str]) -> Dict:
+    """
+    把电影的常用属性按电影序号存成列式数组，供过滤 / 排序做向量化运算。
+
+    - title：原始标题列表
+    - year：float64，按 int() 解析，缺失为 NaN
+    - imdb_rating / metascore / duration_minutes：float64，缺失为 NaN
+    """
+    columns: Dict = {
+        "title": [],
+        "year": np.full(len(movie_ids), np.nan),
+        "imdb_rating": np.full(len(movie_ids), np.nan),
+        "metascore": np.full(len(movie_ids), np.nan),
+        "duration_minutes": np.full(len(movie_ids), np.nan),
+    }
+    for i, n in enumerate(movie_ids):
+        data = graph.nodes[n]
+        columns["title"].append(data.get("title"))
+        columns["year"][i] = _parse_number(data.get("year"), int)
+        columns["imdb_rating"][i] = _parse_number(data.get("imdb_rating"), float)
+        columns["metascore"][i] = _parse_number(data.get("metascore"), float)
+        columns["duration_minutes"][i] = _parse_number(data.get("duration_minutes"), float)
+    return columns
+
+
+def build_neighbor_matrix(graph: nx.Graph, movie_ids: List[str], node_pos: Dict[str, int]):
+    """
+    为相似电影推荐构建稀疏的“电影 × 实体”关联矩阵（CSR 格式，纯 NumPy）。
+
+    - 行：电影序号；列：图中任意节点的编号
+    - 第 i 行的非零列 = 电影 i 在无向意义下的全部邻居（导演 / 演员 / 类型 / 分级），去重
+    - 同时保存转置（实体 -> 电影），查询时用来做一次稀疏向量乘法
+
+    node_pos 是节点 id -> 它在 G.nodes 中的位置（即列号）。
+    返回 (movie_indptr, movie_entities, entity_indptr, entity_movies)。
+    """
+
+    indptr = np.zeros(len(movie_ids) + 1, dtype=np.int64)
+    columns: List[int] = []
+    for row, n in enumerate(movie_ids):
+        nbrs = set(graph.predecessors(n))
+        nbrs.update(graph.successors(n))
+        columns.extend(sorted(node_pos[x] for x in nbrs))
+        indptr[row + 1] = len(columns)
+
+    movie_entities = np.asarray(columns, dtype=np.int64)
+    rows = np.repeat(np.arange(len(movie_ids), dtype=np.int64), np.diff(indptr))
+
+    # 转置：按实体编号稳定排序，得到 实体 -> 电影序号 的 CSR
+    order = np.argsort(movie_entities, kind="stable")
+    entity_movies = rows[order]
+    entity_counts = np.bincount(movie_entities, minlength=len(node_pos))
+    entity_indptr = np.zeros(len(node_pos) + 1, dtype=np.int64)
+    np.cumsum(entity_counts, out=entity_indptr[1:])
+
+    return indptr, movie_entities, entity_indptr, entity_movies
+
+
+class CoActorIndex:
+    """
+    物化的“演员 - 演员”合作次数邻接表，供 get_co_actors 使用。
+
+    - counts[actor_id][co_actor_name] = 两人共同出演的电影数
+    - ranked[actor_id] = 按合作次数降序（同次数按名字）排好的 [(name, count), ...]
+      查询 top_k 只需要切片
+
+    图加载时整体构建一次，之后只读；图谱内容变了（buildKG.py 重建后 reload_graph）
+    随新版本的 KGState 一起重建。只有一部分电影变了时（buildKG.py --incremental），
+    用 with_movies / patched 在旧索引的基础上得到新索引，只重排涉及到的演员。
+    """
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._ranked: Dict[str, List[Tuple[str, int]]] = {}
+
+    @classmethod
+    def from_graph(cls, graph, movie_ids: List[str]) -> "CoActorIndex":
+        index = cls()
+        for movie_id in movie_ids:
+            index._add_cast(_movie_cast(graph, movie_id))
+        index._ranked = {a: index._rank(a) for a in index._counts}
+        return index
+
+    def with_movies(
+        self,
+        casts: List[List[Tuple[str, Optional[str]]]],
+        removed: List[List[Tuple[str, Optional[str]]]] = (),
+    ) -> "CoActorIndex":
+        """
+        返回加入 casts、去掉 removed 这些电影演员表之后的新索引，self 保持不变（copy-on-write）。
+
+        一部电影变了就把旧演员表放进 removed、新演员表放进 casts。
+        只有这些演员表里的演员的计数会变：新索引只复制、重排这些演员的行，
+        其余演员的行和排好的列表直接与旧索引共享（两边都只读）。
+        """
+        touched = {a for cast in (*casts, *removed) for a, _ in cast}
+        index = CoActorIndex()
+        index._counts = dict(self._counts)
+        index._ranked = dict(self._ranked)
+        for a in touched:
+            index._counts[a] = dict(self._counts.get(a, {}))
+        for cast in removed:
+            index._add_cast(cast, -1)
+        for cast in casts:
+            index._add_cast(cast)
+        for a in touched:
+            if index._counts[a]:
+                index._ranked[a] = index._rank(a)
+            else:
+                # 没有合作演员了（top() 对不在表里的演员同样返回空列表）
+                del index._counts[a]
+                index._ranked.pop(a, None)
+        return index
+
+    def patched(self, old_graph, graph, movie_ids: List[str]) -> "CoActorIndex":
+        """旧图 old_graph 上的索引 -> 新图 graph 上的索引，两张图只在 movie_ids 这些电影上不同。"""
+        return self.with_movies(
+            [_movie_cast(graph, m) for m in movie_ids if m in graph],
+            [_movie_cast(old_graph, m) for m in movie_ids if m in old_graph],
+        )
+
+    def _add_cast(self, cast: List[Tuple[str, Optional[str]]], sign: int = 1) -> None:
+        """
+        把一部电影的演员表计入（sign=1）/ 移出（sign=-1）合作次数。
+
+        cast 是 [(person 节点 id, name)]；name 为空的（非人物节点或没有名字）
+        只作为“出演者”被统计，不会作为别人的合作演员出现。
+        """
+        actors = {a for a, _ in cast}
+        for a in actors:
+            row = self._counts.setdefault(a, {})
+            for u, name in cast:
+                if u == a or not name:
+                    continue
+                count = row.get(name, 0) + sign
+                if count:
+                    row[name] = count
+                else:
+                    del row[name]
+
+    def _rank(self, actor_id: str) -> List[Tuple[str, int]]:
+        row = self._counts.get(actor_id, {})
+        return sorted(row.items(), key=lambda x: (-x[1], x[0]))
+
+    def top(self, actor_id: str, top_k: Optional[int] = None) -> List[Tuple[str, int]]:
+        ranked = self._ranked.get(actor_id, [])
+        if top_k is not None:
+            ranked = ranked[:top_k]
+        return ranked
+
+
+def _movie_cast(graph, movie_id: str) -> List[Tuple[str, Optional[str]]]:
+    """一部电影的全部 ACTED_IN 入边，返回 [(person id, name 或 None)]。"""
+    cast = []
+    for u, _, edge in graph.in_edges(movie_id, data=True):
+        if edge.get("relation") != "ACTED_IN":
+            continue
+        pdata = graph.nodes[u]
+        name = pdata.get("name") if pdata.get("type") == "person" else None
+        cast.append((u, name))
+    return cast
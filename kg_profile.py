@@ -0,0 +1,177 @@
+# kg_profile.py
+# -*- coding: utf-8 -*-
+"""
+构图过程的分阶段性能记录（buildKG.py --profile）。
+
+用法：
+    with BuildProfiler() as prof:
+        with profile_stage("csv_read"):
+            ...
+    prof.write_report("build_profile.json")
+
+- 代码里用 profile_stage(name) 标出各个阶段；没有启用 BuildProfiler 时它什么也不做
+- 每个阶段记录：调用次数、墙钟时间、CPU 时间、tracemalloc 峰值、进程 RSS 峰值
+- 阶段可以嵌套，时间按"自身"统计：进入子阶段时父阶段暂停计时，各阶段时间相加约等于总时间
+- 同名阶段多次进入（例如每个 CSV 读一次）会累加
+- cprofile=True 时每个阶段各用一个 cProfile，报告里把最慢阶段的统计 dump 成 .prof 文件
+  （cProfile 本身有不小的开销，开了之后的时间只适合看相对比例）
+"""
+
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+_ACTIVE: Optional["BuildProfiler"] = None
+
+
+def profile_stage(name: str):
+    """标出一个构图阶段；没有启用 BuildProfiler 时是空操作。"""
+    if _ACTIVE is None:
+        return nullcontext()
+    return _ACTIVE.stage(name)
+
+
+def _rss_peak_mb() -> Optional[float]:
+    """进程到目前为止的 RSS 峰值（MB）。"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class BuildProfiler:
+    """分阶段记录墙钟时间 / CPU 时间 / 内存峰值，并输出 JSON 报告。"""
+
+    def __init__(self, trace_memory: bool = True, cprofile: bool = False):
+        self.trace_memory = trace_memory
+        self.cprofile = cprofile
+        self.stages: Dict[str, Dict] = {}
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._stack = []
+        self._mark = None
+        self._started = None
+        self._finished = None
+
+    # ---------------- 启用 / 停用 ----------------
+
+    def __enter__(self):
+        global _ACTIVE
+        _ACTIVE = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._started = (time.perf_counter(), time.process_time())
+        return self
+
+    def __exit__(self, *exc):
+        global _ACTIVE
+        self._finished = (time.perf_counter(), time.process_time())
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        _ACTIVE = None
+        return False
+
+    # ---------------- 计时 ----------------
+
+    def _pause(self):
+        """停止给栈顶阶段计时，把这段时间记到它头上。"""
+        if not self._stack:
+            return
+        name = self._stack[-1]
+        rec = self.stages[name]
+        wall0, cpu0 = self._mark
+        rec["wall_s"] += time.perf_counter() - wall0
+        rec["cpu_s"] += time.process_time() - cpu0
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            rec["tracemalloc_peak_mb"] = max(rec["tracemalloc_peak_mb"] or 0.0, peak)
+        rss = _rss_peak_mb()
+        if rss is not None:
+            rec["rss_peak_mb"] = max(rec["rss_peak_mb"] or 0.0, rss)
+        if self.cprofile:
+            self._profiles[name].disable()
+
+    def _resume(self):
+        """开始给栈顶阶段计时。"""
+        if not self._stack:
+            return
+        name = self._stack[-1]
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        if self.cprofile:
+            self._profiles.setdefault(name, cProfile.Profile()).enable()
+        self._mark = (time.perf_counter(), time.process_time())
+
+    @contextmanager
+    def stage(self, name: str):
+        self._pause()
+        rec = self.stages.setdefault(name, {
+            "calls": 0,
+            "wall_s": 0.0,
+            "cpu_s": 0.0,
+            "tracemalloc_peak_mb": None,
+            "rss_peak_mb": None,
+        })
+        rec["calls"] += 1
+        self._stack.append(name)
+        self._resume()
+        try:
+            yield
+        finally:
+            self._pause()
+            self._stack.pop()
+            self._resume()
+
+    # ---------------- 报告 ----------------
+
+    def slowest_stage(self) -> Optional[str]:
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda n: self.stages[n]["wall_s"])
+
+    def report(self, **extra) -> Dict:
+        end = self._finished or (time.perf_counter(), time.process_time())
+        return {
+            "total": {
+                "wall_s": round(end[0] - self._started[0], 6),
+                "cpu_s": round(end[1] - self._started[1], 6),
+                "rss_peak_mb": _rss_peak_mb(),
+            },
+            "stages": [
+                {
+                    "name": name,
+                    **{
+                        k: round(v, 6) if isinstance(v, float) else v
+                        for k, v in rec.items()
+                    },
+                }
+                for name, rec in self.stages.items()
+            ],
+            "slowest_stage": self.slowest_stage(),
+            **extra,
+        }
+
+    def write_report(self, path: str, **extra) -> Dict:
+        """
+        写 JSON 报告；启用了 cprofile 时，把最慢阶段的统计 dump 到
+        <报告路径去掉后缀>.<阶段名>.prof，并把路径记在报告的 "cprofile" 字段。
+        """
+        report = self.report(**extra)
+        slowest = report["slowest_stage"]
+        if self.cprofile and slowest in self._profiles:
+            prof_path = f"{os.path.splitext(path)[0]}.{slowest}.prof"
+            self._profiles[slowest].dump_stats(prof_path)
+            report["cprofile"] = prof_path
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
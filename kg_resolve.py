@@ -0,0 +1,298 @@
+# kg_resolve.py
+# -*- coding: utf-8 -*-
+"""
+基于分块（blocking）的实体消解：把同一个人 / 同一部电影的拼写变体合并成一个。
+
+为什么需要：
+- 节点 id 直接用原始字符串（person::<Name>、movie::<Title> (<Year>)），
+  三个 CSV 之间大小写、空格、标点、变音符号稍有不同就会变成两个节点，
+  合作演员、相似电影这些基于邻居的信号都会被拆散
+- 名字有几十万、上百万个，两两比较不可行；这里先按"分块键"把可能相同的名字分到一起，
+  只在块内比较
+
+做法：
+1) normalize_text：去变音符号、casefold、标点换成空格、压缩空白
+2) 每个名字生成若干分块键：
+    - 精确键：规范化后去掉空格的串；同一精确键下的名字直接视为同一实体
+    - 模糊键：首尾 token 的 Soundex 编码、排序后的 token 串；同一模糊键下的名字两两比较，
+      相似度（difflib）达到阈值才合并
+    - 只差一两个字母的人名很多本来就是不同的人（John Kerr / John Kerry），
+      所以人名的模糊匹配还要求两者至少共享一部电影（同一部电影在不同 CSV 里写法不同，
+      才是变体最常见的来源）
+3) 并查集合并，每个簇里出现次数最多的写法作为规范写法（次数相同取字典序最小）
+
+超过 max_block_size 的模糊块（通常是过于常见的编码）按二级键再拆一次，只在小块内比较：
+人名按参与的电影拆（没有共同电影的两个人名本来就不会合并），电影名按 token 数和续集编号拆
+（这两项不同的标题同样不会合并），所以拆块不会漏掉任何能合并的对。
+拆完仍然过大的块才跳过，跳过的块数和候选对数记在 stats 里，由调用方报告。
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+_EMPTY: frozenset = frozenset()
+
+# 名字末尾不参与语音编码的后缀
+_NAME_SUFFIXES = {"jr", "sr", "ii", "iii", "iv"}
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def normalize_text(s) -> str:
+    """去变音符号、casefold、标点换成空格并压缩空白。"""
+    s = unicodedata.normalize("NFKD", str(s))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = re.sub(r"[^\w\s]|_", " ", s.casefold())
+    return " ".join(s.split())
+
+
+def soundex(token: str) -> str:
+    """经典 Soundex 编码（只看 ASCII 字母），空串返回空串。"""
+    letters = [ch for ch in token.lower() if "a" <= ch <= "z"]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    prev = _SOUNDEX_CODES.get(letters[0], "")
+    for ch in letters[1:]:
+        digit = _SOUNDEX_CODES.get(ch, "")
+        if digit and digit != prev:
+            code += digit
+        if ch not in "hw":
+            prev = digit
+    return (code + "000")[:4]
+
+
+def _similar(a: str, b: str, threshold: float) -> bool:
+    return SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+def _close_variants(a: str, b: str, threshold: float, token_threshold: float = 0.75) -> bool:
+    """
+    两个规范化后的串是否只是拼写变体：token 数相同、整体相似度达到阈值，
+    并且每一对不同的 token 自身也足够相似（"one" / "two" 这类整词替换不算变体）。
+    """
+    ta, tb = a.split(), b.split()
+    if len(ta) != len(tb) or not _similar(a, b, threshold):
+        return False
+    return all(x == y or _similar(x, y, token_threshold) for x, y in zip(ta, tb))
+
+
+# ----------------------------------------------------------------------
+# 通用的分块 + 并查集
+# ----------------------------------------------------------------------
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+def new_resolve_stats() -> Dict[str, int]:
+    """resolve 的统计：拆开的过大模糊块数、拆完仍过大而跳过的块数和其中没有比较的候选对数。"""
+    return {"split_blocks": 0, "skipped_blocks": 0, "skipped_pairs": 0}
+
+
+def _skip_block(block: List[int], stats: Optional[Dict[str, int]]) -> None:
+    if stats is not None:
+        stats["skipped_blocks"] += 1
+        stats["skipped_pairs"] += len(block) * (len(block) - 1) // 2
+
+
+def _comparison_blocks(
+    members: List[int],
+    values: List[Hashable],
+    split_keys: Optional[Callable[[Hashable], Iterable[Hashable]]],
+    max_block_size: int,
+    stats: Optional[Dict[str, int]],
+) -> List[List[int]]:
+    """一个模糊块里需要两两比较的小块：不超过 max_block_size 的原样返回，过大的按 split_keys 拆开。"""
+    if len(members) < 2:
+        return []
+    if len(members) <= max_block_size:
+        return [members]
+    if split_keys is None:
+        _skip_block(members, stats)
+        return []
+    if stats is not None:
+        stats["split_blocks"] += 1
+    sub_blocks: Dict[Hashable, List[int]] = defaultdict(list)
+    for i in members:
+        for key in set(split_keys(values[i])):
+            sub_blocks[key].append(i)
+    blocks = []
+    for block in sub_blocks.values():
+        if len(block) > max_block_size:
+            _skip_block(block, stats)
+        elif len(block) >= 2:
+            blocks.append(block)
+    return blocks
+
+
+def resolve(
+    items: Iterable[Tuple[Hashable, int]],
+    blocking_keys: Callable[[Hashable], List[Tuple[Hashable, bool]]],
+    is_match: Callable[[Hashable, Hashable], bool],
+    max_block_size: int = 500,
+    split_keys: Optional[Callable[[Hashable], Iterable[Hashable]]] = None,
+    stats: Optional[Dict[str, int]] = None,
+) -> Dict[Hashable, Hashable]:
+    """
+    通用的分块实体消解。
+
+    items：(值, 出现次数)
+    blocking_keys(值)：[(分块键, 是否精确键), ...]；精确键相同即视为同一实体，
+        非精确键只决定"和谁比较"，是否合并由 is_match 决定
+    split_keys(值)：超过 max_block_size 的模糊块按它拆成小块（一个值可以有多个键），
+        只有二级键相同的值才比较；应当只拆开 is_match 一定不成立的对。为 None 时过大的块直接跳过
+    stats：new_resolve_stats() 返回的 dict，累加拆块 / 跳过的统计
+    返回合并映射 {变体: 规范值}，只包含需要改写的值。
+    """
+    values, counts = [], []
+    for value, count in items:
+        values.append(value)
+        counts.append(count)
+
+    uf = _UnionFind(len(values))
+    exact_blocks: Dict[Hashable, int] = {}
+    fuzzy_blocks: Dict[Hashable, List[int]] = defaultdict(list)
+    for i, value in enumerate(values):
+        for key, exact in blocking_keys(value):
+            if exact:
+                first = exact_blocks.setdefault(key, i)
+                if first != i:
+                    uf.union(first, i)
+            else:
+                fuzzy_blocks[key].append(i)
+
+    for members in fuzzy_blocks.values():
+        for block in _comparison_blocks(members, values, split_keys, max_block_size, stats):
+            for x in range(len(block)):
+                for y in range(x + 1, len(block)):
+                    i, j = block[x], block[y]
+                    if uf.find(i) != uf.find(j) and is_match(values[i], values[j]):
+                        uf.union(i, j)
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(values)):
+        clusters[uf.find(i)].append(i)
+
+    merge = {}
+    for members in clusters.values():
+        if len(members) < 2:
+            continue
+        canon = min(members, key=lambda i: (-counts[i], values[i]))
+        for i in members:
+            if i != canon:
+                merge[values[i]] = values[canon]
+    return merge
+
+
+# ----------------------------------------------------------------------
+# 人名 / 电影名
+# ----------------------------------------------------------------------
+
+def person_blocking_keys(name: str) -> List[Tuple[Hashable, bool]]:
+    tokens = normalize_text(name).split()
+    if not tokens:
+        return []
+    keys = [
+        (("compact", "".join(tokens)), True),
+        (("tokens", " ".join(sorted(tokens))), False),
+    ]
+    core = [t for t in tokens if t not in _NAME_SUFFIXES] or tokens
+    keys.append((("soundex", soundex(core[0]), soundex(core[-1]), len(core)), False))
+    return keys
+
+
+def person_merge_map(
+    name_counts: Iterable[Tuple[str, int]],
+    contexts: Dict[str, Set[Hashable]],
+    threshold: float = 0.93,
+    max_block_size: int = 500,
+    stats: Optional[Dict[str, int]] = None,
+) -> Dict[str, str]:
+    """
+    人名消解：规范化后相同（只差大小写、空格、标点、变音符号）的直接合并；
+    其余候选（首尾 token 发音相同，或 token 相同只是顺序不同）要求
+    contexts 里至少有一个共同元素（通常是参与的电影），再按字符相似度比较（见 _close_variants）。
+    过大的模糊块按 contexts 的元素拆开。
+    """
+
+    def is_match(a: str, b: str) -> bool:
+        if contexts.get(a, _EMPTY).isdisjoint(contexts.get(b, _EMPTY)):
+            return False
+        na, nb = normalize_text(a), normalize_text(b)
+        return sorted(na.split()) == sorted(nb.split()) or _close_variants(na, nb, threshold)
+
+    def split_keys(name: str):
+        return contexts.get(name, _EMPTY)
+
+    return resolve(name_counts, person_blocking_keys, is_match, max_block_size, split_keys, stats)
+
+
+_ROMAN = re.compile(r"^[ivxlc]+$")
+
+
+def _numbers(norm: str) -> Tuple[str, ...]:
+    """标题里的数字和罗马数字 token（续集编号）。"""
+    return tuple(t for t in norm.split() if t.isdigit() or _ROMAN.match(t))
+
+
+def title_blocking_keys(item) -> List[Tuple[Hashable, bool]]:
+    title, year = item
+    norm = normalize_text(title)
+    if not norm:
+        return []
+    compact = norm.replace(" ", "")
+    return [
+        (("compact", year, compact), True),
+        (("prefix", year, compact[:4]), False),
+    ]
+
+
+def title_merge_map(
+    title_counts: Iterable[Tuple[Tuple[str, object], int]],
+    threshold: float = 0.95,
+    max_block_size: int = 500,
+    stats: Optional[Dict[str, int]] = None,
+) -> Dict[Tuple[str, object], str]:
+    """
+    电影名消解，只在同一年份内进行：规范化后去掉空格相同的直接合并；
+    否则要求数字 / 罗马数字完全相同（避免 "Saw II" / "Saw III" 这类续集被合并），
+    且只是逐 token 的拼写差异、整体相似度达到阈值。
+
+    过大的模糊块按 (token 数, 数字 / 罗马数字) 拆开。
+
+    title_counts：((Title, Year), 行数)；返回 {(Title, Year): 规范 Title}。
+    """
+
+    def is_match(a, b) -> bool:
+        na, nb = normalize_text(a[0]), normalize_text(b[0])
+        return _numbers(na) == _numbers(nb) and _close_variants(na, nb, threshold)
+
+    def split_keys(item):
+        norm = normalize_text(item[0])
+        return [(len(norm.split()), _numbers(norm))]
+
+    merge = resolve(title_counts, title_blocking_keys, is_match, max_block_size, split_keys, stats)
+    return {key: canon[0] for key, canon in merge.items()}
@@ -0,0 +1,165 @@
+# kg_shards.py
+# -*- coding: utf-8 -*-
+"""
+分片图谱的存储格式（buildKG.py --shards N 写出，kg_api 在 KG_SHARDED=1 时读取）。
+
+为什么需要：
+- 单个 MultiDiGraph 必须整个放进一台机器的内存；数据再大一个数量级就放不下了
+- 这里按电影标题的哈希把电影分到 N 个分片，每部电影连同它的全部边
+  （导演 / 演员 / 类型 / 分级）和边另一端的实体节点一起放进所属分片：
+    - 每个分片都是一张普通的小图，可以各自写 GraphML / 快照 / CSR / Parquet，
+      由不同的进程（kg_api 里每个分片一个子进程）或机器加载
+    - 构建时先把 CSV 的行按分片落盘，再逐个分片只读自己那一份行来聚合、建图
+    - 人物 / 类型 / 分级节点会在多个分片里各出现一次（属性完全相同），
+      电影和边只出现一次，所以按实体汇总时把各分片的结果合并即可
+
+路由：
+- 同名电影一定在同一个分片，按标题查询时用 shard_of(title, N) 直接算出分片
+- 人物 / 类型 / 分级散落在多个分片里，按实体查询时查 entities.json 里的实体字典，
+  只问含有这个实体的分片；字典里没有的实体不用问任何分片
+
+目录内容（默认 imdb_kg.shards/）：
+- shard_000.graphml、shard_001.graphml ...（以及各自的快照等派生文件）
+- entities.json：实体字典，按关系（DIRECTED / ACTED_IN / HAS_GENRE / HAS_CERTIFICATE）
+  列出 实体名 -> 分片位图（第 s 位为 1 表示分片 s 里有这个实体的这种边）
+- meta.json：格式版本、分片数、每个分片的电影数 / 节点数 / 边数
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Callable, Dict, List
+
+SHARDS_VERSION = 3
+SHARDS_SUFFIX = ".shards"
+ENTITIES_FILE = "entities.json"
+
+# 实体字典按这几种关系分别记录；前两种的实体是边的起点（人物），后两种是终点
+ENTITY_RELATIONS = ("DIRECTED", "ACTED_IN", "HAS_GENRE", "HAS_CERTIFICATE")
+
+
+def shards_path_for(graphml_path: str) -> str:
+    """imdb_kg.graphml -> imdb_kg.shards/（同目录）。"""
+    root, _ = os.path.splitext(str(graphml_path))
+    return root + SHARDS_SUFFIX
+
+
+def shard_graphml_path(shards_dir: str, shard: int) -> str:
+    return os.path.join(shards_dir, f"shard_{shard:03d}.graphml")
+
+
+def shard_of(title: str, num_shards: int) -> int:
+    """电影标题 -> 分片号。用 blake2b 而不是 hash()，跨进程 / 跨机器结果一致。"""
+    digest = hashlib.blake2b(title.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % num_shards
+
+
+def shards_in(mask: int) -> List[int]:
+    """实体字典里的分片位图 -> 分片号列表（升序）。"""
+    shards = []
+    while mask:
+        low = mask & -mask
+        shards.append(low.bit_length() - 1)
+        mask ^= low
+    return shards
+
+
+def shard_entities(graph) -> Dict[str, List[str]]:
+    """一个分片的图里按关系列出的实体名（节点 id 去掉 "person::" 等前缀），写实体字典用。"""
+    names: Dict[str, set] = {relation: set() for relation in ENTITY_RELATIONS}
+    for u, v, relation in graph.edges(data="relation"):
+        if relation in ("DIRECTED", "ACTED_IN"):
+            names[relation].add(u.split("::", 1)[1])
+        elif relation in names:
+            names[relation].add(v.split("::", 1)[1])
+    return {relation: sorted(values) for relation, values in names.items()}
+
+
+# ----------------------------------------------------------------------
+# 写入
+# ----------------------------------------------------------------------
+
+def write_shards(
+    num_shards: int,
+    out_dir: str,
+    write_shard: Callable[[int, str], Dict],
+    map_func: Callable = map,
+) -> str:
+    """
+    写出全部分片，再写 entities.json 和 meta.json。
+
+    write_shard(shard, graphml_path)：建好并写出一个分片（GraphML 及其派生文件），
+        返回 {"movies": 电影数, "nodes": 节点数, "edges": 边数,
+              "entities": 这个分片的 shard_entities(图)}
+    map_func：依次对各分片调用 write_shard 的方式，默认逐个串行；
+        传入进程池的 map 时各分片并行构建
+
+    先写到临时目录再整体替换，返回目录路径。
+    """
+    tmp_dir = out_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    paths = [shard_graphml_path(tmp_dir, s) for s in range(num_shards)]
+    shards: List[Dict] = list(map_func(write_shard, range(num_shards), paths))
+
+    entities: Dict[str, Dict[str, int]] = {relation: {} for relation in ENTITY_RELATIONS}
+    for shard, stats in enumerate(shards):
+        for relation, names in stats.pop("entities").items():
+            index = entities[relation]
+            for name in names:
+                index[name] = index.get(name, 0) | (1 << shard)
+    with open(os.path.join(tmp_dir, ENTITIES_FILE), "w", encoding="utf-8") as f:
+        json.dump(entities, f, ensure_ascii=False, separators=(",", ":"))
+
+    # meta.json 最后写：kg_api 用它的大小 / mtime 判断分片是否被重建过
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": SHARDS_VERSION,
+                "num_shards": num_shards,
+                "num_movies": sum(s["movies"] for s in shards),
+                "num_edges": sum(s["edges"] for s in shards),
+                "shards": shards,
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+    old_dir = out_dir + ".old"
+    if os.path.exists(out_dir):
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    return out_dir
+
+
+# ----------------------------------------------------------------------
+# 读取
+# ----------------------------------------------------------------------
+
+def load_shard_manifest(shards_dir: str) -> Dict:
+    """
+    读取分片目录的 meta.json 和实体字典，
+    返回 {"meta": ..., "paths": [各分片 GraphML 路径], "entities": {关系: {实体名: 分片位图}}}。
+    """
+    meta_path = os.path.join(shards_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"找不到分片目录：{shards_dir}")
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != SHARDS_VERSION:
+        raise ValueError(f"分片格式版本不符：{meta.get('version')}（需要 {SHARDS_VERSION}，请重新生成）")
+    with open(os.path.join(shards_dir, ENTITIES_FILE), encoding="utf-8") as f:
+        entities = json.load(f)
+    return {
+        "meta": meta,
+        "paths": [shard_graphml_path(shards_dir, s) for s in range(meta["num_shards"])],
+        "entities": entities,
+    }
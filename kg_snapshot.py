@@ -0,0 +1,262 @@
+# kg_snapshot.py
+# -*- coding: utf-8 -*-
+"""
+图谱的二进制快照（snapshot）读写。
+
+为什么需要：
+- GraphML 是 XML，解析慢，每个 server worker / 每次命令行启动都要付一次代价
+- buildKG.py 在写 GraphML 的同时，额外写一份紧凑的二进制快照
+- kg_api 加载时优先读快照，快照缺失或过期时再回退到 GraphML
+
+快照格式（pickle protocol 5，一个文件里依次 dump 两个对象）：
+1) header：格式版本 + 对应 GraphML 的指纹（大小 / mtime / sha256）
+2) body：
+    - nodes：节点 id 列表（节点的整数 ID 就是它在列表里的下标）
+    - node_attrs：{属性名: (节点下标数组, 值列表)}，按列存储，缺失的属性不占位置
+    - edge_src / edge_dst：边两端的节点下标（int32 数组）
+    - edge_keys：MultiDiGraph 的边 key（全是整数时存成 int32 数组）
+    - edge_attrs：{属性名: (边下标数组, 值列表)}，同样按列存储
+
+先读 header 即可判断快照是否和 GraphML 一致，不用反序列化整个 body。
+
+文件末尾还有增量构建的变更记录 imdb_kg.delta.json 的读写（见最后一节）。
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from typing import Dict, List, Optional
+
+import networkx as nx
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".snapshot.pkl"
+
+
+def snapshot_path_for(graphml_path: str) -> str:
+    """imdb_kg.graphml -> imdb_kg.snapshot.pkl（同目录）。"""
+    root, _ = os.path.splitext(str(graphml_path))
+    return root + SNAPSHOT_SUFFIX
+
+
+def _sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def graphml_fingerprint(graphml_path: str) -> Dict:
+    """GraphML 文件的指纹：大小、修改时间（纳秒）和内容 sha256。"""
+    st = os.stat(graphml_path)
+    return {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": _sha256(graphml_path),
+    }
+
+
+def _columns(items, count: int):
+    """把若干个属性 dict 转成 {属性名: (下标数组, 值列表)}。"""
+    cols: Dict = {}
+    for i, attrs in enumerate(items):
+        for k, v in attrs.items():
+            idx, vals = cols.setdefault(k, ([], []))
+            idx.append(i)
+            vals.append(v)
+    return {
+        k: (np.asarray(idx, dtype=np.int32 if count < 2 ** 31 else np.int64), vals)
+        for k, (idx, vals) in cols.items()
+    }
+
+
+def _rows(cols: Dict, count: int):
+    """_columns 的逆操作：还原成 count 个属性 dict。"""
+    rows = [{} for _ in range(count)]
+    for k, (idx, vals) in cols.items():
+        for i, v in zip(idx.tolist(), vals):
+            rows[i][k] = v
+    return rows
+
+
+def write_snapshot(
+    G: nx.MultiDiGraph,
+    graphml_path: str,
+    snapshot_path: Optional[str] = None,
+) -> str:
+    """
+    把图写成二进制快照。应在 GraphML 写完之后调用，
+    这样 header 里记录的是最终 GraphML 文件的指纹。
+
+    返回快照文件路径。
+    """
+    snapshot_path = snapshot_path or snapshot_path_for(graphml_path)
+
+    nodes = list(G.nodes())
+    node_pos = {n: i for i, n in enumerate(nodes)}
+    edges = list(G.edges(keys=True, data=True))
+    id_dtype = np.int32 if len(nodes) < 2 ** 31 else np.int64
+
+    keys = [k for _, _, k, _ in edges]
+    if all(isinstance(k, int) for k in keys):
+        edge_keys = np.asarray(keys, dtype=np.int32)
+    else:
+        edge_keys = keys
+
+    body = {
+        "graph": dict(G.graph),
+        "nodes": nodes,
+        "node_attrs": _columns((d for _, d in G.nodes(data=True)), len(nodes)),
+        "edge_src": np.asarray([node_pos[u] for u, _, _, _ in edges], dtype=id_dtype),
+        "edge_dst": np.asarray([node_pos[v] for _, v, _, _ in edges], dtype=id_dtype),
+        "edge_keys": edge_keys,
+        "edge_attrs": _columns((d for _, _, _, d in edges), len(edges)),
+    }
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "graphml": graphml_fingerprint(graphml_path),
+        "num_nodes": len(nodes),
+        "num_edges": len(edges),
+    }
+
+    # 先写临时文件再 rename，避免读者看到写了一半的快照
+    tmp_path = snapshot_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(header, f, protocol=5)
+        pickle.dump(body, f, protocol=5)
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+def fingerprint_matches(expected: Optional[Dict], graphml_path: str) -> bool:
+    """
+    之前记录的 GraphML 指纹是否对应当前的 GraphML 文件：
+    大小 + mtime 一致直接通过，否则比对 sha256。
+
+    GraphML 不存在（只部署了派生文件）时视为一致。
+    """
+    if not os.path.exists(graphml_path):
+        return True
+    expected = expected or {}
+    st = os.stat(graphml_path)
+    if st.st_size != expected.get("size"):
+        return False
+    if st.st_mtime_ns == expected.get("mtime_ns"):
+        return True
+    # mtime 变了（例如被复制过），按内容再确认一次
+    return _sha256(graphml_path) == expected.get("sha256")
+
+
+def _header_matches(header: Dict, graphml_path: str) -> bool:
+    """快照是否对应当前的 GraphML（格式版本 + GraphML 指纹）。"""
+    if header.get("version") != SNAPSHOT_VERSION:
+        return False
+    return fingerprint_matches(header.get("graphml"), graphml_path)
+
+
+def load_snapshot(
+    graphml_path: str,
+    snapshot_path: Optional[str] = None,
+) -> Optional[nx.MultiDiGraph]:
+    """
+    读取与 graphml_path 对应的快照，还原成 MultiDiGraph。
+
+    快照不存在、格式版本不符或与 GraphML 不一致时返回 None，
+    由调用方回退到 nx.read_graphml。
+    """
+    snapshot_path = snapshot_path or snapshot_path_for(graphml_path)
+    if not os.path.exists(snapshot_path):
+        return None
+
+    with open(snapshot_path, "rb") as f:
+        try:
+            header = pickle.load(f)
+        except Exception:
+            return None
+        if not isinstance(header, dict) or not _header_matches(header, graphml_path):
+            return None
+        body = pickle.load(f)
+
+    nodes = body["nodes"]
+    G = nx.MultiDiGraph()
+    G.graph.update(body["graph"])
+    G.add_nodes_from(zip(nodes, _rows(body["node_attrs"], len(nodes))))
+
+    src = body["edge_src"].tolist()
+    dst = body["edge_dst"].tolist()
+    keys = body["edge_keys"]
+    if isinstance(keys, np.ndarray):
+        keys = keys.tolist()
+    edge_attrs = _rows(body["edge_attrs"], len(src))
+    G.add_edges_from(
+        (nodes[u], nodes[v], k, d)
+        for u, v, k, d in zip(src, dst, keys, edge_attrs)
+    )
+    return G
+
+
+# ----------------------------------------------------------------------
+# 增量构建的变更记录
+# ----------------------------------------------------------------------
+#
+# buildKG.py --incremental 在上一版图上只替换受影响的电影。写完 GraphML 之后，
+# 它在旁边记下 imdb_kg.delta.json：被打补丁的那一版 GraphML 的 (大小, mtime)、
+# 新 GraphML 的 (大小, mtime)，以及两版之间不同的电影节点 id。
+# kg_api 热加载时如果手里正好是被打补丁的那一版，就只按这些电影更新索引
+# （见 kg_index.CoActorIndex.patched），不用在新图上从头构建。
+
+DELTA_SUFFIX = ".delta.json"
+
+
+def delta_path_for(graphml_path: str) -> str:
+    """imdb_kg.graphml -> imdb_kg.delta.json（同目录）。"""
+    root, _ = os.path.splitext(str(graphml_path))
+    return root + DELTA_SUFFIX
+
+
+def write_graph_delta(graphml_path: str, base: Dict, movies: List[str]) -> str:
+    """
+    记录这次增量构建改了哪些电影。应在 GraphML 写完之后调用。
+
+    base：被打补丁的上一版 GraphML 的指纹（graphml_fingerprint 的返回值）
+    movies：新旧两版之间不同（包括新增 / 删除）的电影节点 id
+    """
+    st = os.stat(graphml_path)
+    delta = {
+        "base": [base["size"], base["mtime_ns"]],
+        "graph": [st.st_size, st.st_mtime_ns],
+        "movies": list(movies),
+    }
+    path = delta_path_for(graphml_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(delta, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def remove_graph_delta(graphml_path: str) -> None:
+    """这次是从头建图，没有可用的变更记录。"""
+    path = delta_path_for(graphml_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def load_graph_delta(graphml_path: str) -> Optional[Dict]:
+    """读取变更记录：{"base": (大小, mtime), "graph": (大小, mtime), "movies": [...]}；没有时返回 None。"""
+    path = delta_path_for(graphml_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            delta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return {
+        "base": tuple(delta["base"]),
+        "graph": tuple(delta["graph"]),
+        "movies": delta["movies"],
+    }
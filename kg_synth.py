@@ -0,0 +1,332 @@
+# kg_synth.py
+# -*- coding: utf-8 -*-
+"""
+按 IMDb CSV 的形状生成合成数据，用来测 buildKG.py 在大数据量下的表现。
+
+为什么需要：
+- 仓库里只有三个共约 4.5k 行的 CSV，看不出 load_and_merge_csv / build_graph 随数据量怎么增长
+- 这里按 COMMON_COLS 的列生成任意规模（1 万 ~ 1000 万行）的 CSV，分布尽量接近真实数据：
+    - 每部电影的演员数、每个人参与的电影数都是幂律分布（少数明星演很多电影，大多数人只出现一两次）
+    - 导演和演员共用一个人名空间，部分人既当导演又当演员
+    - 一定比例的行是其他文件里已有电影的重复记录（dup_rate），热门电影重复得更多；
+      重复记录的评分略有出入、偶尔缺失，和多个数据源合并的真实情况一样
+    - 数值列有一定比例的缺失（missing_rate）
+    - Star Cast 和原始数据一样把多个名字直接拼在一起（"Kalo VenmarRita Sobel"）
+
+电影 / 人的属性都由 id 的哈希决定，不依赖生成顺序：同一部电影出现在不同文件、不同块里时
+标题、年份、导演、演员完全一致；同样的参数和 seed 生成的文件逐字节相同。
+按块生成、按块追加写入，内存占用与总行数无关。
+
+用法：
+    python kg_synth.py --rows 1000000 --out-dir bench_data/rows_1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from buildKG import COMMON_COLS
+
+# 名字 / 标题都由这些音节拼出来，全是小写 ASCII，首字母大写后 Star Cast 能按大小写切开
+SYLLABLES = [
+    "ka", "lo", "ven", "mar", "ri", "ta", "so", "bel", "an", "dor",
+    "mi", "ra", "el", "tan", "no", "va", "lin", "da", "ser", "ko",
+    "ha", "len", "ti", "mo", "gar", "fe", "ru", "sa", "por", "zi",
+    "ne", "wil",
+]
+NAME_SPACE = len(SYLLABLES) ** 5
+
+GENRES = [
+    "Drama", "Comedy", "Action", "Crime", "Adventure", "Biography", "Animation",
+    "Horror", "Documentary", "Mystery", "Fantasy", "Thriller", "Family", "Romance",
+    "Western", "Sci-Fi",
+]
+# 类型的出现频率大致按真实数据的比例
+GENRE_WEIGHTS = np.array([30, 20, 15, 9, 7, 5, 4, 3, 2, 1, 1, 1, 1, 0.5, 0.3, 0.2])
+
+CERTIFICATES = ["R", "PG-13", "PG", "Not Rated", "G", "TV-MA", "Approved", "Passed", "TV-14"]
+CERTIFICATE_WEIGHTS = np.array([35, 25, 15, 8, 5, 4, 4, 2, 2])
+
+# 传给 _hash_uniform 的盐，区分同一个 id 的不同属性
+_SALT_YEAR, _SALT_GENRE, _SALT_CERT = 2, 3, 4
+_SALT_DIRECTOR, _SALT_CAST_SIZE, _SALT_CAST = 5, 6, 7
+_SALT_RATING, _SALT_META, _SALT_DURATION = 8, 9, 10
+
+# 标题 / 人名的 id 先乘一个和 NAME_SPACE 互素的奇数再取模，相邻 id 的名字看起来不相关
+_TITLE_MULT = 2_654_435_761
+_NAME_MULT = 40_503
+
+
+# ----------------------------------------------------------------------
+# 确定性的随机数
+# ----------------------------------------------------------------------
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = x.astype(np.uint64, copy=True)
+    with np.errstate(over="ignore"):
+        x += np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hash_uniform(ids: np.ndarray, salt: int, seed: int) -> np.ndarray:
+    """id -> [0, 1) 上的均匀分布，只由 (id, salt, seed) 决定。"""
+    with np.errstate(over="ignore"):
+        key = ids.astype(np.uint64) * np.uint64(0x100000001B3) + np.uint64(salt * 7919 + seed)
+    return (_splitmix64(key) >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _power_law(u: np.ndarray, n: int, exponent: float) -> np.ndarray:
+    """
+    把 [0, 1) 上的均匀分布变换成 {0, ..., n-1} 上近似 P(k) ∝ (k+1)^-exponent 的幂律分布
+    （连续 Pareto 的逆 CDF 截断到 [1, n+1) 再取整）。
+    """
+    if exponent == 1.0:
+        x = (n + 1.0) ** u
+    else:
+        a = 1.0 - exponent
+        x = (1.0 + u * ((n + 1.0) ** a - 1.0)) ** (1.0 / a)
+    return np.minimum(np.floor(x).astype(np.int64) - 1, n - 1)
+
+
+def _weighted_choice(u: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    cdf = np.cumsum(weights) / weights.sum()
+    return np.minimum(np.searchsorted(cdf, u, side="right"), len(weights) - 1)
+
+
+# ----------------------------------------------------------------------
+# 名字
+# ----------------------------------------------------------------------
+
+def _syllable_digits(ids: np.ndarray, mult: int) -> List[np.ndarray]:
+    """id 映射成 5 个音节下标（NAME_SPACE 内是双射）。"""
+    base = len(SYLLABLES)
+    code = (ids.astype(np.int64) * mult) % NAME_SPACE
+    digits = []
+    for _ in range(5):
+        digits.append(code % base)
+        code //= base
+    return digits
+
+
+def person_names(ids: np.ndarray) -> List[str]:
+    """人 id -> "Kalo Venmarso" 这样的名字（名两个音节，姓三个音节，不同 id 名字不同）。"""
+    d = _syllable_digits(ids, _NAME_MULT)
+    s = SYLLABLES
+    return [
+        f"{(s[a] + s[b]).capitalize()} {(s[c] + s[e] + s[f]).capitalize()}"
+        for a, b, c, e, f in zip(*d)
+    ]
+
+
+def movie_titles(ids: np.ndarray) -> List[str]:
+    """电影 id -> 标题（不同 id 标题不同；再加上年份就是唯一的 (Title, Year)）。"""
+    d = _syllable_digits(ids, _TITLE_MULT)
+    s = SYLLABLES
+    return [
+        f"The {(s[a] + s[b]).capitalize()} of {(s[c] + s[e] + s[f]).capitalize()}"
+        for a, b, c, e, f in zip(*d)
+    ]
+
+
+# ----------------------------------------------------------------------
+# 生成
+# ----------------------------------------------------------------------
+
+class SynthConfig:
+    """合成数据的规模和分布参数。"""
+
+    def __init__(
+        self,
+        rows: int,
+        files: int = 3,
+        dup_rate: float = 0.15,
+        persons: int = None,
+        director_share: float = 0.2,
+        cast_exponent: float = 2.0,
+        max_cast: int = 15,
+        person_exponent: float = 0.7,
+        popularity_exponent: float = 1.2,
+        missing_rate: float = 0.05,
+        seed: int = 0,
+    ):
+        if rows < 1 or files < 1:
+            raise ValueError("rows 和 files 都必须 >= 1")
+        if not 0.0 <= dup_rate < 1.0:
+            raise ValueError("dup_rate 必须在 [0, 1) 内")
+        self.rows = rows
+        self.files = files
+        self.dup_rate = dup_rate
+        # 不同电影数；剩下的行是重复记录
+        self.movies = max(1, round(rows * (1.0 - dup_rate)))
+        # 人名空间默认是电影数的 3 倍；配合 person_exponent=0.7，
+        # 约六成的人只出现在一部电影里，最红的人出现在约 1% 的电影里
+        self.persons = min(persons or max(10, self.movies * 3), NAME_SPACE)
+        # 导演从人名空间的前 director_share 部分里抽，和演员有交集
+        self.directors = max(1, int(self.persons * director_share))
+        self.cast_exponent = cast_exponent
+        self.max_cast = max_cast
+        self.person_exponent = person_exponent
+        self.popularity_exponent = popularity_exponent
+        self.missing_rate = missing_rate
+        self.seed = seed
+        if self.movies > NAME_SPACE:
+            raise ValueError(f"电影数不能超过 {NAME_SPACE}")
+
+    def to_dict(self) -> Dict:
+        return dict(vars(self))
+
+
+def _movie_columns(mids: np.ndarray, cfg: SynthConfig) -> Dict[str, list]:
+    """电影 id -> 各列的"标准"取值（同一部电影每次生成都相同）。"""
+    seed = cfg.seed
+    year = 2024 - _power_law(_hash_uniform(mids, _SALT_YEAR, seed), 105, 0.8)  # 近年的电影多
+    genre = _weighted_choice(_hash_uniform(mids, _SALT_GENRE, seed), GENRE_WEIGHTS)
+    cert = _weighted_choice(_hash_uniform(mids, _SALT_CERT, seed), CERTIFICATE_WEIGHTS)
+    director = _power_law(_hash_uniform(mids, _SALT_DIRECTOR, seed), cfg.directors, cfg.person_exponent)
+    rating = np.clip(np.round(4.0 + 5.5 * _hash_uniform(mids, _SALT_RATING, seed) ** 0.7, 1), 1.0, 9.8)
+    meta = np.floor(20 + 79 * _hash_uniform(mids, _SALT_META, seed))
+    duration = np.floor(70 + 120 * _hash_uniform(mids, _SALT_DURATION, seed) ** 2)
+
+    # 每部电影的演员数是幂律分布，演员从整个人名空间按幂律抽取
+    cast_size = 1 + _power_law(_hash_uniform(mids, _SALT_CAST_SIZE, seed), cfg.max_cast, cfg.cast_exponent)
+    offsets = np.concatenate([[0], np.cumsum(cast_size)])
+    slot_ids = np.repeat(mids.astype(np.int64) * cfg.max_cast, cast_size) + (
+        np.arange(offsets[-1]) - np.repeat(offsets[:-1], cast_size)
+    )
+    cast = _power_law(_hash_uniform(slot_ids, _SALT_CAST, seed), cfg.persons, cfg.person_exponent)
+
+    people = np.unique(np.concatenate([cast, director]))
+    names = dict(zip(people.tolist(), person_names(people)))
+    cast_names = [names[p] for p in cast.tolist()]
+    star_cast = [
+        "".join(dict.fromkeys(cast_names[offsets[i]:offsets[i + 1]]))
+        for i in range(len(mids))
+    ]
+    return {
+        "Title": movie_titles(mids),
+        "IMDb Rating": rating,
+        "Year": year,
+        "Certificates": [CERTIFICATES[c] for c in cert],
+        "Genre": [GENRES[g] for g in genre],
+        "Director": [names[d] for d in director.tolist()],
+        "Star Cast": star_cast,
+        "MetaScore": meta,
+        "Duration (minutes)": duration,
+    }
+
+
+def generate_chunk(mids: np.ndarray, is_dup: np.ndarray, cfg: SynthConfig, rng) -> pd.DataFrame:
+    """给定每行对应的电影 id，生成一块 COMMON_COLS 形状的 DataFrame。"""
+    cols = _movie_columns(mids, cfg)
+    n = len(mids)
+
+    # 重复记录：评分略有出入，分级偶尔写成 Not Rated
+    rating = cols["IMDb Rating"] + np.where(is_dup, rng.choice([-0.1, 0.0, 0.1], size=n), 0.0)
+    cols["IMDb Rating"] = np.clip(np.round(rating, 1), 1.0, 10.0)
+    relabel = is_dup & (rng.random(n) < 0.05)
+    cols["Certificates"] = np.where(relabel, "Not Rated", np.asarray(cols["Certificates"], dtype=object))
+
+    # 数值列随机缺失
+    for col in ("IMDb Rating", "MetaScore", "Duration (minutes)"):
+        values = cols[col].astype(np.float64)
+        values[rng.random(n) < cfg.missing_rate] = np.nan
+        cols[col] = values
+
+    return pd.DataFrame(cols, columns=COMMON_COLS)
+
+
+def _file_rows(cfg: SynthConfig, f: int):
+    """第 f 个文件的 (独有电影 id, 重复记录行数)。"""
+    own = np.arange(f, cfg.movies, cfg.files, dtype=np.int64)
+    total = cfg.rows // cfg.files + (1 if f < cfg.rows % cfg.files else 0)
+    return own, max(0, total - len(own))
+
+
+def _dup_movies(count: int, f: int, cfg: SynthConfig, rng) -> np.ndarray:
+    """抽 count 部热门程度按幂律分布的电影，尽量来自其他文件（跨文件重复）。"""
+    picks = _power_law(rng.random(count), cfg.movies, cfg.popularity_exponent)
+    # 热门程度的排名和电影 id 解耦，否则热门电影都挤在最小的几个 id 上
+    picks = (picks * _TITLE_MULT) % cfg.movies
+    if cfg.files > 1 and cfg.movies > 1:
+        home = picks % cfg.files == f
+        picks[home] = (picks[home] + 1) % cfg.movies
+    return picks
+
+
+def write_dataset(cfg: SynthConfig, out_dir: str, chunksize: int = 200_000) -> List[str]:
+    """
+    生成 cfg.files 个 CSV 写到 out_dir，返回文件路径列表。
+    out_dir 里会同时写一个 synth_meta.json 记录生成参数，kg_bench.py 据此判断能否复用。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for f in range(cfg.files):
+        rng = np.random.default_rng([cfg.seed, f])
+        own, n_dup = _file_rows(cfg, f)
+        dups = _dup_movies(n_dup, f, cfg, rng)
+        mids = np.concatenate([own, dups])
+        is_dup = np.concatenate([np.zeros(len(own), bool), np.ones(len(dups), bool)])
+        order = rng.permutation(len(mids))
+        mids, is_dup = mids[order], is_dup[order]
+
+        path = os.path.join(out_dir, f"IMDb_Synthetic_{f + 1}.csv")
+        tmp = path + ".tmp"
+        for start in range(0, len(mids), chunksize):
+            stop = start + chunksize
+            chunk = generate_chunk(mids[start:stop], is_dup[start:stop], cfg, rng)
+            chunk.to_csv(tmp, mode="w" if start == 0 else "a", header=start == 0, index=False)
+        if len(mids) == 0:
+            pd.DataFrame(columns=COMMON_COLS).to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        paths.append(path)
+
+    with open(os.path.join(out_dir, "synth_meta.json"), "w", encoding="utf-8") as fp:
+        json.dump({"config": cfg.to_dict(), "files": [os.path.basename(p) for p in paths]}, fp, indent=2)
+    return paths
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="生成 IMDb 形状的合成 CSV（列与 buildKG.COMMON_COLS 一致）")
+    parser.add_argument("--rows", type=int, required=True, help="总行数（所有文件合计）")
+    parser.add_argument("--out-dir", required=True, help="输出目录")
+    parser.add_argument("--files", type=int, default=3, help="拆成几个 CSV（默认 3，与 data/ 一致）")
+    parser.add_argument("--dup-rate", type=float, default=0.15, help="跨文件重复记录占总行数的比例（默认 0.15）")
+    parser.add_argument("--persons", type=int, default=None, help="人名空间大小（默认为电影数的 3 倍）")
+    parser.add_argument("--cast-exponent", type=float, default=2.0, help="每部电影演员数的幂律指数（默认 2.0）")
+    parser.add_argument("--max-cast", type=int, default=15, help="每部电影最多几个演员（默认 15）")
+    parser.add_argument("--person-exponent", type=float, default=0.7, help="每个人参与电影数的幂律指数（默认 0.7）")
+    parser.add_argument("--missing-rate", type=float, default=0.05, help="数值列的缺失比例（默认 0.05）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunksize", type=int, default=200_000, help="每块生成 / 写入的行数")
+    return parser.parse_args(argv)
+
+
+def config_from_args(args) -> SynthConfig:
+    return SynthConfig(
+        rows=args.rows,
+        files=args.files,
+        dup_rate=args.dup_rate,
+        persons=args.persons,
+        cast_exponent=args.cast_exponent,
+        max_cast=args.max_cast,
+        person_exponent=args.person_exponent,
+        missing_rate=args.missing_rate,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        cfg = config_from_args(args)
+    except ValueError as e:
+        sys.exit(f"参数错误：{e}")
+    for p in write_dataset(cfg, args.out_dir, args.chunksize):
+        print(f"已生成: {os.path.abspath(p)}")
@@ -0,0 +1,231 @@
+# kg_tables.py
+# -*- coding: utf-8 -*-
+"""
+图谱的 Parquet 节点表 / 边表导出与读取。
+
+为什么需要：
+- GraphML 是 XML，写和读都慢，下游分析任务即使只要一两列也得整个解析
+- 这里把图导出成两张带类型的列式表，放在一个目录里（默认 imdb_kg.tables/）：
+  分析任务可以用 pyarrow / pandas / DuckDB 只读需要的列（mmap，零拷贝），
+  kg_api 也可以直接从这两张表构图（KG_GRAPH_BACKEND=parquet）
+
+存储内容（目录内）：
+- nodes.parquet：每个节点一行
+    - id：节点的整数 ID（int32，就是它在图里的下标，边表用它引用节点）
+    - node_id：原始节点 id 字符串，例如 "movie::Inception (2010)"
+    - type：节点类型（dictionary 编码）
+    - 其余每个节点属性一列：整数 -> int64，小数 -> float64，其他 -> string，缺失为 null
+- edges.parquet：每条边一行
+    - src / dst：两端节点的整数 ID（int32）
+    - key：MultiDiGraph 的边 key
+    - relation：关系类型（dictionary 编码）
+    - 其余边属性同上，各占一列
+- meta.json：格式版本、节点数 / 边数、对应 GraphML 的指纹
+
+表内行的顺序与原图一致（节点按插入顺序，边按 G.edges() 的顺序），还原出的图与原图相同。
+
+pyarrow 是可选依赖：只有导出 / 读取这两张表时才需要。
+"""
+
+import json
+import os
+import shutil
+import sys
+from typing import Dict, Optional
+
+import networkx as nx
+
+from kg_snapshot import fingerprint_matches, graphml_fingerprint
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 未安装时，其余模块照常可用
+    pa = None
+    pq = None
+
+TABLES_VERSION = 1
+TABLES_SUFFIX = ".tables"
+
+# 单独成列、不当作普通属性处理的字段
+_NODE_FIXED = ("type",)
+_EDGE_FIXED = ("relation",)
+
+
+def tables_path_for(graphml_path: str) -> str:
+    """imdb_kg.graphml -> imdb_kg.tables/（同目录）。"""
+    root, _ = os.path.splitext(str(graphml_path))
+    return root + TABLES_SUFFIX
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("导出 / 读取 Parquet 节点表和边表需要 pyarrow：pip install pyarrow")
+
+
+# ----------------------------------------------------------------------
+# 写入
+# ----------------------------------------------------------------------
+
+def _attr_array(values):
+    """一列属性 -> Arrow 数组：全是整数用 int64，数值用 float64，否则转成字符串。"""
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return pa.array(values, type=pa.int64())
+    if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return pa.array([None if v is None else float(v) for v in values], type=pa.float64())
+    return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _attr_columns(dicts, fixed) -> Dict:
+    """属性 dict 列表 -> {属性名: Arrow 数组}，列的顺序按属性第一次出现的顺序。"""
+    names = []
+    for d in dicts:
+        for k in d:
+            if k not in fixed and k not in names:
+                names.append(k)
+    return {name: _attr_array([d.get(name) for d in dicts]) for name in names}
+
+
+def write_tables(
+    G: nx.MultiDiGraph,
+    graphml_path: str,
+    out_dir: Optional[str] = None,
+) -> str:
+    """
+    把图导出成 Parquet 节点表 / 边表。应在 GraphML 写完之后调用，
+    meta.json 里会记录 GraphML 的指纹，加载时据此判断是否过期。
+
+    返回目录路径。
+    """
+    _require_pyarrow()
+    out_dir = out_dir or tables_path_for(graphml_path)
+
+    nodes = list(G.nodes())
+    pos = {n: i for i, n in enumerate(nodes)}
+    node_dicts = [d for _, d in G.nodes(data=True)]
+    node_table = pa.table({
+        "id": pa.array(range(len(nodes)), type=pa.int32()),
+        "node_id": pa.array([str(n) for n in nodes], type=pa.string()),
+        "type": pa.array([d.get("type") for d in node_dicts], type=pa.string()).dictionary_encode(),
+        **_attr_columns(node_dicts, _NODE_FIXED),
+    })
+
+    edges = list(G.edges(keys=True, data=True))
+    edge_dicts = [d for _, _, _, d in edges]
+    keys = [k for _, _, k, _ in edges]
+    int_keys = all(isinstance(k, int) for k in keys)
+    edge_table = pa.table({
+        "src": pa.array([pos[u] for u, _, _, _ in edges], type=pa.int32()),
+        "dst": pa.array([pos[v] for _, v, _, _ in edges], type=pa.int32()),
+        "key": pa.array(keys if int_keys else [str(k) for k in keys],
+                        type=pa.int32() if int_keys else pa.string()),
+        "relation": pa.array([d.get("relation") for d in edge_dicts], type=pa.string()).dictionary_encode(),
+        **_attr_columns(edge_dicts, _EDGE_FIXED),
+    })
+
+    meta = {
+        "version": TABLES_VERSION,
+        "num_nodes": len(nodes),
+        "num_edges": len(edges),
+        "graph": dict(G.graph),
+        "graphml": graphml_fingerprint(graphml_path) if os.path.exists(graphml_path) else None,
+    }
+
+    # 先写到临时目录，再整体替换，避免读者看到写了一半的表
+    tmp_dir = out_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    pq.write_table(node_table, os.path.join(tmp_dir, "nodes.parquet"))
+    pq.write_table(edge_table, os.path.join(tmp_dir, "edges.parquet"))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    old_dir = out_dir + ".old"
+    if os.path.exists(out_dir):
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    return out_dir
+
+
+# ----------------------------------------------------------------------
+# 读取
+# ----------------------------------------------------------------------
+
+def read_table(tables_dir: str, name: str, columns=None):
+    """
+    以 mmap 方式读取 nodes / edges 表（可只读部分列），返回 pyarrow.Table。
+    给下游分析任务用，例如：read_table("imdb_kg.tables", "nodes", ["type", "imdb_rating"])
+    """
+    _require_pyarrow()
+    return pq.read_table(
+        os.path.join(tables_dir, f"{name}.parquet"), columns=columns, memory_map=True,
+    )
+
+
+def _rows(table, fixed) -> list:
+    """把表的属性列还原成每行一个属性 dict（null 不放进 dict）。"""
+    rows = [{} for _ in range(table.num_rows)]
+    for name in fixed:
+        for row, v in zip(rows, table.column(name).to_pylist()):
+            if v is not None:
+                row[name] = v
+    skip = {"id", "node_id", "src", "dst", "key", *fixed}
+    for name in table.column_names:
+        if name in skip:
+            continue
+        for row, v in zip(rows, table.column(name).to_pylist()):
+            if v is not None:
+                row[name] = v
+    return rows
+
+
+def load_tables(
+    graphml_path: str,
+    tables_dir: Optional[str] = None,
+) -> Optional[nx.MultiDiGraph]:
+    """
+    从与 graphml_path 对应的节点表 / 边表还原 MultiDiGraph。
+
+    目录不存在或与 GraphML 不一致时返回 None，由调用方回退到其他格式。
+    """
+    tables_dir = tables_dir or tables_path_for(graphml_path)
+    meta_path = os.path.join(tables_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != TABLES_VERSION:
+        return None
+    if not fingerprint_matches(meta.get("graphml"), graphml_path):
+        return None
+
+    node_table = read_table(tables_dir, "nodes")
+    edge_table = read_table(tables_dir, "edges")
+
+    nodes = node_table.column("node_id").to_pylist()
+    G = nx.MultiDiGraph()
+    G.graph.update(meta.get("graph") or {})
+    G.add_nodes_from(zip(nodes, _rows(node_table, _NODE_FIXED)))
+
+    src = edge_table.column("src").to_pylist()
+    dst = edge_table.column("dst").to_pylist()
+    keys = edge_table.column("key").to_pylist()
+    G.add_edges_from(
+        (nodes[u], nodes[v], k, d)
+        for u, v, k, d in zip(src, dst, keys, _rows(edge_table, _EDGE_FIXED))
+    )
+    return G
+
+
+if __name__ == "__main__":
+    # 用法：python kg_tables.py [imdb_kg.graphml]
+    # 从已有的 GraphML 导出节点表 / 边表（不需要重新跑 buildKG.py）
+    src = sys.argv[1] if len(sys.argv) > 1 else "imdb_kg.graphml"
+    out = write_tables(nx.read_graphml(src), src)
+    print(f"Parquet 节点表 / 边表已保存到: {os.path.abspath(out)}")
@@ -1,23 +1,102 @@
 # llm_client.py
 # -*- coding: utf-8 -*-
 
+import importlib.util
 import os
+import threading
 from typing import List, Dict
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
 
-# 建议通过环境变量设置 key：
+# ----------------------------------------------------------------------
+# 连接配置（全部来自环境变量）
+# ----------------------------------------------------------------------
+#
+# 整个进程共用一个同步客户端和一个异步客户端（get_client / get_async_client），
+# 底层各有一个 httpx 连接池：连接保持 keep-alive 复用，不必每个请求都重新做 TLS 握手。
+#
+# API Key 通过环境变量设置：
 #   Linux / macOS: export DASHSCOPE_API_KEY="你的真实key"
 #   Windows CMD:   set DASHSCOPE_API_KEY=你的真实key
-API_KEY = "sk-4442f7376d3d4740848837c522ab62a9"
 
-if not API_KEY:
-    raise RuntimeError("请先在环境变量 DASHSCOPE_API_KEY 中配置你的 API Key")
+API_KEY = os.getenv("DASHSCOPE_API_KEY")
+BASE_URL = os.getenv("LLM_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+
+# 连接池：最大连接数、最多保留多少个空闲 keep-alive 连接、空闲连接保留多久（秒）
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+# 超时（秒）：建立连接 / 两次收到数据之间的间隔（流式输出时是两个 chunk 之间）/ 发送请求 / 等待连接池
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_WRITE_TIMEOUT = float(os.getenv("LLM_WRITE_TIMEOUT", "10"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "10"))
+# 失败重试次数（openai SDK 自带的指数退避重试）
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# LLM_HTTP2=1 时启用 HTTP/2（多个请求复用同一个连接），需要 pip install "httpx[http2]"
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "0") == "1"
+
+_CLIENT_LOCK = threading.Lock()
+_CLIENT = None
+_ASYNC_CLIENT = None
+
+
+def _http_options() -> Dict:
+    """httpx.Client / httpx.AsyncClient 共用的连接池、超时和 HTTP/2 配置。"""
+    if not API_KEY:
+        raise RuntimeError("请先在环境变量 DASHSCOPE_API_KEY 中配置你的 API Key")
+    if LLM_HTTP2:
+        if importlib.util.find_spec("h2") is None:
+            raise ImportError('LLM_HTTP2=1 需要 HTTP/2 支持：pip install "httpx[http2]"')
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(
+            connect=LLM_CONNECT_TIMEOUT,
+            read=LLM_READ_TIMEOUT,
+            write=LLM_WRITE_TIMEOUT,
+            pool=LLM_POOL_TIMEOUT,
+        ),
+        "http2": LLM_HTTP2,
+    }
+
+
+def get_client() -> OpenAI:
+    """进程内共享的同步客户端（第一次调用时创建）。"""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = OpenAI(
+                    api_key=API_KEY,
+                    base_url=BASE_URL,
+                    max_retries=LLM_MAX_RETRIES,
+                    http_client=httpx.Client(**_http_options()),
+                )
+    return _CLIENT
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    进程内共享的异步客户端（第一次调用时创建），供 api_server_stream 在事件循环里使用。
+    连接池绑定在创建它的事件循环上，所以只应在同一个事件循环（即服务进程）里使用。
+    """
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        with _CLIENT_LOCK:
+            if _ASYNC_CLIENT is None:
+                _ASYNC_CLIENT = AsyncOpenAI(
+                    api_key=API_KEY,
+                    base_url=BASE_URL,
+                    max_retries=LLM_MAX_RETRIES,
+                    http_client=httpx.AsyncClient(**_http_options()),
+                )
+    return _ASYNC_CLIENT
 
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-)
 
 # 计划阶段用的模型
 PLAN_MODEL = "qwen3-max"
@@ -42,7 +121,7 @@ def stream_chat(
     if enable_thinking:
         extra_args["extra_body"] = {"enable_thinking": True}
 
-    completion = client.chat.completions.create(
+    completion = get_client().chat.completions.create(
         model=model,
         messages=messages,
         stream=True,
@@ -7,18 +7,32 @@
 流程：
 1. 用户输入自然语言问题
 2. 调用 generate_plan(question)：让 qwen3-max 生成“查询计划 JSON”（流式打印）
-3. execute_plan(plan)：在本地知识图谱上执行查询
+   同一个问题之前成功执行过时，直接用计划缓存（plan_cache.py）里的计划；
+   常见句式由本地规则规划器（rule_planner.py）直接生成计划；这两种情况都不调用模型
+3. execute_plan(plan)：在本地知识图谱上执行查询；执行成功的计划写回缓存
 4. generate_answer(question, exec_result)：用 qwen3-8b 深度思考模式，根据结果回答（流式打印）
 """
 
 import json
-from typing import Dict, Any
+import os
+from typing import Dict, Any, Optional, Tuple
 
 from llm_client import stream_chat, PLAN_MODEL, ANSWER_MODEL
 from prompts import PLAN_SYSTEM_PROMPT, PLAN_FEWSHOT, ANSWER_SYSTEM_PROMPT
+from plan_cache import PlanCache, plan_namespace
+from rule_planner import plan_question
 import kg_api
 
 
+# 查询计划缓存（配置见 PlanCache.from_env）。模型或提示词变了，持久化的旧计划自动作废
+PLAN_CACHE = PlanCache.from_env(
+    namespace=plan_namespace(PLAN_MODEL, PLAN_SYSTEM_PROMPT, PLAN_FEWSHOT)
+)
+
+# 设置 PLAN_FAST_PATH=0 可以关闭本地规则规划器（例如评测大模型规划效果时）
+PLAN_FAST_PATH = os.getenv("PLAN_FAST_PATH", "1") == "1"
+
+
 # ----------------------------------------------------------------------
 # 1. 生成查询计划（第一次调用：qwen3-max）
 # ----------------------------------------------------------------------
@@ -46,8 +60,23 @@ def build_plan_messages(question: str):
 def generate_plan(question: str) -> Dict[str, Any]:
     """
     调用 qwen3-max，将自然语言问题转换为查询计划 JSON（dict）。
-    带流式调试输出。
+    带流式调试输出；命中计划缓存或本地规则能处理时不调用模型（见 local_plan）。
     """
+    plan, _ = _generate_plan(question)
+    return plan
+
+
+def _generate_plan(question: str) -> Tuple[Dict[str, Any], str]:
+    """
+    返回 (计划, 来源)，来源是：
+    - "cache" / "near" / "rules"：见 local_plan
+    - "llm"：模型生成并成功解析（执行成功后可以写入缓存）
+    - "fallback"：模型输出解析失败，用的兜底计划（不缓存）
+    """
+    plan, source = local_plan(question)
+    if plan is not None:
+        return plan, source
+
     messages = build_plan_messages(question)
     raw = stream_chat(
         model=PLAN_MODEL,
@@ -66,7 +95,24 @@ def generate_plan(question: str) -> Dict[str, Any]:
             "task": "movie_basic_info",
             "params": {"title": question.strip()},
         }
-    return plan
+        return plan, "fallback"
+    return plan, "llm"
+
+
+def local_plan(question: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    不调用模型就能得到的计划，返回 (计划, 来源)，都拿不到时返回 (None, None)：
+    - "cache" / "near"：计划缓存精确 / 近似命中
+    - "rules"：本地规则规划器有把握的计划
+    """
+    cached, status = PLAN_CACHE.get(question)
+    if cached is not None:
+        return cached, "cache" if status == "hit" else status
+    if PLAN_FAST_PATH:
+        plan = plan_question(question)
+        if plan is not None:
+            return plan, "rules"
+    return None, None
 
 
 # ----------------------------------------------------------------------
@@ -160,6 +206,21 @@ def execute_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
+def execution_succeeded(exec_result: Dict[str, Any]) -> bool:
+    """
+    判断计划是否执行成功、值得写入计划缓存：
+    没有 error，并且查到了东西（什么都没查到时，多半是模型抽取的片名 / 人名不对，
+    缓存下来会让同一个问题一直错下去）。
+    """
+    if not isinstance(exec_result, dict) or exec_result.get("error"):
+        return False
+    result = exec_result.get("result")
+    if isinstance(result, dict) and "movie" in result:
+        # similar_movies：电影本身没找到时返回 {"movie": None, ...}
+        return result["movie"] is not None
+    return bool(result)
+
+
 # ----------------------------------------------------------------------
 # 3. 根据查询结果生成自然语言回答（第二次调用：qwen3-8b + 思考模式）
 # ----------------------------------------------------------------------
@@ -207,13 +268,17 @@ def answer_question(question: str) -> str:
     """
     对外的主接口：给一个自然语言问题 → 返回一个图增强的回答。
     """
-    # 1. 生成查询计划
-    plan = generate_plan(question)
+    # 1. 生成查询计划（先查计划缓存）
+    plan, source = _generate_plan(question)
+    if source != "llm":
+        print(f"计划来源: {source}")
     print("计划解析结果:", json.dumps(plan, ensure_ascii=False, indent=2))
 
-    # 2. 执行计划
+    # 2. 执行计划；模型新生成的计划执行成功后写入缓存
     exec_result = execute_plan(plan)
     print("图查询结果:", json.dumps(exec_result, ensure_ascii=False, indent=2))
+    if source == "llm" and execution_succeeded(exec_result):
+        PLAN_CACHE.put(question, plan)
 
     # 3. 生成回答（深度思考）
     answer = generate_answer(question, exec_result)
@@ -0,0 +1,258 @@
+# plan_cache.py
+# -*- coding: utf-8 -*-
+"""
+查询计划缓存：同一个问题（或只是换了标点、大小写、空格的问题）不再调用 PLAN_MODEL。
+
+为什么需要：
+- 生成查询计划要调用一次 qwen3-max，图查询开始之前就有 1~3 秒延迟
+- 线上问题重复度很高（热门电影、热门导演），完全相同或几乎相同的问题会得到同一个计划
+
+做法：
+- key = 归一化后的问题（NFKC、casefold、压缩空白、去掉首尾标点）
+- 可选的近似匹配（near_threshold > 0 时启用）：问题切成字符 2-gram / 3-gram，
+  在已缓存的问题里按余弦相似度找最接近的一个，达到阈值才复用。
+  模板相同、实体不同的问题（"诺兰拍过哪些电影" / "斯皮尔伯格拍过哪些电影"）相似度也会很高，
+  所以近似命中还要求：缓存计划里的字符串参数（片名 / 人名 / 类型）都出现在新问题里，
+  并且两个问题里的数字完全相同
+- 有界 LRU；可选持久化到 JSON 文件（每次写入后原子替换），启动时读回
+- namespace（模型 + 提示词的指纹）变化时丢弃旧的持久化内容，换了提示词不会用到旧计划
+- 只缓存成功解析、并且执行成功的计划，由调用方在执行之后调用 put()
+"""
+
+import copy
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+PLAN_CACHE_VERSION = 1
+
+NGRAM_SIZES = (2, 3)
+
+_EDGE_PUNCT = re.compile(r"^[\s\W_]+|[\s\W_]+$")
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_question(question: str) -> str:
+    """NFKC（全角转半角）、casefold、压缩空白、去掉首尾的标点和空白。"""
+    text = unicodedata.normalize("NFKC", question or "").casefold()
+    text = " ".join(text.split())
+    return _EDGE_PUNCT.sub("", text)
+
+
+def _ngram_vector(text: str) -> Dict[str, float]:
+    """字符 n-gram 词频向量（已做 L2 归一化）。"""
+    compact = text.replace(" ", "")
+    grams = Counter(
+        compact[i:i + n]
+        for n in NGRAM_SIZES
+        for i in range(len(compact) - n + 1)
+    )
+    norm = math.sqrt(sum(c * c for c in grams.values()))
+    return {g: c / norm for g, c in grams.items()} if norm else {}
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(g, 0.0) for g, v in a.items())
+
+
+def _param_strings(plan: Dict) -> List[str]:
+    """计划参数里的字符串值（归一化后），近似命中时要求它们都出现在新问题里。"""
+    params = plan.get("params") or {}
+    return [normalize_question(v) for v in params.values() if isinstance(v, str) and v.strip()]
+
+
+def plan_namespace(*parts) -> str:
+    """由模型名、提示词、few-shot 等算出的指纹，任何一项变化都会使旧缓存失效。"""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(json.dumps(part, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class PlanCache:
+    """线程安全的查询计划 LRU 缓存，支持可选的近似匹配和磁盘持久化。"""
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        near_threshold: float = 0.0,
+        path: Optional[str] = None,
+        namespace: str = "",
+    ):
+        self.maxsize = maxsize
+        self.near_threshold = near_threshold
+        self.path = path
+        self.namespace = namespace
+        # key -> (原始问题, 计划)
+        self._data: "OrderedDict[str, Tuple[str, Dict]]" = OrderedDict()
+        # 近似匹配用：key -> n-gram 向量，以及 n-gram -> keys 的倒排表
+        self._vectors: Dict[str, Dict[str, float]] = {}
+        self._postings: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._load()
+
+    @classmethod
+    def from_env(cls, namespace: str = "") -> "PlanCache":
+        """
+        从环境变量读取配置：
+        - PLAN_CACHE_SIZE：条目上限（默认 1024，0 表示关闭缓存）
+        - PLAN_CACHE_NEAR_THRESHOLD：近似匹配的余弦相似度阈值（默认 0，即只做精确匹配）
+        - PLAN_CACHE_PATH：持久化文件路径（默认不持久化）
+        """
+        return cls(
+            maxsize=int(os.getenv("PLAN_CACHE_SIZE", "1024")),
+            near_threshold=float(os.getenv("PLAN_CACHE_NEAR_THRESHOLD", "0")),
+            path=os.getenv("PLAN_CACHE_PATH") or None,
+            namespace=namespace,
+        )
+
+    # ---------------- 查找 ----------------
+
+    def get(self, question: str) -> Tuple[Optional[Dict], str]:
+        """
+        查找问题对应的计划，返回 (计划副本或 None, "hit" / "near" / "miss")。
+        """
+        if self.maxsize <= 0:
+            return None, "miss"
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1]), "hit"
+
+            if self.near_threshold > 0 and key:
+                near = self._near_match(key)
+                if near is not None:
+                    self._data.move_to_end(near)
+                    self.near_hits += 1
+                    return copy.deepcopy(self._data[near][1]), "near"
+
+            self.misses += 1
+            return None, "miss"
+
+    def _near_match(self, key: str) -> Optional[str]:
+        """在已缓存的问题里找最相似、且通过实体 / 数字校验的一个。"""
+        vector = _ngram_vector(key)
+        candidates = set()
+        for gram in vector:
+            candidates.update(self._postings.get(gram, ()))
+
+        digits = _DIGITS.findall(key)
+        best, best_score = None, self.near_threshold
+        for other in candidates:
+            score = _cosine(vector, self._vectors[other])
+            if score < best_score:
+                continue
+            if _DIGITS.findall(other) != digits:
+                continue
+            if not all(s in key for s in _param_strings(self._data[other][1])):
+                continue
+            best, best_score = other, score
+        return best
+
+    # ---------------- 写入 ----------------
+
+    def put(self, question: str, plan: Dict) -> None:
+        """缓存一个已成功执行的计划。"""
+        if self.maxsize <= 0:
+            return
+        key = normalize_question(question)
+        if not key:
+            return
+        with self._lock:
+            self._insert(key, question, copy.deepcopy(plan))
+            if self.path:
+                self._save()
+
+    def _insert(self, key: str, question: str, plan: Dict) -> None:
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (question, plan)
+        vector = _ngram_vector(key)
+        self._vectors[key] = vector
+        for gram in vector:
+            self._postings.setdefault(gram, set()).add(key)
+        while len(self._data) > self.maxsize:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        del self._data[key]
+        for gram in self._vectors.pop(key, {}):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._vectors.clear()
+            self._postings.clear()
+            if self.path:
+                self._save()
+
+    # ---------------- 持久化 ----------------
+
+    def _save(self) -> None:
+        payload = {
+            "version": PLAN_CACHE_VERSION,
+            "namespace": self.namespace,
+            # 按 LRU 顺序（最久未用的在前）保存，读回后淘汰顺序不变
+            "entries": [
+                {"question": question, "plan": plan}
+                for question, plan in self._data.values()
+            ],
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return
+        if payload.get("version") != PLAN_CACHE_VERSION or payload.get("namespace") != self.namespace:
+            return
+        for entry in payload.get("entries", []):
+            key = normalize_question(entry.get("question", ""))
+            if key and isinstance(entry.get("plan"), dict):
+                self._insert(key, entry["question"], entry["plan"])
+
+    # ---------------- 统计 ----------------
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "near_threshold": self.near_threshold,
+                "path": self.path,
+            }
@@ -0,0 +1,225 @@
+# plan_stream.py
+# -*- coding: utf-8 -*-
+"""
+流式解析查询计划：计划 JSON 还没生成完，就能知道 task 和必填参数，提前开始图查询。
+
+为什么需要：
+- 以前要等 qwen3-max 把整个计划输出完、json.loads 之后才开始执行 execute_plan
+- 计划 JSON 的结尾通常只是可选参数（limit、year_min……）和几个右括号，
+  而 task 和必填参数（title / name / genre）早就生成出来了
+
+做法：
+- parse_partial_json：解析一个 JSON 前缀，只保留已经完整的字符串 / 数字 / 字面量；
+  没闭合的对象 / 数组也返回（里面同样只有完整的成员）
+- PlanStreamParser：每收到一段模型输出就重新解析一遍（计划只有几十到上百个字符，代价可以忽略），
+  task 是已知任务、它的必填参数都完整之后，给出"推测计划"（只推测一次）；
+  之后只有 task 或必填参数的值变了才重新推测，多出来的可选参数不会触发重新执行
+- 流结束后仍以 json.loads(完整输出) 为准：推测计划与最终计划相同就直接用推测执行的结果，
+  不同（模型后面又改了参数，或者整段输出不是合法 JSON）就丢弃推测结果，按最终计划重新执行
+"""
+
+import re
+from json.decoder import scanstring
+from typing import Any, Dict, Optional, Tuple
+
+# 每个 task 的必填参数（与 prompts.PLAN_SYSTEM_PROMPT 一致），都完整之后才开始推测执行
+REQUIRED_PARAMS = {
+    "movie_basic_info": ("title",),
+    "movies_by_director": ("name",),
+    "movies_by_actor": ("name",),
+    "movies_by_genre": ("genre",),
+    "similar_movies": ("title",),
+    "other_movies_by_director_of_movie": ("title",),
+    "co_actors": ("name",),
+}
+
+_INCOMPLETE = object()
+_WHITESPACE = " \t\r\n"
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_NUMBER_PREFIX = re.compile(r"-?(?:\d+(?:\.\d*)?(?:[eE][+-]?\d*)?)?")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+
+class _PartialParser:
+    """JSON 前缀的递归下降解析器。每个 _value 返回 (值, 是否完整)。"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def _skip_ws(self) -> None:
+        while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+            self.pos += 1
+
+    def _value(self) -> Tuple[Any, bool]:
+        self._skip_ws()
+        if self.pos >= len(self.text):
+            return _INCOMPLETE, False
+        ch = self.text[self.pos]
+        if ch == "{":
+            return self._object()
+        if ch == "[":
+            return self._array()
+        if ch == '"':
+            return self._string()
+        return self._scalar()
+
+    def _string(self) -> Tuple[Any, bool]:
+        try:
+            value, end = scanstring(self.text, self.pos + 1)
+        except ValueError:
+            # 字符串还没结束（或者结尾是半个转义序列）
+            self.pos = len(self.text)
+            return _INCOMPLETE, False
+        self.pos = end
+        return value, True
+
+    def _scalar(self) -> Tuple[Any, bool]:
+        text = self.text
+        for literal, value in _LITERALS.items():
+            if text.startswith(literal, self.pos):
+                self.pos += len(literal)
+                return value, True
+            if literal.startswith(text[self.pos:]):
+                self.pos = len(text)
+                return _INCOMPLETE, False
+        if _NUMBER_PREFIX.fullmatch(text, self.pos):
+            # 数字一直延续到末尾（"-"、"8."、"10" ……）：后面还可能有更多位，不算完整
+            self.pos = len(text)
+            return _INCOMPLETE, False
+        m = _NUMBER.match(text, self.pos)
+        if not m:
+            raise ValueError(f"非法的 JSON 字符：{text[self.pos]!r}")
+        self.pos = m.end()
+        number = m.group(0)
+        return (float(number) if any(c in number for c in ".eE") else int(number)), True
+
+    def _object(self) -> Tuple[Dict, bool]:
+        self.pos += 1
+        out: Dict = {}
+        while True:
+            self._skip_ws()
+            if self.pos >= len(self.text):
+                return out, False
+            ch = self.text[self.pos]
+            if ch == "}":
+                self.pos += 1
+                return out, True
+            if ch == ",":
+                self.pos += 1
+                continue
+            if ch != '"':
+                raise ValueError(f"对象的 key 必须是字符串：{ch!r}")
+            key, done = self._string()
+            if not done:
+                return out, False
+            self._skip_ws()
+            if self.pos >= len(self.text):
+                return out, False
+            if self.text[self.pos] != ":":
+                raise ValueError("对象的 key 后面缺少冒号")
+            self.pos += 1
+            value, done = self._value()
+            if done or isinstance(value, (dict, list)):
+                out[key] = value
+            if not done:
+                return out, False
+
+    def _array(self) -> Tuple[list, bool]:
+        self.pos += 1
+        out: list = []
+        while True:
+            self._skip_ws()
+            if self.pos >= len(self.text):
+                return out, False
+            ch = self.text[self.pos]
+            if ch == "]":
+                self.pos += 1
+                return out, True
+            if ch == ",":
+                self.pos += 1
+                continue
+            value, done = self._value()
+            if done or isinstance(value, (dict, list)):
+                out.append(value)
+            if not done:
+                return out, False
+
+
+def parse_partial_json(text: str) -> Tuple[Any, bool]:
+    """
+    解析一段 JSON 前缀，返回 (目前能确定的值, 整个值是否已经完整)。
+
+    不是合法 JSON 前缀（例如模型输出了 Markdown 代码块）时返回 (None, False)。
+    """
+    try:
+        value, done = _PartialParser(text)._value()
+    except ValueError:
+        return None, False
+    if value is _INCOMPLETE:
+        return None, False
+    return value, done
+
+
+class PlanStreamParser:
+    """
+    累积计划模型的流式输出，随时给出"推测计划"。
+
+    用法：
+        parser = PlanStreamParser()
+        for piece in stream:
+            if parser.feed(piece):          # task / 必填参数第一次完整，或者值变了
+                start(parser.speculative)    # 开始（或重新开始）推测执行
+        final_plan = json.loads(parser.text) # 流结束后以完整输出为准
+    """
+
+    def __init__(self):
+        self._parts = []
+        self.speculative: Optional[Dict] = None
+        # 最近一次推测时的 (task, 必填参数的值)，只有它变了才重新推测
+        self._key: Optional[Tuple] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, piece: str) -> bool:
+        """
+        追加一段输出，返回是否需要（重新）开始推测执行：
+        task 和必填参数第一次完整时，或者它们的值和上次推测时不同了。
+        只是多了可选参数时返回 False（推测计划保持不变，流结束后由 matches_plan 判断能否沿用）。
+        """
+        if not piece:
+            return False
+        self._parts.append(piece)
+        plan = self._current_plan()
+        if plan is None:
+            return False
+        task, params = plan["task"], plan["params"]
+        key = (task,) + tuple(params[name] for name in REQUIRED_PARAMS[task])
+        if key == self._key:
+            return False
+        self._key = key
+        self.speculative = plan
+        return True
+
+    def _current_plan(self) -> Optional[Dict]:
+        value, _ = parse_partial_json(self.text)
+        if not isinstance(value, dict):
+            return None
+        task = value.get("task")
+        params = value.get("params")
+        if task not in REQUIRED_PARAMS or not isinstance(params, dict):
+            return None
+        if any(params.get(key) is None for key in REQUIRED_PARAMS[task]):
+            return None
+        return {"task": task, "params": dict(params)}
+
+
+def matches_plan(speculative: Optional[Dict], plan: Any) -> bool:
+    """推测计划和最终计划的执行结果是否相同（execute_plan 只看 task 和 params）。"""
+    return (
+        speculative is not None
+        and isinstance(plan, dict)
+        and speculative == {"task": plan.get("task"), "params": plan.get("params")}
+    )
@@ -0,0 +1,382 @@
+# rule_planner.py
+# -*- coding: utf-8 -*-
+"""
+本地规则规划器：常见句式的问题不调用 PLAN_MODEL，直接在本地生成查询计划。
+
+为什么需要：
+- 大部分问题的句式很固定："《X》的导演是谁"、"<导演>拍过哪些电影"、"和《X》相似的电影"……
+  这些问题也要走一次 qwen3-max，白白多一次网络往返
+- 这里用图谱自己的片名 / 人名 / 类型名做实体识别，再用关键词规则判断意图，
+  输出与 execute_plan 相同的 {"task": ..., "params": {...}}
+- 只有在很有把握时才给出计划：实体唯一、意图唯一、问题里没有规则解释不了的条件
+  （数字、否定、比较、多个人物……），否则返回 None，由调用方交给大模型
+
+实体识别：
+- 名字和问题都做 NFKC + casefold 归一化
+- 《》里的内容直接当片名（必须是图里有的片名）
+- 其余位置在词边界上查字典，取最左最长匹配（问题很短，逐个起点查哈希表
+  比在纯 Python 里为几万个名字建 Aho-Corasick 自动机更省内存，结果相同）
+- 不在《》里的名字至少要 MIN_BARE_LENGTH 个字符（片名里有 "It"、"Up"、"Her" 这类常用词）
+- 类型另外支持中文别名（"动作片" -> Action）
+- 实体字典按图版本缓存，reload_graph 之后自动重建
+"""
+
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+import kg_api
+
+MIN_BARE_LENGTH = 4
+
+# 未说明数量、但问的是"推荐几部 / 有哪些类似的"时，与 PLAN_FEWSHOT 一致默认给 10 个
+DEFAULT_LIMIT = 10
+
+GENRE_ALIASES = {
+    "动作": "Action",
+    "冒险": "Adventure",
+    "动画": "Animation",
+    "传记": "Biography",
+    "喜剧": "Comedy",
+    "犯罪": "Crime",
+    "纪录": "Documentary",
+    "剧情": "Drama",
+    "家庭": "Family",
+    "奇幻": "Fantasy",
+    "历史": "History",
+    "恐怖": "Horror",
+    "歌舞": "Musical",
+    "音乐剧": "Musical",
+    "悬疑": "Mystery",
+    "真人秀": "Reality-TV",
+    "爱情": "Romance",
+    "科幻": "Sci-Fi",
+    "惊悚": "Thriller",
+}
+
+# 出现这些词时问题往往带有规则处理不了的逻辑，直接交给大模型
+COMPLEX_MARKERS = (
+    "不是", "没有", "没演", "没拍", "除了", "以外", "之外", "比较", "对比", "哪个", "哪部更",
+    "还是", "并且", "而且", "同时", "低于", "小于", "以下", "最差", "最低",
+)
+
+_CJK = re.compile(r"[぀-ヿ㐀-鿿가-힯]")
+_BRACKET_TITLE = re.compile(r"《([^《》]+)》")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_CN_DIGITS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+# 年份 / 数量 / 评分条件（在归一化后的问题上匹配）
+_YEAR_RANGE = re.compile(r"((?:19|20)\d\d)\s*年?\s*(?:到|至|-|~)\s*((?:19|20)\d\d)\s*年?")
+_YEAR_DECADE = re.compile(r"((?:19|20)\d0)\s*年代")
+_YEAR_AFTER = re.compile(r"((?:19|20)\d\d)\s*年?\s*(?:之后|以后|后|以来|起|开始)")
+_YEAR_BEFORE = re.compile(r"((?:19|20)\d\d)\s*年?\s*(?:之前|以前|前)")
+_YEAR_EXACT = re.compile(r"((?:19|20)\d\d)\s*年")
+# 中文数字只在"给我三部"这类说法里算数量（"同一个导演"里的"一个"不是）
+_LIMIT = re.compile(
+    r"(?:最多|前|给我|列出|列举|推荐|来|找)?\s*(\d+)\s*(?:部|个|位|名|条)"
+    r"|(?:最多|前|给我|列出|列举|推荐|来|找)\s*([一二两三四五六七八九十]+)\s*(?:部|个|位|名|条)"
+)
+_RATING = re.compile(
+    r"(?:imdb\s*)?(?:评分|分数|得分|rating)\s*(?:在|要)?\s*(?:大于|高于|超过|不低于|>=|>|≥)\s*(\d+(?:\.\d+)?)\s*分?"
+    r"|(\d+(?:\.\d+)?)\s*分\s*(?:以上|及以上)"
+)
+_VAGUE_COUNT = re.compile(r"几(?:部|个|位|名)")
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+
+def _is_word_char(ch: str) -> bool:
+    """拉丁字母 / 数字算词内字符；中文、标点、空白都是词边界。"""
+    return ch.isalnum() and not _CJK.match(ch)
+
+
+def _chinese_number(text: str) -> Optional[int]:
+    if text.isdigit():
+        return int(text)
+    if text == "十":
+        return 10
+    if text.startswith("十") and len(text) == 2:
+        return 10 + _CN_DIGITS.get(text[1], 0)
+    if len(text) == 1:
+        return _CN_DIGITS.get(text)
+    if len(text) == 2 and text[1] == "十":
+        return _CN_DIGITS.get(text[0], 0) * 10
+    if len(text) == 3 and text[1] == "十":
+        return _CN_DIGITS.get(text[0], 0) * 10 + _CN_DIGITS.get(text[2], 0)
+    return None
+
+
+# ----------------------------------------------------------------------
+# 1. 实体字典
+# ----------------------------------------------------------------------
+
+class EntityDictionary:
+    """
+    归一化名字 -> {类别: {原始名字, ...}}，类别是 title / director / actor / genre。
+
+    同一个归一化名字可能对应多个原始名字（只有大小写不同的片名）或多个类别
+    （同名的电影和人物），由规划器按意图判断是否有歧义。
+    """
+
+    def __init__(self, names: Dict[str, List[str]]):
+        self.version = names.get("version")
+        self.entries: Dict[str, Dict[str, Set[str]]] = {}
+        for kind, key in (("title", "titles"), ("director", "directors"),
+                          ("actor", "actors"), ("genre", "genres")):
+            for name in names.get(key, ()):
+                norm = normalize_text(name).strip()
+                if norm:
+                    self.entries.setdefault(norm, {}).setdefault(kind, set()).add(name)
+        self.max_length = max((len(k) for k in self.entries), default=0)
+        genres = {g for g in names.get("genres", ())}
+        # 只保留图里真实存在的类型的中文别名
+        self.genre_aliases = {alias: g for alias, g in GENRE_ALIASES.items() if g in genres}
+
+    def lookup(self, text: str) -> Dict[str, Set[str]]:
+        return self.entries.get(normalize_text(text).strip(), {})
+
+    def find(self, text: str) -> List[Tuple[int, int, Dict[str, Set[str]]]]:
+        """
+        在（已归一化的）text 里找出全部实体，返回 [(start, end, {类别: 名字集合})]。
+
+        只在词边界上开始 / 结束；每个起点取最长的匹配，匹配之间不重叠（最左最长）。
+        """
+        n = len(text)
+        spans = []
+        i = 0
+        while i < n:
+            if text[i].isspace() or (i > 0 and _is_word_char(text[i]) and _is_word_char(text[i - 1])):
+                i += 1
+                continue
+            found = None
+            for end in range(min(n, i + self.max_length), i, -1):
+                if end < n and _is_word_char(text[end - 1]) and _is_word_char(text[end]):
+                    continue
+                entry = self.entries.get(text[i:end])
+                if entry is not None and end - i >= MIN_BARE_LENGTH:
+                    found = (i, end, entry)
+                    break
+            if found is None:
+                i += 1
+                continue
+            spans.append(found)
+            i = found[1]
+        return spans
+
+
+_DICT_LOCK = threading.Lock()
+_DICTIONARY: Optional[EntityDictionary] = None
+
+
+def get_dictionary() -> EntityDictionary:
+    """当前图版本的实体字典；图版本变化（热更新）后重建。"""
+    global _DICTIONARY
+    version = kg_api.get_graph_version()
+    dictionary = _DICTIONARY
+    if dictionary is None or dictionary.version != version:
+        with _DICT_LOCK:
+            if _DICTIONARY is None or _DICTIONARY.version != version:
+                _DICTIONARY = EntityDictionary(kg_api.get_entity_names())
+            dictionary = _DICTIONARY
+    return dictionary
+
+
+# ----------------------------------------------------------------------
+# 2. 条件抽取：年份 / 数量 / 评分
+# ----------------------------------------------------------------------
+
+def _extract_conditions(text: str) -> Tuple[Dict, str]:
+    """
+    从问题里抽出 year_min / year_max / limit / rating_min，
+    返回 (条件, 去掉这些片段之后的问题)。剩下的问题里如果还有数字，说明有解释不了的条件。
+    """
+    cond: Dict = {}
+
+    def take(pattern, handle):
+        nonlocal text
+        m = pattern.search(text)
+        if m:
+            handle(m)
+            text = text[:m.start()] + " " + text[m.end():]
+
+    take(_YEAR_RANGE, lambda m: cond.update(year_min=int(m.group(1)), year_max=int(m.group(2))))
+    take(_YEAR_DECADE, lambda m: cond.update(year_min=int(m.group(1)), year_max=int(m.group(1)) + 9))
+    take(_YEAR_AFTER, lambda m: cond.setdefault("year_min", int(m.group(1))))
+    take(_YEAR_BEFORE, lambda m: cond.setdefault("year_max", int(m.group(1))))
+    if "year_min" not in cond and "year_max" not in cond:
+        take(_YEAR_EXACT, lambda m: cond.update(year_min=int(m.group(1)), year_max=int(m.group(1))))
+    take(_RATING, lambda m: cond.update(rating_min=float(m.group(1) or m.group(2))))
+
+    m = _LIMIT.search(text)
+    if m:
+        value = _chinese_number(m.group(1) or m.group(2))
+        if value:
+            cond["limit"] = value
+            text = text[:m.start()] + " " + text[m.end():]
+    elif _VAGUE_COUNT.search(text):
+        cond["limit"] = DEFAULT_LIMIT
+    return cond, text
+
+
+# ----------------------------------------------------------------------
+# 3. 意图规则
+# ----------------------------------------------------------------------
+
+def _has_any(text: str, words) -> bool:
+    return any(w in text for w in words)
+
+
+def _title_intent(text: str) -> Optional[str]:
+    """问题里只有一部电影时的意图。"""
+    other = "导演" in text and _has_any(text, ("其他", "其它", "别的", "还拍", "还导", "同一", "同个"))
+    similar = _has_any(text, ("相似", "类似", "差不多", "同类", "类型相近", "风格相近", "像"))
+    if other and similar:
+        return None
+    if other:
+        return "other_movies_by_director_of_movie"
+    if similar:
+        return "similar_movies"
+    if _has_any(text, ("导演", "演员", "主演", "谁演", "谁拍", "评分", "分数", "分级", "类型",
+                       "哪年", "年份", "上映", "时长", "多长", "信息", "介绍", "讲", "怎么样", "是什么")):
+        return "movie_basic_info"
+    return None
+
+
+def _person_intent(text: str, is_director: bool, is_actor: bool) -> Optional[str]:
+    """问题里只有一个人物时的意图。"""
+    if _has_any(text, ("合作", "搭档", "同台", "一起演", "共同出演", "合演")):
+        # "和 X 合作过的导演" 不是合作演员
+        if "导演" in text or not is_actor:
+            return None
+        return "co_actors"
+    # "导演过" 里也有 "演过"，先去掉 "导演" 再判断是不是问参演
+    acted = _has_any(text.replace("导演", " "), ("演过", "出演", "参演", "主演", "演了", "演的"))
+    directed = _has_any(text, ("导演过", "导过", "执导", "导演了", "导演的", "导的"))
+    if acted and directed:
+        return None
+    # "X 演过的电影的导演"、"X 导演的电影的主演" 问的是另一批人
+    if acted and "导演" in text or directed and _has_any(text, ("演员", "主演")):
+        return None
+    if acted:
+        return "movies_by_actor" if is_actor else None
+    if directed:
+        return "movies_by_director" if is_director else None
+    if _has_any(text, ("拍过", "拍了", "作品", "哪些电影", "什么电影", "电影有哪些")):
+        if is_director:
+            return "movies_by_director"
+        if is_actor:
+            return "movies_by_actor"
+    return None
+
+
+# ----------------------------------------------------------------------
+# 4. 对外接口
+# ----------------------------------------------------------------------
+
+def plan_question(question: str) -> Optional[Dict]:
+    """
+    尝试在本地为问题生成查询计划。
+
+    有把握时返回 {"task": ..., "params": {...}}（与 execute_plan 的输入相同），
+    否则返回 None，调用方应继续调用大模型。
+    """
+    text = normalize_text(question).strip()
+    if not text or _has_any(text, COMPLEX_MARKERS):
+        return None
+    dictionary = get_dictionary()
+
+    # 《》里的片名：必须都在图里（不在图里的可能是中文译名，交给大模型）
+    titles: Set[str] = set()
+    for m in _BRACKET_TITLE.finditer(text):
+        names = dictionary.lookup(m.group(1)).get("title")
+        if not names or len(names) > 1:
+            return None
+        titles.update(names)
+    rest = _BRACKET_TITLE.sub(" ", text)
+
+    persons: Set[str] = set()
+    genres: Set[str] = set()
+    director_names: Set[str] = set()
+    actor_names: Set[str] = set()
+    for start, end, entry in dictionary.find(rest):
+        kinds = set(entry)
+        if any(len(names) > 1 for names in entry.values()):
+            return None
+        if kinds & {"director", "actor"} and kinds & {"title", "genre"}:
+            # 同名的电影和人物：不猜
+            return None
+        if "title" in kinds:
+            titles.update(entry["title"])
+        elif "genre" in kinds:
+            genres.update(entry["genre"])
+        else:
+            persons.update(*entry.values())
+            director_names.update(entry.get("director", ()))
+            actor_names.update(entry.get("actor", ()))
+        rest = rest[:start] + " " * (end - start) + rest[end:]
+
+    for alias, genre in dictionary.genre_aliases.items():
+        if alias in rest:
+            genres.add(genre)
+
+    cond, leftover = _extract_conditions(rest)
+    if _NUMBER.search(leftover):
+        return None
+
+    if len(titles) == 1 and not persons and not genres:
+        (title,) = titles
+        if set(cond) - {"limit"}:
+            return None
+        task = _title_intent(rest)
+        if task is None:
+            return None
+        params: Dict = {"title": title}
+        if task == "similar_movies":
+            params["limit"] = cond.get("limit", DEFAULT_LIMIT)
+        elif cond:
+            return None
+        return {"task": task, "params": params}
+
+    if len(persons) == 1 and not titles and not genres:
+        (name,) = persons
+        task = _person_intent(rest, name in director_names, name in actor_names)
+        if task is None or "rating_min" in cond:
+            return None
+        params = {"name": name}
+        if task == "co_actors":
+            if set(cond) - {"limit"}:
+                return None
+            params["limit"] = cond.get("limit", DEFAULT_LIMIT)
+        else:
+            params.update(cond)
+        return {"task": task, "params": params}
+
+    if len(genres) == 1 and not titles and not persons:
+        if not _has_any(rest, ("片", "电影", "影片", "推荐", "作品")):
+            return None
+        if "year_min" in cond or "year_max" in cond:
+            return None
+        (genre,) = genres
+        params = {"genre": genre}
+        params.update(cond)
+        return {"task": "movies_by_genre", "params": params}
+
+    return None
+
+
+# ----------------------------------------------------------------------
+# 5. 简单自测：PLAN_FEWSHOT 里的问题应当得到与示例相同的计划
+# ----------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import json
+
+    from prompts import PLAN_FEWSHOT
+
+    for ex in PLAN_FEWSHOT:
+        plan = plan_question(ex["user"])
+        mark = "OK " if plan == ex["assistant"] else ("LLM" if plan is None else "DIFF")
+        print(f"[{mark}] {ex['user']}\n      -> {json.dumps(plan, ensure_ascii=False)}")
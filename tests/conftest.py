@@ -0,0 +1,43 @@
+# tests/conftest.py
+# -*- coding: utf-8 -*-
+"""
+回归测试的公共工具：在临时目录里复制一份 data/，用 buildKG.main 按给定参数构图。
+
+buildKG.py 按相对路径读 data/*.csv、写 imdb_kg.*，所以每次构建都先切换到各自的工作目录。
+"""
+
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import buildKG  # noqa: E402
+
+
+def make_workdir(path: Path) -> Path:
+    """建一个带 data/ 副本的工作目录。"""
+    path.mkdir(parents=True, exist_ok=True)
+    shutil.copytree(ROOT / "data", path / "data")
+    return path
+
+
+def run_build(workdir: Path, *argv: str) -> Path:
+    """在 workdir 里执行一次 buildKG.py <argv>，返回 imdb_kg.graphml 的路径。"""
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        buildKG.main(list(argv))
+    finally:
+        os.chdir(cwd)
+    return workdir / "imdb_kg.graphml"
+
+
+@pytest.fixture(scope="session")
+def default_graphml(tmp_path_factory) -> Path:
+    """默认模式（整表 + 向量化构图）的构建结果，其他模式都和它比较。"""
+    return run_build(make_workdir(tmp_path_factory.mktemp("default")))
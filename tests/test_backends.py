@@ -0,0 +1,176 @@
+# tests/test_backends.py
+# -*- coding: utf-8 -*-
+"""
+同一组查询在各个图后端（networkx / CSR / Parquet / 分片）上的结果必须完全相同。
+"""
+
+import pytest
+
+import networkx as nx
+
+import kg_api
+from conftest import make_workdir, run_build
+from kg_csr import CSRGraph
+from kg_shards import load_shard_manifest, shard_entities, shards_in, shards_path_for
+
+TITLES = ["The Godfather", "Inception", "Toy Story", "Titanic", "Heat", "No Such Movie"]
+PEOPLE = ["Tom Hanks", "Christopher Nolan", "Steven Spielberg", "Al Pacino", "Nobody Here"]
+GENRES = ["Drama", "Comedy", "Sci-Fi"]
+CERTIFICATES = ["PG-13", "R", "PG"]
+KEYWORDS = ["the", "Star", "ar", "love", "man", "xyzq"]
+
+
+def run_queries() -> list:
+    """固定的一组查询，覆盖 kg_api 的全部公开查询函数（包括批量版本）。"""
+    out = []
+    for t in TITLES:
+        out.append(kg_api.find_movie_node(t))
+        out.append(kg_api.find_movie_nodes_by_title(t))
+        out.append(kg_api.get_movie_basic_info(t))
+        out.append(kg_api.get_similar_movies_by_neighbors(t, top_k=7))
+        out.append(kg_api.get_other_movies_by_director_of_movie(t))
+    for n in PEOPLE:
+        out.append(kg_api.find_person_node(n))
+        out.append(kg_api.get_movies_by_director(n))
+        out.append(kg_api.get_movies_by_actor(n, sort_by="imdb_rating", descending=True, limit=5))
+        out.append(kg_api.get_movies_by_actor(n, year_min=1990, year_max=2010, sort_by="metascore"))
+        out.append(kg_api.get_co_actors(n, top_k=10))
+        out.append(kg_api.get_co_actors(n))
+    for g in GENRES:
+        out.append(kg_api.get_movies_by_genre(g))
+        out.append(kg_api.get_movies_by_genre(g, rating_min=8.0, sort_by_rating=True, limit=20))
+    for c in CERTIFICATES:
+        out.append(kg_api.get_movies_by_certificate(c))
+        out.append(kg_api.get_movies_by_certificate(c, limit=15))
+    for kw in KEYWORDS:
+        out.append(kg_api.search_movies_by_keyword(kw))
+        out.append(kg_api.search_movies_by_keyword(kw, case_sensitive=True, limit=5))
+    out.append(kg_api.get_movie_basic_info_many(TITLES + TITLES[:2]))
+    out.append(kg_api.get_movies_by_director_many(PEOPLE, limit=3))
+    out.append(kg_api.get_movies_by_actor_many(PEOPLE, year_min=1990))
+    out.append(kg_api.get_similar_movies_by_neighbors_many(TITLES, top_k=5))
+    out.append(kg_api.get_co_actors_many(PEOPLE, top_k=3))
+    out.append(kg_api.get_other_movies_by_director_of_movie_many(TITLES))
+    names = kg_api.get_entity_names()
+    names.pop("version")
+    out.append(names)
+    return out
+
+
+@pytest.fixture(scope="session")
+def stores(tmp_path_factory):
+    """一个工作目录里同时构建整图（带 CSR / Parquet）和 3 个分片（带 CSR）。"""
+    work = make_workdir(tmp_path_factory.mktemp("backends"))
+    argv = ["--csr"]
+    try:
+        import pyarrow  # noqa: F401
+        argv.append("--parquet")
+    except ImportError:
+        pass
+    run_build(work, "--shards", "3", *argv)
+    return run_build(work, *argv)
+
+
+def _use_backend(monkeypatch, graphml, backend: str, sharded: bool):
+    # 分片子进程 import kg_api 时从环境变量读取后端，所以环境变量和模块变量都要设置
+    monkeypatch.setenv("KG_GRAPH_BACKEND", backend)
+    monkeypatch.setenv("KG_SHARDED", "1" if sharded else "0")
+    monkeypatch.setattr(kg_api, "GRAPH_BACKEND", backend)
+    monkeypatch.setattr(kg_api, "GRAPH_SHARDED", sharded)
+    monkeypatch.setattr(kg_api, "_STATE", None)
+    kg_api.cache_clear()
+    kg_api.reload_graph(str(graphml))
+    return kg_api._current_state()
+
+
+@pytest.fixture(scope="session")
+def expected(stores):
+    with pytest.MonkeyPatch.context() as mp:
+        _use_backend(mp, stores, "networkx", sharded=False)
+        return run_queries()
+
+
+@pytest.mark.parametrize(
+    "backend, sharded",
+    [("csr", False), ("parquet", False), ("networkx", True), ("csr", True)],
+    ids=["csr", "parquet", "sharded", "sharded-csr"],
+)
+def test_backend_matches_networkx(monkeypatch, stores, expected, backend, sharded):
+    if backend == "parquet":
+        pytest.importorskip("pyarrow")
+        from kg_tables import load_tables
+
+        # 确认走的是 Parquet 表，而不是悄悄回退到快照
+        assert load_tables(str(stores)) is not None
+
+    st = _use_backend(monkeypatch, stores, backend, sharded)
+    try:
+        if sharded:
+            assert st.num_shards == 3
+        else:
+            assert isinstance(st.graph, CSRGraph) == (backend == "csr")
+        assert run_queries() == expected
+    finally:
+        if sharded:
+            st.close()
+        kg_api.cache_clear()
+
+
+def test_shard_entity_dictionary(stores):
+    """entities.json 和各分片图里实际的实体一致。"""
+    manifest = load_shard_manifest(shards_path_for(str(stores)))
+    expected = {relation: {} for relation in manifest["entities"]}
+    for shard, path in enumerate(manifest["paths"]):
+        for relation, names in shard_entities(nx.read_graphml(path)).items():
+            for name in names:
+                expected[relation][name] = expected[relation].get(name, 0) | (1 << shard)
+    assert manifest["entities"] == expected
+
+
+def test_sharded_queries_only_ask_shards_with_the_entity(monkeypatch, stores):
+    st = _use_backend(monkeypatch, stores, "networkx", sharded=True)
+    asked = []
+    gather = st.gather
+
+    def recording_gather(func, *args, shards=None):
+        asked.append(list(range(st.num_shards)) if shards is None else list(shards))
+        return gather(func, *args, shards=shards)
+
+    monkeypatch.setattr(st, "gather", recording_gather)
+    try:
+        assert kg_api.get_co_actors("Nobody Here") == []
+        assert kg_api.find_person_node("Nobody Here") is None
+        assert asked == [[]]
+
+        # 只导过一个分片里的电影的导演：只问这一个分片
+        director = next(
+            n for n, mask in st.entities["DIRECTED"].items() if len(shards_in(mask)) == 1
+        )
+        asked.clear()
+        assert kg_api.get_movies_by_director(director)
+        kg_api.get_movies_by_genre("Sci-Fi")
+        assert asked == [
+            shards_in(st.entities["DIRECTED"][director]),
+            shards_in(st.entities["HAS_GENRE"]["Sci-Fi"]),
+        ]
+        assert len(asked[0]) == 1
+    finally:
+        st.close()
+        kg_api.cache_clear()
+
+
+def test_parquet_backend_without_pyarrow_falls_back(monkeypatch, stores, expected, caplog):
+    """KG_GRAPH_BACKEND=parquet 但没有安装 pyarrow：记 warning，回退到快照 / GraphML。"""
+    pytest.importorskip("pyarrow")  # 需要先用 pyarrow 写出 imdb_kg.tables/
+    import kg_tables
+
+    monkeypatch.setattr(kg_tables, "pa", None)
+    monkeypatch.setattr(kg_tables, "pq", None)
+    with caplog.at_level("WARNING", logger="kg_api"):
+        st = _use_backend(monkeypatch, stores, "parquet", sharded=False)
+    try:
+        assert isinstance(st.graph, nx.MultiDiGraph)
+        assert any("pyarrow" in r.getMessage() for r in caplog.records)
+        assert run_queries() == expected
+    finally:
+        kg_api.cache_clear()
@@ -0,0 +1,162 @@
+# tests/test_build_modes.py
+# -*- coding: utf-8 -*-
+"""
+各种构图模式（--stream / --workers / --incremental）在 data/ 上的产出必须与默认模式相同：
+--stream / --workers 逐字节相同；--incremental 的节点 / 边及其顺序完全相同，
+均值按文件合并和 / 个数，允许差在最后一位（见 buildKG.MovieSegment）。
+"""
+
+import re
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+import buildKG
+from conftest import make_workdir, run_build
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ("--stream",),
+        ("--stream", "--chunksize", "500"),
+        ("--workers", "2"),
+    ],
+    ids=["stream", "stream-small-chunks", "workers"],
+)
+def test_build_mode_matches_default(tmp_path, default_graphml, argv):
+    out = run_build(make_workdir(tmp_path), *argv)
+    assert out.read_bytes() == default_graphml.read_bytes()
+
+
+def _graph_items(graphml):
+    G = nx.read_graphml(graphml)
+    return list(G.nodes(data=True)), list(G.edges(keys=True, data=True))
+
+
+def assert_same_graph(actual, expected):
+    """节点 / 边（包括顺序、边的 key 和属性）完全相同，节点的数值属性允许差在最后一位。"""
+    nodes, edges = _graph_items(actual)
+    expected_nodes, expected_edges = _graph_items(expected)
+    assert [n for n, _ in nodes] == [n for n, _ in expected_nodes]
+    assert edges == expected_edges
+    for (node, attrs), (_, expected_attrs) in zip(nodes, expected_nodes):
+        assert attrs == pytest.approx(expected_attrs, rel=1e-12, abs=0), node
+
+
+def test_incremental_fresh_matches_default(tmp_path, default_graphml):
+    assert_same_graph(run_build(make_workdir(tmp_path), "--incremental"), default_graphml)
+
+
+def _edit_csv(path, edit):
+    df = pd.read_csv(path)
+    edit(df).to_csv(path, index=False)
+
+
+def _change_rows(df):
+    """改评分、改演员表、删两行、加一部新电影。"""
+    df.loc[3, "IMDb Rating"] = 1.1
+    df.loc[5, "Star Cast"] = "Tom HanksNewcomer PersonZed"
+    df = df.drop(index=[7, 8])
+    new = df.iloc[[0]].copy()
+    new["Title"] = "Brand New Movie"
+    new["Director"] = "Fresh Director"
+    return pd.concat([df, new])
+
+
+def _truncate(df):
+    """只留前一半的行：不少实体第一次出现的电影随之改变。"""
+    return df.iloc[: len(df) // 2]
+
+
+def _shuffle(df):
+    return df.sample(frac=1, random_state=1).iloc[:-40]
+
+
+def _blank_year(df):
+    """一行的 Year 留空：这个文件的 Year 列随之变成 float。"""
+    df.loc[10, "Year"] = None
+    return df
+
+
+def test_incremental_matches_full_rebuild(tmp_path, capsys):
+    work = make_workdir(tmp_path / "incremental")
+    run_build(work, "--incremental")
+
+    # 没有变化：不重新聚合任何电影
+    capsys.readouterr()
+    before = (work / "imdb_kg.graphml").read_bytes()
+    run_build(work, "--incremental")
+    assert "中 0 部需要重新聚合" in capsys.readouterr().out
+    assert (work / "imdb_kg.graphml").read_bytes() == before
+
+    edits = [
+        ("IMDb_Dataset_2.csv", _change_rows),
+        ("IMDb_Dataset_3.csv", _truncate),
+        ("IMDb_Dataset.csv", _shuffle),
+        # Year 列变成 float：全部电影 id 换写法
+        ("IMDb_Dataset_3.csv", _blank_year),
+    ]
+    for step, (name, edit) in enumerate(edits):
+        _edit_csv(work / "data" / name, edit)
+        incremental = run_build(work, "--incremental")
+
+        # 同样的数据从头全量构建一次作为对照
+        full = make_workdir(tmp_path / f"full-{step}")
+        for csv in (work / "data").iterdir():
+            (full / "data" / csv.name).write_bytes(csv.read_bytes())
+        assert_same_graph(incremental, run_build(full))
+
+
+def _movie_ids(graphml):
+    G = nx.read_graphml(graphml)
+    return [n for n, t in G.nodes(data="type") if t == "movie"]
+
+
+def test_missing_year(tmp_path):
+    """
+    Year 缺失的行和 groupby 一样丢弃；其余电影的 id 与基线一致，年份带 .0。
+    分块读入时只有一部分块的 Year 是 float，各模式的 id 也必须统一。
+    """
+    modes = [
+        ("default", ()),
+        ("workers", ("--workers", "2")),
+        ("stream", ("--stream",)),
+        ("stream-small-chunks", ("--stream", "--chunksize", "500")),
+        ("incremental", ("--incremental",)),
+        ("shards", ("--shards", "3", "--chunksize", "500")),
+    ]
+    outputs = {}
+    for name, argv in modes:
+        work = make_workdir(tmp_path / name)
+        _edit_csv(work / "data" / "IMDb_Dataset_2.csv", _blank_year)
+        outputs[name] = run_build(work, *argv)
+
+    default = outputs.pop("default")
+    shards = sorted((outputs.pop("shards").parent / "imdb_kg.shards").glob("shard_*.graphml"))
+    assert_same_graph(outputs.pop("incremental"), default)
+    for name, out in outputs.items():
+        assert out.read_bytes() == default.read_bytes(), name
+
+    movies = _movie_ids(default)
+    assert movies and all(re.search(r" \(\d{4}\.0\)$", n) for n in movies)
+    assert sorted(n for s in shards for n in _movie_ids(s)) == sorted(movies)
+
+
+def test_group_means_sum_in_row_order():
+    """_group_means 按行的顺序累加（流式的 _RunningMean 依赖这一点），包括超过 128 行的大组。"""
+    rng = np.random.default_rng(0)
+    sizes = [1, 3, 8, 9, 127, 128, 129, 300]
+    codes = np.repeat(np.arange(len(sizes)), sizes)
+    values = rng.random(len(codes)) * 10
+    values[rng.random(len(codes)) < 0.1] = np.nan
+
+    means = buildKG._group_means(codes, values, len(sizes) + 1)
+    for g in range(len(sizes)):
+        acc = buildKG._RunningMean()
+        for v in values[codes == g]:
+            acc.add(float(v))
+        assert means[g] == acc.mean()
+    assert np.isnan(means[-1])
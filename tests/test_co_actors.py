@@ -0,0 +1,100 @@
+# tests/test_co_actors.py
+# -*- coding: utf-8 -*-
+"""
+合作演员索引的增量更新（CoActorIndex.with_movies / patched）必须和在新图上从头构建的结果相同，
+并且不改动旧索引；kg_api 热加载 --incremental 的产出时走增量更新。
+"""
+
+import pandas as pd
+import pytest
+
+import kg_api
+from conftest import make_workdir, run_build
+from kg_index import CoActorIndex, _movie_cast
+
+A, B, C, D = (("person::" + n, n) for n in ("Ann", "Bob", "Cid", "Dee"))
+
+
+def _ranked(index, actors):
+    return {a: index.top(a) for a, _ in actors}
+
+
+def test_with_movies_matches_from_scratch():
+    base = CoActorIndex()
+    for cast in ([A, B, C], [A, B]):
+        base._add_cast(cast)
+    base._ranked = {a: base._rank(a) for a in base._counts}
+    before = _ranked(base, [A, B, C, D])
+
+    # 第二部电影的演员表 [A, B] 改成 [A, D]
+    patched = base.with_movies([[A, D]], removed=[[A, B]])
+
+    expected = CoActorIndex()
+    for cast in ([A, B, C], [A, D]):
+        expected._add_cast(cast)
+    expected._ranked = {a: expected._rank(a) for a in expected._counts}
+    assert _ranked(patched, [A, B, C, D]) == _ranked(expected, [A, B, C, D])
+    assert patched.top("person::Ann") == [("Bob", 1), ("Cid", 1), ("Dee", 1)]
+    # 旧索引不变
+    assert _ranked(base, [A, B, C, D]) == before
+
+    # 删掉全部电影之后谁都没有合作演员
+    empty = patched.with_movies([], removed=[[A, B, C], [A, D]])
+    assert all(r == [] for r in _ranked(empty, [A, B, C, D]).values())
+
+
+def test_reload_after_incremental_build_patches_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(kg_api, "GRAPH_BACKEND", "networkx")
+    monkeypatch.setattr(kg_api, "GRAPH_SHARDED", False)
+    monkeypatch.setattr(kg_api, "_STATE", None)
+    work = make_workdir(tmp_path)
+    graphml = str(run_build(work, "--incremental"))
+    kg_api.reload_graph(graphml)
+    old = kg_api._current_state()
+
+    csv = work / "data" / "IMDb_Dataset_2.csv"
+    df = pd.read_csv(csv)
+    df.loc[5, "Star Cast"] = "Tom HanksNewcomer PersonZed"
+    df.drop(index=[7]).to_csv(csv, index=False)
+    run_build(work, "--incremental")
+
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("co-actor index rebuilt from scratch")
+
+    with monkeypatch.context() as mp:
+        mp.setattr(CoActorIndex, "from_graph", classmethod(no_rebuild))
+        kg_api.reload_graph(graphml)
+
+    new = kg_api._current_state()
+    expected = CoActorIndex.from_graph(new.graph, new.movie_ids)
+    actors = {a for m in new.movie_ids for a, _ in _movie_cast(new.graph, m)}
+    actors |= {a for m in old.movie_ids for a, _ in _movie_cast(old.graph, m)}
+    assert {a: new.co_actors.top(a) for a in actors} == {a: expected.top(a) for a in actors}
+    assert new.co_actors.top("person::Newcomer Person")
+    kg_api.cache_clear()
+
+
+def test_full_build_discards_delta(tmp_path, monkeypatch):
+    """非增量构建之后旁边的变更记录不再对应当前的图，热加载时从头构建索引。"""
+    monkeypatch.setattr(kg_api, "GRAPH_BACKEND", "networkx")
+    monkeypatch.setattr(kg_api, "GRAPH_SHARDED", False)
+    monkeypatch.setattr(kg_api, "_STATE", None)
+    work = make_workdir(tmp_path)
+    graphml = str(run_build(work, "--incremental"))
+    csv = work / "data" / "IMDb_Dataset_2.csv"
+    pd.read_csv(csv).drop(index=[7]).to_csv(csv, index=False)
+    run_build(work, "--incremental")
+    kg_api.reload_graph(graphml)
+    run_build(work)
+
+    calls = []
+    from_graph = CoActorIndex.from_graph
+
+    def counting(cls, *args):
+        calls.append(args)
+        return from_graph(*args)
+
+    monkeypatch.setattr(CoActorIndex, "from_graph", classmethod(counting))
+    kg_api.reload_graph(graphml)
+    assert len(calls) == 1
+    kg_api.cache_clear()
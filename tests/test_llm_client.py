@@ -0,0 +1,119 @@
+# tests/test_llm_client.py
+# -*- coding: utf-8 -*-
+"""
+llm_client 的连接配置：环境变量 -> 连接池 / 超时 / HTTP/2，缺少 API Key 时报错，客户端进程内共享。
+不发任何网络请求。
+"""
+
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+import llm_client
+
+ENV = (
+    "DASHSCOPE_API_KEY", "LLM_BASE_URL", "LLM_MAX_CONNECTIONS", "LLM_MAX_KEEPALIVE",
+    "LLM_KEEPALIVE_EXPIRY", "LLM_CONNECT_TIMEOUT", "LLM_READ_TIMEOUT", "LLM_WRITE_TIMEOUT",
+    "LLM_POOL_TIMEOUT", "LLM_MAX_RETRIES", "LLM_HTTP2",
+)
+
+
+@pytest.fixture
+def reload_client(monkeypatch):
+    """按给定的环境变量重新 import llm_client；测试结束后按原来的环境恢复。"""
+
+    def reload(**env):
+        for name in ENV:
+            monkeypatch.delenv(name, raising=False)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return importlib.reload(llm_client)
+
+    yield reload
+    monkeypatch.undo()
+    importlib.reload(llm_client)
+
+
+def test_defaults(reload_client):
+    client = reload_client(DASHSCOPE_API_KEY="sk-test")
+    opts = client._http_options()
+    assert client.BASE_URL == "https://dashscope.aliyuncs.com/compatible-mode/v1"
+    assert opts["limits"].max_connections == 100
+    assert opts["limits"].max_keepalive_connections == 20
+    assert opts["limits"].keepalive_expiry == 60.0
+    assert (opts["timeout"].connect, opts["timeout"].read) == (5.0, 60.0)
+    assert (opts["timeout"].write, opts["timeout"].pool) == (10.0, 10.0)
+    assert opts["http2"] is False
+    assert client.LLM_MAX_RETRIES == 2
+
+
+def test_env_overrides(reload_client):
+    client = reload_client(
+        DASHSCOPE_API_KEY="sk-test",
+        LLM_BASE_URL="http://localhost:9000/v1",
+        LLM_MAX_CONNECTIONS="8",
+        LLM_MAX_KEEPALIVE="4",
+        LLM_KEEPALIVE_EXPIRY="1.5",
+        LLM_CONNECT_TIMEOUT="0.5",
+        LLM_READ_TIMEOUT="120",
+        LLM_WRITE_TIMEOUT="3",
+        LLM_POOL_TIMEOUT="2",
+        LLM_MAX_RETRIES="0",
+    )
+    opts = client._http_options()
+    assert client.BASE_URL == "http://localhost:9000/v1"
+    assert (opts["limits"].max_connections, opts["limits"].max_keepalive_connections) == (8, 4)
+    assert opts["limits"].keepalive_expiry == 1.5
+    assert opts["timeout"].as_dict() == {"connect": 0.5, "read": 120.0, "write": 3.0, "pool": 2.0}
+    assert client.LLM_MAX_RETRIES == 0
+
+
+def test_missing_api_key(reload_client):
+    client = reload_client()
+    with pytest.raises(RuntimeError, match="DASHSCOPE_API_KEY"):
+        client._http_options()
+    with pytest.raises(RuntimeError):
+        client.get_client()
+    assert client._CLIENT is None
+
+
+def test_http2_needs_h2(reload_client, monkeypatch):
+    client = reload_client(DASHSCOPE_API_KEY="sk-test", LLM_HTTP2="1")
+    monkeypatch.setattr(client.importlib.util, "find_spec", lambda name: None)
+    with pytest.raises(ImportError, match="http2"):
+        client._http_options()
+
+
+def test_clients_are_shared(reload_client):
+    client = reload_client(DASHSCOPE_API_KEY="sk-test", LLM_MAX_RETRIES="1")
+    sync = client.get_client()
+    assert client.get_client() is sync
+    assert sync.max_retries == 1 and str(sync.base_url).startswith(client.BASE_URL)
+    assert client.get_async_client() is client.get_async_client()
+
+
+def _chunk(content=None, reasoning=None):
+    delta = SimpleNamespace(content=content, reasoning_content=reasoning)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def test_stream_chat_returns_only_the_answer(reload_client, monkeypatch, capsys):
+    client = reload_client(DASHSCOPE_API_KEY="sk-test")
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        return [_chunk(reasoning="想一想"), _chunk(content="答"), _chunk(content="案"), _chunk()]
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(client, "get_client", lambda: fake)
+
+    messages = [{"role": "user", "content": "hi"}]
+    assert client.stream_chat("m", messages, enable_thinking=True, debug_name="T") == "答案"
+    assert requests[0]["extra_body"] == {"enable_thinking": True} and requests[0]["stream"]
+    out = capsys.readouterr().out
+    assert out.index("想一想") < out.index("T 完整回复") < out.index("答案")
+
+    assert client.stream_chat("m", messages) == "答案"
+    assert "extra_body" not in requests[1]
@@ -0,0 +1,135 @@
+# tests/test_plan_cache.py
+# -*- coding: utf-8 -*-
+"""
+plan_cache：问题归一化、精确 / 近似命中（阈值、实体和数字校验）、LRU 淘汰、持久化和 namespace 失效。
+"""
+
+import json
+
+import pytest
+
+from plan_cache import PlanCache, _cosine, _ngram_vector, normalize_question, plan_namespace
+
+NOLAN = {"task": "movies_by_director", "params": {"name": "Christopher Nolan"}}
+TOP5 = {"task": "movies_by_director", "params": {"name": "Christopher Nolan", "limit": 5}}
+
+
+def test_normalize_question():
+    assert normalize_question("  Ｗho   directed\tHeat？？ ") == "who directed heat"
+    assert normalize_question("“Heat”!") == "heat"
+    assert normalize_question(None) == ""
+
+
+def test_exact_hit_returns_independent_copies():
+    cache = PlanCache()
+    cache.put("Movies by Christopher Nolan?", NOLAN)
+    plan, status = cache.get("movies by christopher nolan")
+    assert (plan, status) == (NOLAN, "hit")
+    plan["params"]["name"] = "mutated"
+    assert cache.get("Movies by Christopher Nolan")[0] == NOLAN
+    assert cache.get("movies by nolan") == (None, "miss")
+    assert cache.info()["hits"] == 2 and cache.info()["misses"] == 1
+
+
+def _score(a, b):
+    return _cosine(_ngram_vector(normalize_question(a)), _ngram_vector(normalize_question(b)))
+
+
+def test_near_match_threshold_is_inclusive():
+    cached = "which movies did Christopher Nolan direct"
+    asked = "which films did Christopher Nolan direct"
+    score = _score(cached, asked)
+    assert 0 < score < 1
+
+    hit = PlanCache(near_threshold=score)
+    hit.put(cached, NOLAN)
+    assert hit.get(asked) == (NOLAN, "near")
+    assert hit.info()["near_hits"] == 1
+
+    miss = PlanCache(near_threshold=score + 1e-9)
+    miss.put(cached, NOLAN)
+    assert miss.get(asked) == (None, "miss")
+
+    # 阈值为 0 时只做精确匹配
+    exact_only = PlanCache()
+    exact_only.put(cached, NOLAN)
+    assert exact_only.get(asked) == (None, "miss")
+
+
+def test_near_match_requires_same_entities_and_numbers():
+    cache = PlanCache(near_threshold=0.5)
+    cache.put("which movies did Christopher Nolan direct", NOLAN)
+    cache.put("top 5 movies directed by Christopher Nolan", TOP5)
+    # 模板相同、人名不同：缓存计划里的人名不在新问题里
+    assert cache.get("which movies did Christopher Columbus direct") == (None, "miss")
+    # 数字不同
+    assert cache.get("top 3 movies directed by Christopher Nolan") == (None, "miss")
+    assert cache.get("top 5 films directed by Christopher Nolan") == (TOP5, "near")
+
+
+def test_near_match_picks_the_most_similar():
+    cache = PlanCache(near_threshold=0.3)
+    cache.put("movies by Christopher Nolan", NOLAN)
+    cache.put("which movies did Christopher Nolan direct", TOP5)
+    asked = "which films did Christopher Nolan direct"
+    assert _score(asked, "which movies did Christopher Nolan direct") > _score(
+        asked, "movies by Christopher Nolan"
+    )
+    assert cache.get(asked) == (TOP5, "near")
+
+
+def test_lru_eviction_and_disabled_cache():
+    cache = PlanCache(maxsize=2)
+    cache.put("a1", {"task": "a"})
+    cache.put("b2", {"task": "b"})
+    cache.get("a1")
+    cache.put("c3", {"task": "c"})
+    assert cache.get("b2") == (None, "miss")
+    assert cache.get("a1")[1] == cache.get("c3")[1] == "hit"
+    assert cache.info()["evictions"] == 1
+
+    off = PlanCache(maxsize=0)
+    off.put("a1", {"task": "a"})
+    assert off.get("a1") == (None, "miss") and off.info()["size"] == 0
+
+
+def test_persistence_keeps_lru_order(tmp_path):
+    path = str(tmp_path / "plans.json")
+    cache = PlanCache(maxsize=2, path=path, namespace="ns")
+    cache.put("b2", {"task": "b"})
+    cache.put("a1", {"task": "a"})
+    cache.put("b2", {"task": "b"})
+
+    reloaded = PlanCache(maxsize=2, path=path, namespace="ns")
+    assert reloaded.info()["size"] == 2
+    # 按写入时的 LRU 顺序读回：a1 是最久未用的，先被淘汰
+    reloaded.put("c3", {"task": "c"})
+    assert reloaded.get("a1") == (None, "miss")
+    assert reloaded.get("b2") == ({"task": "b"}, "hit")
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"version": 1, "namespace": "old", "entries": [{"question": "a1", "plan": {"task": "a"}}]},
+        {"version": 0, "namespace": "ns", "entries": [{"question": "a1", "plan": {"task": "a"}}]},
+        "not json",
+    ],
+    ids=["namespace", "version", "corrupt"],
+)
+def test_stale_or_corrupt_file_is_ignored(tmp_path, payload):
+    path = tmp_path / "plans.json"
+    path.write_text(payload if isinstance(payload, str) else json.dumps(payload), encoding="utf-8")
+    cache = PlanCache(path=str(path), namespace="ns")
+    assert cache.get("a1") == (None, "miss")
+    # 下一次写入用新的 namespace 覆盖旧文件
+    cache.put("b2", {"task": "b"})
+    assert json.loads(path.read_text(encoding="utf-8"))["namespace"] == "ns"
+
+
+def test_plan_namespace_changes_with_any_part():
+    base = plan_namespace("qwen3-max", "prompt", [{"q": "x"}])
+    assert base == plan_namespace("qwen3-max", "prompt", [{"q": "x"}])
+    assert base != plan_namespace("qwen3-max", "prompt2", [{"q": "x"}])
+    assert base != plan_namespace("qwen3-max", "prompt", [{"q": "y"}])
+    assert plan_namespace("ab", "c") != plan_namespace("a", "bc")
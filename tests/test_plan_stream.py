@@ -0,0 +1,144 @@
+# tests/test_plan_stream.py
+# -*- coding: utf-8 -*-
+"""
+plan_stream：JSON 前缀的解析（截断的字符串 / 数字 / 字面量）和流式推测计划。
+"""
+
+import json
+
+import pytest
+
+from plan_stream import PlanStreamParser, matches_plan, parse_partial_json
+
+PLAN = {
+    "task": "movies_by_actor",
+    "params": {"name": "Zoë \"Z\" Saldaña\n", "year_min": 1990, "rating": 7.5e0, "desc": True},
+    "tags": [1, -2.5, None, {"k": [False]}],
+}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('"abc', (None, False)),
+        ('"ab\\', (None, False)),
+        ('"ab\\u00e', (None, False)),
+        ('"ab\\u00e9"', ("abé", True)),
+        ('{"name": "Tom Han', ({}, False)),
+        ('{"name": "Tom Hanks"', ({"name": "Tom Hanks"}, False)),
+        ('{"na', ({}, False)),
+        ('{"name"', ({}, False)),
+        ('{"name":', ({}, False)),
+    ],
+)
+def test_truncated_strings(text, expected):
+    assert parse_partial_json(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        # 数字一直延续到末尾时后面还可能有更多位
+        ('{"limit": 1', ({}, False)),
+        ('{"limit": -', ({}, False)),
+        ('{"rating": 8.', ({}, False)),
+        ('{"rating": 1e', ({}, False)),
+        ('{"rating": 1e-', ({}, False)),
+        ('{"limit": 10,', ({"limit": 10}, False)),
+        ('{"limit": 10}', ({"limit": 10}, True)),
+        ('{"rating": -8.25}', ({"rating": -8.25}, True)),
+        ('{"rating": 2E+1 ', ({"rating": 20.0}, False)),
+        ("[0, 1]", ([0, 1], True)),
+    ],
+)
+def test_truncated_numbers(text, expected):
+    value, done = parse_partial_json(text)
+    assert (value, done) == expected
+    if value and "limit" in value:
+        assert type(value["limit"]) is int
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"desc": t', ({}, False)),
+        ('{"desc": tru', ({}, False)),
+        ('{"desc": true', ({"desc": True}, False)),
+        ('[false, nul', ([False], False)),
+        ("[false, null]", ([False, None], True)),
+        ('{"desc": nope}', (None, False)),
+        ('{"desc": truth}', (None, False)),
+    ],
+)
+def test_truncated_literals(text, expected):
+    assert parse_partial_json(text) == expected
+
+
+def test_nested_containers_are_kept_while_open():
+    assert parse_partial_json('{"params": {"name": "Heat", "tags": [1, 2') == (
+        {"params": {"name": "Heat", "tags": [1]}},
+        False,
+    )
+    assert parse_partial_json('[[1], {"a": [') == ([[1], {"a": []}], False)
+
+
+@pytest.mark.parametrize("text", ["", "   ", "```json\n{", "{'task': 1}", "{1: 2}", '{"a" 1}'])
+def test_not_a_json_prefix(text):
+    assert parse_partial_json(text) == (None, False)
+
+
+def test_every_prefix_is_consistent_with_the_full_document():
+    text = json.dumps(PLAN, ensure_ascii=False, indent=1)
+    for end in range(len(text)):
+        value, done = parse_partial_json(text[:end])
+        assert not done or text[end:].strip() == ""
+    assert parse_partial_json(text) == (PLAN, True)
+    # 已经确定的标量值不会在后面被改掉
+    value, _ = parse_partial_json(text[: text.index('"rating"')])
+    assert value["params"] == {"name": PLAN["params"]["name"], "year_min": 1990}
+
+
+def _feed_all(parser, text, step):
+    starts = []
+    for i in range(0, len(text), step):
+        if parser.feed(text[i:i + step]):
+            starts.append(parser.speculative)
+    return starts
+
+
+def test_parser_speculates_once_required_params_complete():
+    text = json.dumps(
+        {"task": "movies_by_actor", "params": {"name": "Tom Hanks", "limit": 5, "year_min": 1990}}
+    )
+    parser = PlanStreamParser()
+    starts = _feed_all(parser, text, 3)
+    # 可选参数陆续到达不触发重新推测
+    assert starts == [{"task": "movies_by_actor", "params": {"name": "Tom Hanks"}}]
+    assert parser.text == text
+    assert not matches_plan(parser.speculative, json.loads(text))
+    assert not parser.feed("")
+
+
+def test_parser_respeculates_when_required_value_changes():
+    parser = PlanStreamParser()
+    assert not parser.feed('{"task": "co_actors", "params": {')
+    assert parser.feed('"name": "Al Pacino"')
+    assert not parser.feed(', "top_k": 3')
+    assert parser.feed(', "name": "Robert De Niro"}}')
+    final = json.loads(parser.text)
+    assert parser.speculative == {
+        "task": "co_actors",
+        "params": {"name": "Robert De Niro", "top_k": 3},
+    }
+    assert matches_plan(parser.speculative, final)
+
+
+def test_parser_ignores_unknown_tasks_and_non_json():
+    parser = PlanStreamParser()
+    assert not parser.feed('{"task": "unknown", "params": {"name": "x"}}')
+    parser = PlanStreamParser()
+    assert not parser.feed('```json\n{"task": "co_actors", "params": {"name": "x"}}')
+    parser = PlanStreamParser()
+    assert not parser.feed('{"task": "co_actors", "params": {"name": null}}')
+    assert not matches_plan(None, {"task": "co_actors", "params": {}})
+    assert not matches_plan({"task": "co_actors", "params": {}}, "not a plan")
@@ -0,0 +1,111 @@
+# tests/test_resolve.py
+# -*- coding: utf-8 -*-
+"""
+kg_resolve 的分块实体消解：规范化、合并规则，以及过大模糊块的拆分和跳过统计。
+"""
+
+from kg_resolve import (
+    new_resolve_stats,
+    normalize_text,
+    person_blocking_keys,
+    person_merge_map,
+    resolve,
+    soundex,
+    title_merge_map,
+)
+
+
+def test_normalize_and_soundex():
+    assert normalize_text("  Zoë  Saldaña-Nazario ") == "zoe saldana nazario"
+    assert normalize_text("O'Brien, Jr.") == "o brien jr"
+    assert soundex("Robert") == soundex("Rupert") == "R163"
+    assert soundex("Tymczak") == "T522"
+    assert soundex("123") == ""
+
+
+def test_person_merge_rules():
+    counts = [
+        ("Zoe Saldana", 5), ("Zoë Saldaña", 2), ("ZOE  SALDANA", 1),
+        ("Robert Downey Jr.", 4), ("Robert Downey Jr", 1),
+        ("John Kerr", 3), ("John Kerry", 1),
+        ("Mathew McConaughey", 1), ("Matthew McConaughey", 6),
+    ]
+    contexts = {
+        "Zoe Saldana": {1}, "Zoë Saldaña": {2},
+        "John Kerr": {3}, "John Kerry": {4},
+        "Mathew McConaughey": {5}, "Matthew McConaughey": {5, 6},
+    }
+    merge = person_merge_map(counts, contexts)
+    assert merge == {
+        # 规范化后相同：不需要共同电影，规范写法取出现次数最多的
+        "Zoë Saldaña": "Zoe Saldana",
+        "ZOE  SALDANA": "Zoe Saldana",
+        "Robert Downey Jr": "Robert Downey Jr.",
+        # 只差一个字母：还要求共同参与过一部电影
+        "Mathew McConaughey": "Matthew McConaughey",
+    }
+
+
+def test_title_merge_rules():
+    counts = [
+        (("Amélie", 2001), 3), (("Amelie", 2001), 1),
+        (("Amelie", 2002), 1),
+        (("Saw II", 2005), 2), (("Saw III", 2005), 2),
+        (("The Lord of the Rings", 2001), 4), (("The Lord of the Ring", 2001), 1),
+    ]
+    assert title_merge_map(counts) == {
+        ("Amelie", 2001): "Amélie",
+        ("The Lord of the Ring", 2001): "The Lord of the Rings",
+    }
+
+
+def _crowded_names(n: int):
+    """n 个首尾 token 的 Soundex 都相同的不同人名，各自只出现在自己的电影里。"""
+    names = [f"Jonathan Smithson{'e' * i}" for i in range(1, n + 1)]
+    return names, {name: {("solo", name)} for name in names}
+
+
+def test_oversized_person_block_is_split_by_shared_movies():
+    names, contexts = _crowded_names(30)
+    counts = [(name, 1) for name in names] + [("Jonathan Smithson", 5), ("Jonathon Smithson", 1)]
+    contexts["Jonathan Smithson"] = {"heat"}
+    contexts["Jonathon Smithson"] = {"heat"}
+    soundex_key = person_blocking_keys("Jonathan Smithson")[-1][0]
+    assert all(person_blocking_keys(n)[-1][0] == soundex_key for n, _ in counts)
+
+    stats = new_resolve_stats()
+    merge = person_merge_map(counts, contexts, max_block_size=10, stats=stats)
+    # 拆块之前这个块有 32 个名字，超过上限；按电影拆开之后仍然找得到同一部电影里的变体
+    assert merge == {"Jonathon Smithson": "Jonathan Smithson"}
+    assert merge == person_merge_map(counts, contexts)
+    assert stats == {"split_blocks": 1, "skipped_blocks": 0, "skipped_pairs": 0}
+
+
+def test_oversized_title_block_is_split_by_tokens_and_numbers():
+    counts = [((f"The Show {i}", 1994), 1) for i in range(1, 13)]
+    counts += [(("The Shawshank Redemptiom", 1994), 1), (("The Shawshank Redemption", 1994), 3)]
+    stats = new_resolve_stats()
+    merge = title_merge_map(counts, max_block_size=5, stats=stats)
+    assert merge == {("The Shawshank Redemptiom", 1994): "The Shawshank Redemption"}
+    assert merge == title_merge_map(counts)
+    assert stats["split_blocks"] == 1 and stats["skipped_blocks"] == 0
+
+
+def test_blocks_still_too_large_are_skipped_and_counted():
+    names, contexts = _crowded_names(12)
+    shared = {name: {"crowd"} for name in names}
+    stats = new_resolve_stats()
+    merge = person_merge_map([(n, 1) for n in names], shared, max_block_size=5, stats=stats)
+    assert merge == {}
+    # soundex 块和按电影拆出来的 "crowd" 块都是 12 个名字
+    assert stats == {"split_blocks": 1, "skipped_blocks": 1, "skipped_pairs": 66}
+
+    # 没有二级键时过大的块直接跳过
+    stats = new_resolve_stats()
+
+    def blocking_keys(value):
+        return [("all", False)]
+
+    assert resolve([(i, 1) for i in range(8)], blocking_keys, lambda a, b: True, 4, stats=stats) == {}
+    assert stats == {"split_blocks": 0, "skipped_blocks": 1, "skipped_pairs": 28}
+    assert len(resolve([(i, 1) for i in range(4)], blocking_keys, lambda a, b: True, 4)) == 3
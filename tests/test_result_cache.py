@@ -0,0 +1,127 @@
+# tests/test_result_cache.py
+# -*- coding: utf-8 -*-
+"""
+kg_api 查询结果缓存（_cached）：按图版本号区分条目，reload_graph() 前后不会串版本；
+等价的参数共用一个条目，按 LRU / TTL 淘汰。
+"""
+
+import networkx as nx
+import pytest
+
+import buildKG
+import kg_api
+
+
+def _write_graph(path, rating):
+    """只有一部电影 Heat 的小图，评分不同就能区分是哪个版本算出来的。"""
+    G = nx.MultiDiGraph()
+    buildKG._add_movie(
+        G, "Heat", 1995,
+        imdb_rating=rating, metascore=76.0, duration=170.0,
+        certificate="R", genre="Crime",
+        directors=["Michael Mann"], casts=["Al Pacino"],
+        genres=["Crime"], certificates=["R"],
+        split_cast=lambda raw: [raw],
+    )
+    nx.write_graphml(G, str(path))
+    return str(path)
+
+
+@pytest.fixture
+def graphs(tmp_path, monkeypatch):
+    monkeypatch.setattr(kg_api, "GRAPH_BACKEND", "networkx")
+    monkeypatch.setattr(kg_api, "GRAPH_SHARDED", False)
+    monkeypatch.setattr(kg_api, "_STATE", None)
+    kg_api.cache_clear()
+    old = _write_graph(tmp_path / "old.graphml", 8.3)
+    new = _write_graph(tmp_path / "new.graphml", 1.0)
+    kg_api.reload_graph(old)
+    yield old, new
+    kg_api.cache_clear()
+
+
+def test_hit_then_miss_after_reload(graphs):
+    old, new = graphs
+    assert kg_api.get_movie_basic_info("Heat")["imdb_rating"] == 8.3
+    first = kg_api.cache_info()
+
+    info = kg_api.get_movie_basic_info("Heat")
+    info["actors"].append("mutated")
+    assert kg_api.cache_info()["hits"] == first["hits"] + 1
+    # 调用方修改返回值不影响缓存
+    assert kg_api.get_movie_basic_info("Heat")["actors"] == ["Al Pacino"]
+
+    kg_api.reload_graph(new)
+    misses = kg_api.cache_info()["misses"]
+    assert kg_api.get_movie_basic_info("Heat")["imdb_rating"] == 1.0
+    assert kg_api.cache_info()["misses"] == misses + 1
+
+
+def test_reload_during_computation_keeps_versions_apart(graphs, monkeypatch):
+    old, new = graphs
+    compute = kg_api._get_movie_basic_info
+
+    def reload_midway(st, title):
+        kg_api.reload_graph(new)
+        return compute(kg_api._current_state(), title)
+
+    monkeypatch.setattr(kg_api, "_get_movie_basic_info", reload_midway)
+    # 整个计算都在开始时的版本上完成，结果存在旧版本的 key 下
+    assert kg_api.get_movie_basic_info("Heat")["imdb_rating"] == 8.3
+    monkeypatch.setattr(kg_api, "_get_movie_basic_info", compute)
+
+    assert kg_api.get_graph_version() == 2
+    assert kg_api.get_movie_basic_info("Heat")["imdb_rating"] == 1.0
+
+
+def test_batch_duplicates_are_independent_copies(graphs):
+    a, b = kg_api.get_movie_basic_info_many(["Heat", "Heat"])
+    assert a == b and a is not b
+    a["genres"].append("mutated")
+    assert b["genres"] == ["Crime"]
+
+
+def test_equivalent_arguments_share_one_entry(graphs):
+    kg_api.get_movies_by_director("Michael Mann")
+    size = kg_api.cache_info()["size"]
+    hits = kg_api.cache_info()["hits"]
+    # 位置参数、关键字参数、显式写出默认值都算同一次调用
+    kg_api.get_movies_by_director(name="Michael Mann")
+    kg_api.get_movies_by_director("Michael Mann", sort_by="year")
+    assert kg_api.cache_info()["size"] == size
+    assert kg_api.cache_info()["hits"] == hits + 2
+
+
+def test_lru_eviction_and_ttl(graphs, monkeypatch):
+    cache = kg_api._RESULT_CACHE
+    monkeypatch.setattr(cache, "maxsize", 2)
+    monkeypatch.setattr(cache, "ttl", 60.0)
+    now = [1000.0]
+    monkeypatch.setattr(kg_api.time, "monotonic", lambda: now[0])
+    kg_api.cache_clear()
+
+    kg_api.get_movie_basic_info("Heat")
+    kg_api.get_movies_by_actor("Al Pacino")
+    kg_api.get_movie_basic_info("Heat")
+    kg_api.get_movies_by_director("Michael Mann")
+    info = kg_api.cache_info()
+    assert (info["size"], info["evictions"]) == (2, 1)
+    # 最近用过的 Heat 还在，Al Pacino 被淘汰
+    hits = info["hits"]
+    kg_api.get_movie_basic_info("Heat")
+    assert kg_api.cache_info()["hits"] == hits + 1
+    misses = kg_api.cache_info()["misses"]
+    kg_api.get_movies_by_actor("Al Pacino")
+    assert kg_api.cache_info()["misses"] == misses + 1
+
+    now[0] += 61
+    kg_api.get_movie_basic_info("Heat")
+    assert kg_api.cache_info()["expirations"] == 1
+
+
+def test_disabled_cache_calls_through(graphs, monkeypatch):
+    monkeypatch.setattr(kg_api._RESULT_CACHE, "maxsize", 0)
+    before = kg_api.cache_info()
+    assert kg_api.get_movie_basic_info("Heat")["imdb_rating"] == 8.3
+    after = kg_api.cache_info()
+    assert (after["hits"], after["misses"], after["size"]) == (before["hits"], before["misses"], 0)
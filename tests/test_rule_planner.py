@@ -0,0 +1,132 @@
+# tests/test_rule_planner.py
+# -*- coding: utf-8 -*-
+"""
+rule_planner：实体字典的最左最长匹配、条件抽取，以及只在有把握时给出本地计划。
+"""
+
+import pytest
+
+import kg_api
+import rule_planner
+from rule_planner import EntityDictionary, plan_question
+
+NAMES = {
+    "version": 1,
+    "titles": ["Star Wars", "Star Wars: Episode V", "The Star", "Up", "Heat", "HEAT", "Tom Hanks"],
+    "directors": ["Christopher Nolan", "Michael Mann"],
+    "actors": ["Tom Hanks", "Tom Hardy", "Al Pacino", "Michael Mann"],
+    "genres": ["Sci-Fi", "Action", "Drama"],
+}
+
+
+@pytest.fixture
+def dictionary(monkeypatch):
+    d = EntityDictionary(NAMES)
+    monkeypatch.setattr(rule_planner, "get_dictionary", lambda: d)
+    return d
+
+
+def _matches(d, text):
+    text = rule_planner.normalize_text(text)
+    return [(text[s:e], sorted(entry)) for s, e, entry in d.find(text)]
+
+
+def test_find_is_leftmost_longest(dictionary):
+    # "star wars: episode v" 比 "star wars" 长；"the star" 在前面的起点上先匹配
+    assert _matches(dictionary, "the star wars: episode v") == [("the star", ["title"])]
+    assert _matches(dictionary, "star wars: episode v and heat") == [
+        ("star wars: episode v", ["title"]),
+        ("heat", ["title"]),
+    ]
+    assert _matches(dictionary, "Tom Hardy和Al Pacino") == [
+        ("tom hardy", ["actor"]),
+        ("al pacino", ["actor"]),
+    ]
+
+
+def test_find_respects_word_boundaries_and_min_length(dictionary):
+    # 词中间不算："heated" 里没有 "heat"，"startup" 里没有 "star"
+    assert _matches(dictionary, "heated startup") == []
+    # 不在《》里的短名字（"up"）不识别
+    assert _matches(dictionary, "up") == []
+    # 中文字符是词边界
+    assert _matches(dictionary, "关于heat的问题") == [("heat", ["title"])]
+
+
+def test_lookup_merges_case_variants_and_kinds(dictionary):
+    assert dictionary.lookup(" heat ") == {"title": {"Heat", "HEAT"}}
+    assert dictionary.lookup("Michael Mann") == {
+        "director": {"Michael Mann"},
+        "actor": {"Michael Mann"},
+    }
+    assert dictionary.genre_aliases["科幻"] == "Sci-Fi"
+    assert "爱情" not in dictionary.genre_aliases
+
+
+@pytest.mark.parametrize(
+    "question, plan",
+    [
+        ("《Up》的导演是谁", {"task": "movie_basic_info", "params": {"title": "Up"}}),
+        (
+            "和《Star Wars》相似的电影",
+            {"task": "similar_movies", "params": {"title": "Star Wars", "limit": 10}},
+        ),
+        (
+            "推荐5部和《Star Wars: Episode V》类似的电影",
+            {"task": "similar_movies", "params": {"title": "Star Wars: Episode V", "limit": 5}},
+        ),
+        (
+            "Christopher Nolan 2000年以后拍过哪些电影",
+            {"task": "movies_by_director", "params": {"name": "Christopher Nolan", "year_min": 2000}},
+        ),
+        (
+            "Al Pacino 1990年代演过的电影",
+            {
+                "task": "movies_by_actor",
+                "params": {"name": "Al Pacino", "year_min": 1990, "year_max": 1999},
+            },
+        ),
+        (
+            "和 Tom Hardy 合作过的演员有哪些，给我三个",
+            {"task": "co_actors", "params": {"name": "Tom Hardy", "limit": 3}},
+        ),
+        (
+            "评分高于8分的科幻片",
+            {"task": "movies_by_genre", "params": {"genre": "Sci-Fi", "rating_min": 8.0}},
+        ),
+    ],
+)
+def test_plan_question(dictionary, question, plan):
+    assert plan_question(question) == plan
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "《Heat》的导演是谁",                  # 只差大小写的两部电影
+        "Tom Hanks 演过哪些电影",               # 同名的电影和人物
+        "《Interstellar》的导演是谁",           # 不在图里的片名
+        "Tom Hardy 和 Al Pacino 一起演过什么",  # 两个人物
+        "Christopher Nolan 没拍过哪些电影",     # 否定
+        "和 Al Pacino 合作过的导演",            # 问的不是合作演员
+        "Christopher Nolan 拍过 3 次奥斯卡",    # 解释不了的数字
+        "Al Pacino 90年代演过的电影",           # 两位数的年代
+        "",
+    ],
+)
+def test_unsure_questions_go_to_the_model(dictionary, question):
+    assert plan_question(question) is None
+
+
+def test_dictionary_is_rebuilt_after_reload(monkeypatch):
+    state = {"version": 1}
+    monkeypatch.setattr(kg_api, "get_graph_version", lambda: state["version"])
+    monkeypatch.setattr(
+        kg_api, "get_entity_names", lambda: dict(NAMES, version=state["version"])
+    )
+    monkeypatch.setattr(rule_planner, "_DICTIONARY", None)
+    first = rule_planner.get_dictionary()
+    assert rule_planner.get_dictionary() is first
+    state["version"] = 2
+    second = rule_planner.get_dictionary()
+    assert second is not first and second.version == 2
@@ -0,0 +1,116 @@
+# tests/test_synth_bench.py
+# -*- coding: utf-8 -*-
+"""
+kg_synth 的合成数据（确定性、形状、跨文件重复）和 kg_bench 的数据复用 / 各构图模式。
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import buildKG
+import kg_bench
+from kg_synth import SynthConfig, _power_law, movie_titles, person_names, write_dataset
+
+
+def _read(paths):
+    return pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+
+
+def test_same_config_gives_identical_files(tmp_path):
+    cfg = SynthConfig(rows=2000, seed=3)
+    a = write_dataset(cfg, str(tmp_path / "a"), chunksize=700)
+    b = write_dataset(cfg, str(tmp_path / "b"), chunksize=700)
+    assert [open(p, "rb").read() for p in a] == [open(p, "rb").read() for p in b]
+    c = write_dataset(SynthConfig(rows=2000, seed=4), str(tmp_path / "c"))
+    assert open(a[0], "rb").read() != open(c[0], "rb").read()
+
+
+def test_dataset_shape(tmp_path):
+    cfg = SynthConfig(rows=3001, files=3, dup_rate=0.2, seed=1)
+    paths = write_dataset(cfg, str(tmp_path))
+    df = _read(paths)
+    assert list(df.columns) == buildKG.COMMON_COLS
+    assert len(df) == 3001
+    assert [len(pd.read_csv(p)) for p in paths] == [1001, 1000, 1000]
+
+    # 每部电影恰好有一行"独有"记录，其余是重复记录
+    movies = df.groupby(["Title", "Year"]).size()
+    assert len(movies) == cfg.movies
+    # 同一部电影在各文件里的导演 / 演员 / 类型完全一致
+    for col in ("Director", "Star Cast", "Genre"):
+        assert (df.groupby(["Title", "Year"])[col].nunique() == 1).all(), col
+
+    # 数值列有缺失，但比例接近 missing_rate
+    missing = df["MetaScore"].isna().mean()
+    assert 0.02 < missing < 0.09
+    assert df["Year"].between(1920, 2024).all()
+
+    meta = json.loads((tmp_path / "synth_meta.json").read_text(encoding="utf-8"))
+    assert meta["config"] == cfg.to_dict()
+
+
+def test_star_cast_splits_back_into_names(tmp_path):
+    df = _read(write_dataset(SynthConfig(rows=500, seed=2), str(tmp_path)))
+    for raw in df["Star Cast"].head(50):
+        names = buildKG.split_star_cast(raw)
+        assert names and "".join(names) == raw
+        assert all(len(n.split()) == 2 for n in names)
+
+
+def test_names_are_distinct_per_id():
+    ids = np.arange(5000)
+    assert len(set(person_names(ids))) == 5000
+    assert len(set(movie_titles(ids))) == 5000
+    assert person_names(np.array([7])) == person_names(np.array([7]))
+
+
+def test_power_law_bounds_and_skew():
+    u = np.random.default_rng(0).random(100_000)
+    for exponent in (0.7, 1.0, 2.0):
+        k = _power_law(u, 50, exponent)
+        assert k.min() >= 0 and k.max() <= 49
+        counts = np.bincount(k, minlength=50)
+        assert counts[0] > counts[10] > counts[49]
+
+
+@pytest.mark.parametrize(
+    "kwargs", [dict(rows=0), dict(rows=10, files=0), dict(rows=10, dup_rate=1.0)]
+)
+def test_invalid_config(kwargs):
+    with pytest.raises(ValueError):
+        SynthConfig(**kwargs)
+
+
+def test_prepare_dataset_reuses_matching_data(tmp_path, monkeypatch):
+    cfg = SynthConfig(rows=600, seed=5)
+    paths = kg_bench.prepare_dataset(cfg, str(tmp_path))
+    first = [open(p, "rb").read() for p in paths]
+
+    generated = []
+    write = kg_bench.write_dataset
+    monkeypatch.setattr(
+        kg_bench, "write_dataset", lambda *a, **k: generated.append(a) or write(*a, **k)
+    )
+    assert kg_bench.prepare_dataset(cfg, str(tmp_path)) == paths
+    assert generated == []
+
+    # 参数变了、或者有文件缺失时重新生成
+    kg_bench.prepare_dataset(SynthConfig(rows=600, seed=6), str(tmp_path))
+    assert len(generated) == 1 and open(paths[0], "rb").read() != first[0]
+    (tmp_path / "rows_600" / "IMDb_Synthetic_2.csv").unlink()
+    kg_bench.prepare_dataset(SynthConfig(rows=600, seed=6), str(tmp_path))
+    assert len(generated) == 2
+
+
+def test_bench_modes_build_the_same_graph(tmp_path):
+    paths = write_dataset(SynthConfig(rows=900, seed=7), str(tmp_path))
+    sizes = {}
+    for mode in ("default", "stream", "workers"):
+        res = kg_bench.bench_one(paths, mode, 2, 250, str(tmp_path / f"{mode}.graphml"))
+        sizes[mode] = (res["nodes"], res["edges"])
+        assert res["wall_s"] >= 0 and res["slowest_stage"] in res["stages"]
+    assert len(set(sizes.values())) == 1
+    assert (tmp_path / "stream.graphml").read_bytes() == (tmp_path / "default.graphml").read_bytes()